@@ -0,0 +1,218 @@
+"""
+Checks that the bs4 and lxml parser backends of ArticleScraper give the same article dictionaries for a
+set of saved news.ucsc.edu article pages, and optionally that they still match a golden file of the
+article dictionaries from an earlier run.
+
+Usage: python benchmarks/compare_parsers.py <directory> [--golden <file>] [--write-golden]
+
+The directory can hold saved pages as .html files, or be a --cache-dir of the scraper, in which case
+the cached responses are used for the pages and for the images in them.  Saved .html pages are given
+the url http://news.ucsc.edu/<path under the directory>, and if the directory has an images.json of
+image url: [width, height], the image sizes are read from it instead of downloading the images.  With
+--write-golden, the article dictionaries from the bs4 backend are written to the golden file instead
+of compared with it.
+
+As well as the article dictionaries, the article body html is compared before it is cleaned up by
+tidy, so that differences in how the two backends write out the body can't be hidden by tidy.
+
+benchmarks/pages holds a set of pages made to follow the news.ucsc.edu article markup, with legacy
+windows-1252 and gremlin pages, a Word export with namespace prefixed tags, PHP processing instructions,
+templates, a stray end tag, comments, scripts and pages that can't be scraped, and golden.json holds
+their bs4 article dictionaries:
+
+    python benchmarks/compare_parsers.py benchmarks/pages --golden benchmarks/pages/golden.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache import ResponseCache, ImageDimensionIndex
+from fetcher import PageFetcher
+from scraper import ArticleScraper
+
+
+def read_pages(directory):
+    """
+    Reads the saved article pages in a directory and its subdirectories
+    :param directory: the directory to read
+    :return: a list of article_url, page_html tuples, sorted by url
+    """
+    pages = []
+    for root, subdirs, files in os.walk(directory):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if filename.endswith('.body'):
+                try:
+                    with open(path[:-len('.body')] + '.json', 'rb') as meta_file:
+                        article_url = json.load(meta_file)['url']
+                except (IOError, ValueError, KeyError):
+                    continue
+            elif filename.endswith('.html'):
+                article_url = 'http://news.ucsc.edu/' + os.path.relpath(path, directory).replace(os.sep, '/')
+            else:
+                continue
+
+            with open(path, 'rb') as page_file:
+                page_html = page_file.read()
+            if filename.endswith('.html') or 'id="main"' in page_html:
+                pages.append((article_url, page_html))
+    return sorted(pages)
+
+
+def read_image_sizes(directory, image_index):
+    """
+    Adds the image sizes in the directory's images.json, if it has one, to an image index
+    :param directory: the directory of saved pages
+    :param image_index: the ImageDimensionIndex to add them to
+    :return:
+    """
+    try:
+        with open(os.path.join(directory, 'images.json'), 'rb') as images_file:
+            image_sizes = json.load(images_file)
+    except IOError:
+        return
+    for image_url, (width, height) in image_sizes.iteritems():
+        image_index.put(image_url, width, height)
+
+
+def get_body_html(scraper, page_html):
+    """
+    Returns the article body html of a page as it is before tidy cleans it up
+    :param scraper: the ArticleScraper to parse with
+    :param page_html: the raw html of the page
+    :return: the html, or None if the page has no article body
+    """
+    article_tags = scraper.parse_article_tags(page_html)
+    article_body = article_tags.get('article_body')
+    if article_body is None:
+        return None
+    scraper.zap_tag_contents(article_body)
+    return ''.join(str(item) for item in article_body.contents)
+
+
+def scrape_page(scraper, article_url, page_html):
+    """
+    Scrapes a saved page, numbering its IDs from 1
+    :param scraper: the ArticleScraper to scrape with
+    :param article_url: the url the page was saved from
+    :param page_html: the raw html of the page
+    :return: the article dictionary, or the description of the error that stopped it from being scraped
+    """
+    scraper.object_index = 0
+    try:
+        return scraper.scrape_article_html(article_url, page_html)
+    except Exception as e:
+        try:
+            message = str(e)
+        except UnicodeEncodeError:
+            message = unicode(e)
+        return 'error: ' + e.__class__.__name__ + ': ' + message
+
+
+def normalize(value):
+    """
+    Converts an article dictionary to the form it has after a round trip through json, so that it can
+    be compared with a golden file
+    :param value: the article dictionary
+    :return:
+    """
+    return json.loads(json.dumps(value))
+
+
+def print_differences(article_url, expected, actual, expected_name, actual_name):
+    """
+    Prints the fields that differ between two results for the same page
+    :return:
+    """
+    print 'Mismatch for ' + article_url
+    if not isinstance(expected, dict) or not isinstance(actual, dict):
+        print '  ' + expected_name + ': ' + repr(expected)[:500]
+        print '  ' + actual_name + ': ' + repr(actual)[:500]
+        return
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            print '  ' + key
+            print '    ' + expected_name + ': ' + repr(expected.get(key))[:500]
+            print '    ' + actual_name + ': ' + repr(actual.get(key))[:500]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', help='Directory of saved article pages, or a scraper --cache-dir')
+    parser.add_argument('--golden', dest='golden_path', help='Golden file of article dictionaries')
+    parser.add_argument('--write-golden', action='store_true', help='Write the golden file instead of checking it')
+    results = parser.parse_args()
+
+    pages = read_pages(results.directory)
+    if not pages:
+        print 'No article pages found in ' + results.directory
+        sys.exit(1)
+
+    cache = ResponseCache(results.directory, max_bytes=float('inf'))
+    if cache.get_entry_paths():
+        fetcher = PageFetcher(cache=cache)
+    else:
+        fetcher = PageFetcher()
+    image_index = ImageDimensionIndex()
+    read_image_sizes(results.directory, image_index)
+    bs4_scraper = ArticleScraper(fetcher=fetcher, image_index=image_index, parser_backend='bs4')
+    lxml_scraper = ArticleScraper(fetcher=fetcher, image_index=image_index, parser_backend='lxml')
+
+    bs4_results = dict()
+    lxml_results = dict()
+    bs4_time = 0
+    lxml_time = 0
+    for article_url, page_html in pages:
+        start = time.time()
+        bs4_results[article_url] = normalize(scrape_page(bs4_scraper, article_url, page_html))
+        bs4_time += time.time() - start
+
+        start = time.time()
+        lxml_results[article_url] = normalize(scrape_page(lxml_scraper, article_url, page_html))
+        lxml_time += time.time() - start
+
+    mismatches = 0
+    for article_url, page_html in pages:
+        if bs4_results[article_url] != lxml_results[article_url]:
+            print_differences(article_url, bs4_results[article_url], lxml_results[article_url], 'bs4', 'lxml')
+            mismatches += 1
+
+        bs4_body = get_body_html(bs4_scraper, page_html)
+        lxml_body = get_body_html(lxml_scraper, page_html)
+        if bs4_body != lxml_body:
+            print 'Article body html mismatch for ' + article_url
+            print '  bs4:  ' + repr(bs4_body)[:2000]
+            print '  lxml: ' + repr(lxml_body)[:2000]
+            mismatches += 1
+
+    if results.golden_path is not None and results.write_golden:
+        with open(results.golden_path, 'wb') as golden_file:
+            json.dump(bs4_results, golden_file, indent=1, sort_keys=True)
+        print 'Wrote ' + results.golden_path
+    elif results.golden_path is not None:
+        with open(results.golden_path, 'rb') as golden_file:
+            golden = json.load(golden_file)
+        for article_url, page_html in pages:
+            if article_url not in golden:
+                print 'Not in golden file: ' + article_url
+                mismatches += 1
+                continue
+            for name, scraped in (('bs4', bs4_results), ('lxml', lxml_results)):
+                if golden[article_url] != scraped[article_url]:
+                    print_differences(article_url, golden[article_url], scraped[article_url], 'golden', name)
+                    mismatches += 1
+
+    print '{0} articles, {1} mismatches'.format(len(pages), mismatches)
+    print 'bs4:   {0:.3f} ms per article'.format(bs4_time * 1000 / len(pages))
+    print 'lxml:  {0:.3f} ms per article'.format(lxml_time * 1000 / len(pages))
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
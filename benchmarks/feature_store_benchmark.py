@@ -0,0 +1,83 @@
+"""
+Compares the time taken by the classifier's k-fold cross validation when every fold tokenizes the
+articles with its own TfidfVectorizer, against reading the n-gram counts from a FeatureStore, and
+checks that both give the same table of all the folds together.  The articles are random words drawn
+from a small vocabulary, each with a word of its own, so that every fold holds out n-grams its
+training rows never saw.
+
+Usage: python benchmarks/feature_store_benchmark.py [articles] [folds]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.preprocessing import MultiLabelBinarizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from classifier import ArticleClassifier
+
+WORDS = ['kelp', 'forest', 'ocean', 'student', 'budget', 'campus', 'star', 'telescope', 'grant', 'music',
+         'library', 'hours', 'research', 'science', 'art', 'film', 'sea', 'otter', 'galaxy', 'tuition']
+
+CATEGORIES = ['ocean', 'star', 'budget']
+
+
+def make_training_set(num_articles):
+    """
+    Makes a random training set
+    :param num_articles: the number of articles
+    :return: the article bodies, the binarized categories and the category names in column order
+    """
+    random_state = np.random.RandomState(0)
+    articles = []
+    categories = []
+    for index in xrange(num_articles):
+        article = ' '.join(random_state.choice(WORDS, random_state.randint(5, 50)))
+        articles.append(article + ' unique{0}'.format(index))
+        categories.append([word for word in CATEGORIES if word in article] or ['other'])
+
+    binarizer = MultiLabelBinarizer()
+    return articles, binarizer.fit_transform(categories), list(binarizer.classes_)
+
+
+def run_kfold(classifier, articles, categories, labels, k):
+    """
+    Runs cross validation, with numpy's random state reset so that both runs train alike
+    :return: the time taken in seconds, and the table of all the folds together as a string
+    """
+    inv_categories_dict = dict(enumerate(labels))
+    np.random.seed(0)
+    start = time.time()
+    metrics = classifier.kfold_validation(k, articles, categories, inv_categories_dict)
+    return time.time() - start, metrics.get_table(labels).get_string()
+
+
+def main():
+    num_articles = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    articles, categories, labels = make_training_set(num_articles)
+    store_dir = tempfile.mkdtemp()
+    try:
+        before_time, before_table = run_kfold(ArticleClassifier(), articles, categories, labels, k)
+        after_time, after_table = run_kfold(ArticleClassifier(feature_store_dir=store_dir), articles,
+                                            categories, labels, k)
+    finally:
+        shutil.rmtree(store_dir)
+
+    if before_table != after_table:
+        print 'The tables differ'
+        sys.exit(1)
+
+    print '{0} articles, {1} folds'.format(num_articles, k)
+    print 'vectorizer per fold:  {0:.3f} s'.format(before_time)
+    print 'feature store:        {0:.3f} s'.format(after_time)
+    print 'speedup:              {0:.2f}x'.format(before_time / after_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Compares the time taken to make the classifier's confusion matrix table with the original loops over
+every article and label, against the numpy counts of metrics.get_multilabel_metrics, and checks that
+both make the same table.  The labels and predictions are random, with about the density of the
+news.ucsc.edu categories.
+
+Usage: python benchmarks/metrics_benchmark.py [articles] [labels] [repeats]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from prettytable import PrettyTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from metrics import get_multilabel_metrics
+
+
+def loop_confusion_table(y_true, y_pred, cutoff, class_labels):
+    """
+    The original ArticleClassifier.multilabel_confusion_matrix, kept to compare against
+    :param y_true:
+    :param y_pred:
+    :param cutoff:
+    :param class_labels:
+    :return: the PrettyTable it printed
+    """
+    confusion_matrix = []
+
+    totals = [0, 0, 0, 0]
+
+    for index in xrange(len(y_true[0])):
+        confusion_matrix.append([0, 0, 0, 0])
+
+    for article_index in xrange(len(y_true)):
+        predicted_categories_list = y_pred[article_index]
+        for index in xrange(len(predicted_categories_list)):
+            if predicted_categories_list[index] >= cutoff:
+                if y_true[article_index][index] == 1:
+                    confusion_matrix[index][0] += 1
+                    totals[0] += 1
+                else:
+                    confusion_matrix[index][1] += 1
+                    totals[1] += 1
+            else:
+                if y_true[article_index][index] == 1:
+                    confusion_matrix[index][2] += 1
+                    totals[2] += 1
+                else:
+                    confusion_matrix[index][3] += 1
+                    totals[3] += 1
+
+    table = PrettyTable(['Labels', 'True Positives',
+                         'False Positives', 'False Negatives',
+                         'True Negatives', 'Precision',
+                         'Recall', 'F1'
+                         ])
+
+    total_precision = 0
+    precision_samples = 0
+    total_recall = 0
+    recall_samples = 0
+
+    for index in xrange(len(confusion_matrix)):
+        if confusion_matrix[index][1] == 0:
+            precision = 1
+        else:
+            precision = (confusion_matrix[index][0] + 0.0) / \
+                        (confusion_matrix[index][0] + confusion_matrix[index][1])
+
+        total_precision += precision
+        precision_samples += 1
+
+        if confusion_matrix[index][2] == 0:
+            recall = 1
+        else:
+            recall = (confusion_matrix[index][0] + 0.0) / \
+                     (confusion_matrix[index][0] + confusion_matrix[index][2])
+        total_recall += recall
+        recall_samples += 1
+
+        if precision + recall == 0:
+            f1_score = 0
+        else:
+            f1_score = 2 * ((precision * recall) / (precision + recall + 0.0))
+
+        table.add_row([class_labels[index], ] + confusion_matrix[index] + [precision, recall, f1_score])
+
+    macro_avg_precision = (total_precision + 0.0) / precision_samples
+    macro_avg_recall = (total_recall + 0.0) / recall_samples
+    macro_avg_f1 = 2 * ((macro_avg_precision * macro_avg_recall) / (macro_avg_precision + macro_avg_recall + 0.0))
+
+    table.add_row(['Macro Averaged Totals', ] + [str(i) for i in totals] +
+                  [str(macro_avg_precision), str(macro_avg_recall), str(macro_avg_f1)])
+
+    micro_avg_precision = (totals[0] + 0.0) / (totals[0] + totals[1])
+    micro_avg_recall = (totals[0] + 0.0) / (totals[0] + totals[2])
+    micro_avg_f1 = 2 * ((micro_avg_precision * micro_avg_recall) / (micro_avg_precision + micro_avg_recall + 0.0))
+
+    table.add_row(['Micro Averaged Totals', ] + [str(i) for i in totals] +
+                  [str(micro_avg_precision), str(micro_avg_recall), str(micro_avg_f1)])
+
+    return table
+
+
+def time_table(make_table, repeats):
+    """
+    Times a function that makes the table
+    :param make_table: a function of no arguments returning a PrettyTable
+    :param repeats: the number of runs; the fastest run is kept
+    :return: the time of the fastest run in seconds, and the table as a string
+    """
+    best = None
+    for repeat in xrange(repeats):
+        start = time.time()
+        table = make_table()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, table.get_string()
+
+
+def main():
+    num_articles = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    num_labels = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    random_state = np.random.RandomState(0)
+    y_true = (random_state.random_sample((num_articles, num_labels)) < 0.03).astype(int)
+    # mostly right predictions, with some labels flipped
+    flips = random_state.random_sample((num_articles, num_labels)) < 0.01
+    y_pred = np.where(flips, 1 - y_true, y_true)
+    labels = ['Category {0}'.format(index) for index in xrange(num_labels)]
+
+    before_time, before_table = time_table(lambda: loop_confusion_table(y_true, y_pred, 1, labels), repeats)
+    after_time, after_table = time_table(lambda: get_multilabel_metrics(y_true, y_pred, 1).get_table(labels),
+                                         repeats)
+
+    if before_table != after_table:
+        print 'The tables differ'
+        sys.exit(1)
+
+    print '{0} articles, {1} labels, best of {2} runs'.format(num_articles, num_labels, repeats)
+    print 'loops:  {0:.3f} s'.format(before_time)
+    print 'numpy:  {0:.3f} s'.format(after_time)
+    print 'speedup:    {0:.2f}x'.format(before_time / after_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Compares the time taken to pick the tags the scraper reads out of saved news.ucsc.edu article pages,
+searching the tree once per tag with find and findAll (the way ArticleScraper used to) against walking
+the tree once with ArticleScraper.collect_article_tags.
+
+Usage: python benchmarks/parse_benchmark.py <directory> [repeats]
+
+The directory can hold saved pages as .html files, or be a --cache-dir of the scraper, whose cached
+responses are stored as .body files.  benchmarks/pages holds a set of saved pages to run it on:
+
+    python benchmarks/parse_benchmark.py benchmarks/pages 20
+"""
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scraper import ArticleScraper
+
+
+def find_article_tags(soup):
+    """
+    Picks out the tags the scraper reads with a separate search of the tree for each one
+    :param soup: the BeautifulSoup object of the whole article page
+    :return: the tags, keyed as in ArticleScraper.collect_article_tags
+    """
+    article_tags = {'categories': soup.findAll(attrs={"name": "category"})}
+
+    body = soup.find("div", {"id": "main"})
+    article_tags['main'] = body
+    article_tags['author'] = body.find("span", {"class": "name"})
+    article_tags['author_telephone'] = body.find("span", {"class": "tel"})
+    article_tags['author_role'] = body.find("span", {"class": "role"})
+    article_tags['date'] = body.find("p", {"class": "date"})
+    article_tags['title'] = body.find("h1", {"id": "title"})
+    article_tags['subhead'] = body.find("p", {"class": "subhead"})
+    article_tags['figures'] = body.findAll("figure", {"class": "article-image"})
+    article_tags['images'] = body.findAll("img")
+    article_tags['iframes'] = body.findAll("iframe")
+    article_tags['links'] = body.findAll("a")
+    article_tags['message_from'] = body.find("span", {"class": "message-from"})
+    article_tags['message_to'] = body.find("span", {"class": "message-to"})
+    article_tags['article_body'] = body.find("div", {"class": "article-body"})
+
+    return article_tags
+
+
+def read_pages(directory):
+    """
+    Reads the saved article pages in a directory and its subdirectories
+    :param directory: the directory to read
+    :return: a list of the page contents
+    """
+    pages = []
+    for root, subdirs, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.endswith('.html') or filename.endswith('.body'):
+                with open(os.path.join(root, filename), 'rb') as page_file:
+                    page_html = page_file.read()
+                if 'id="main"' in page_html:
+                    pages.append(page_html)
+    return pages
+
+
+def time_extraction(extract, soups, repeats):
+    """
+    Times an extraction function over every page
+    :param extract: the function to time
+    :param soups: the parsed pages
+    :param repeats: the number of times to run over the pages; the fastest run is kept
+    :return: the mean time per article in seconds
+    """
+    best = None
+    for repeat in xrange(repeats):
+        start = time.time()
+        for soup in soups:
+            extract(soup)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(soups)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    pages = read_pages(sys.argv[1])
+    if not pages:
+        print 'No article pages found in ' + sys.argv[1]
+        sys.exit(1)
+
+    # pages whose div#main is lost to broken markup, such as a stray end tag before the html tag, are left out
+    soups = [soup for soup in (BeautifulSoup(page_html, 'lxml') for page_html in pages)
+             if soup.find('div', {'id': 'main'}) is not None]
+    scraper = ArticleScraper()
+
+    for soup in soups:
+        before = find_article_tags(soup)
+        after = scraper.collect_article_tags(soup)
+        for key in before:
+            if before[key] != after.get(key):
+                print 'Mismatch for ' + key
+                sys.exit(1)
+
+    before_time = time_extraction(find_article_tags, soups, repeats)
+    after_time = time_extraction(scraper.collect_article_tags, soups, repeats)
+
+    print '{0} articles, best of {1} runs'.format(len(soups), repeats)
+    print 'find/findAll per tag:  {0:.3f} ms per article'.format(before_time * 1000)
+    print 'collect_article_tags:  {0:.3f} ms per article'.format(after_time * 1000)
+    print 'speedup:               {0:.2f}x'.format(before_time / after_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares the time taken to convert the text of saved news.ucsc.edu article bodies to ASCII with the
+original recursive zap_tag_contents, which made a new GremlinZapper for every tag and replaced every
+string, against the current ArticleScraper.zap_tag_contents.
+
+Usage: python benchmarks/zap_benchmark.py <directory> [repeats]
+
+The directory can hold saved pages as .html files, or be a --cache-dir of the scraper, whose cached
+responses are stored as .body files.  benchmarks/pages holds a set of saved pages to run it on:
+
+    python benchmarks/zap_benchmark.py benchmarks/pages 20
+"""
+import os
+import sys
+import time
+
+import bs4
+from bs4 import BeautifulSoup
+from unidecode import unidecode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scraper import ArticleScraper
+from utils import GremlinZapper
+
+
+def recursive_zap_tag_contents(tag):
+    """
+    The original zap_tag_contents, kept to compare against
+    :param tag: the Tag object to convert
+    :return:
+    """
+    if hasattr(tag, 'contents'):
+        content_length = len(tag.contents)
+
+        gzapper = GremlinZapper()
+
+        for x in range(0, content_length):
+            if isinstance(tag.contents[x], bs4.element.NavigableString):
+                unicode_entry = gzapper.kill_gremlins(tag.contents[x])
+                unicode_entry = unidecode(unicode_entry)
+                tag.contents[x].replace_with(unicode_entry)
+            elif isinstance(tag.contents[x], bs4.element.Tag):
+                recursive_zap_tag_contents(tag.contents[x])
+
+
+def read_bodies(directory):
+    """
+    Reads the article bodies of the saved article pages in a directory and its subdirectories
+    :param directory: the directory to read
+    :return: a list of the article bodies' html
+    """
+    bodies = []
+    for root, subdirs, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.endswith('.html') or filename.endswith('.body'):
+                with open(os.path.join(root, filename), 'rb') as page_file:
+                    page_html = page_file.read()
+                if 'article-body' not in page_html:
+                    continue
+                body = BeautifulSoup(page_html, 'lxml').find("div", {"class": "article-body"})
+                if body is not None:
+                    bodies.append(str(body))
+    return bodies
+
+
+def time_zap(zap, bodies, repeats):
+    """
+    Times a zap function over every article body.  Each run zaps freshly parsed copies of the bodies,
+    and only the zapping is timed
+    :param zap: the function to time
+    :param bodies: the html of the article bodies
+    :param repeats: the number of runs; the fastest run is kept
+    :return: the mean time per article body in seconds, and the zapped bodies from the last run
+    """
+    best = None
+    for repeat in xrange(repeats):
+        tags = [BeautifulSoup(body, 'lxml').find("div") for body in bodies]
+        start = time.time()
+        for tag in tags:
+            zap(tag)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(bodies), [str(tag) for tag in tags]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    bodies = read_bodies(sys.argv[1])
+    if not bodies:
+        print 'No article bodies found in ' + sys.argv[1]
+        sys.exit(1)
+
+    scraper = ArticleScraper()
+
+    before_time, before_output = time_zap(recursive_zap_tag_contents, bodies, repeats)
+    after_time, after_output = time_zap(scraper.zap_tag_contents, bodies, repeats)
+
+    if before_output != after_output:
+        print 'The zapped article bodies differ'
+        sys.exit(1)
+
+    print '{0} article bodies, best of {1} runs'.format(len(bodies), repeats)
+    print 'recursive:  {0:.3f} ms per article'.format(before_time * 1000)
+    print 'iterative:  {0:.3f} ms per article'.format(after_time * 1000)
+    print 'speedup:    {0:.2f}x'.format(before_time / after_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+class ResponseCache(object):
+    """
+    A size bounded on-disk cache of HTTP responses, keyed by url.  Each response is stored as two files
+    named after the sha1 hash of its url: a .body file with the response content, and a .json file with
+    the url, status code and headers (including the ETag and Last-Modified validators).  The
+    modification time of the .json file records when the entry was last used, and once the total size
+    of the cached bodies passes max_bytes the least recently used entries are removed.
+
+    The total size is kept in shared memory behind a process-shared lock, so the parse worker processes,
+    which fork with a copy of the cache and store the images they fetch in it, add to the same total as
+    the main process and evict against it.  The cache must be made before the workers are forked
+    """
+
+    def __init__(self, cache_dir='http_cache/', max_bytes=1024 * 1024 * 1024):
+        """
+        :param cache_dir: the directory to store cached responses in. Created if it doesn't exist
+        :param max_bytes: the maximum total size of the cached response bodies
+        :return:
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = multiprocessing.Lock()
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        total_bytes = 0
+        for entry_path in self.get_entry_paths():
+            total_bytes += self.get_body_size(entry_path)
+        # a double holds byte counts exactly up to 2 ** 53
+        self.shared_total_bytes = multiprocessing.Value('d', float(total_bytes), lock=False)
+
+    @property
+    def total_bytes(self):
+        """
+        The total size of the cached response bodies, counting the entries stored by every process
+        :return:
+        """
+        return int(self.shared_total_bytes.value)
+
+    def get_entry_path(self, url):
+        """
+        Returns the path of the cache entry for a url, without a file extension
+        :param url: the url of the cached response
+        :return: the path of the cache entry
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        key = hashlib.sha1(url).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get_entry_paths(self):
+        """
+        Returns the paths, without file extensions, of every entry in the cache
+        :return: a list of cache entry paths
+        """
+        entry_paths = []
+        for root, subdirs, files in os.walk(self.cache_dir):
+            for filename in files:
+                if filename.endswith('.json'):
+                    entry_paths.append(os.path.join(root, filename[:-len('.json')]))
+        return entry_paths
+
+    def get_body_size(self, entry_path):
+        """
+        Returns the size of a cache entry's body, or 0 if it doesn't exist
+        :param entry_path: the path of the cache entry
+        :return: the size of the entry's .body file in bytes
+        """
+        try:
+            return os.path.getsize(entry_path + '.body')
+        except OSError:
+            return 0
+
+    def write_file(self, path, data):
+        """
+        Writes data to path by way of a temporary file, so that readers never see a partly written file
+        :param path: the path of the file to write
+        :param data: the bytes to write
+        :return:
+        """
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # another thread or process created it first
+                pass
+
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        os.rename(temp_path, path)
+
+    def get(self, url):
+        """
+        Returns the cached response for a url and marks it as recently used
+        :param url: the url of the response
+        :return: a dictionary with the keys url, status_code, headers and content, or None if the url
+        isn't in the cache
+        """
+        entry_path = self.get_entry_path(url)
+        try:
+            with open(entry_path + '.json', 'rb') as meta_file:
+                entry = json.load(meta_file)
+            with open(entry_path + '.body', 'rb') as body_file:
+                entry['content'] = body_file.read()
+            os.utime(entry_path + '.json', None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if entry['url'] != url:
+            return None
+        return entry
+
+    def put(self, url, status_code, headers, content):
+        """
+        Stores a response in the cache, then evicts least recently used entries if the cache is too big
+        :param url: the url of the response
+        :param status_code: the HTTP status code of the response
+        :param headers: a dictionary of the response headers
+        :param content: the response body
+        :return:
+        """
+        entry_path = self.get_entry_path(url)
+        meta = {
+            'url': url,
+            'status_code': status_code,
+            'headers': dict((key.lower(), value) for key, value in headers.iteritems())
+        }
+
+        with self.lock:
+            old_size = self.get_body_size(entry_path)
+            self.write_file(entry_path + '.body', content)
+            self.write_file(entry_path + '.json', json.dumps(meta))
+            self.shared_total_bytes.value += len(content) - old_size
+
+            if self.shared_total_bytes.value > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is down to 90% of max_bytes.
+        Must be called with the lock held
+        :return:
+        """
+        entries = []
+        for entry_path in self.get_entry_paths():
+            try:
+                entries.append((os.path.getmtime(entry_path + '.json'), entry_path))
+            except OSError:
+                continue
+        entries.sort()
+
+        target_bytes = self.max_bytes * 0.9
+        for last_used, entry_path in entries:
+            if self.shared_total_bytes.value <= target_bytes:
+                break
+            self.shared_total_bytes.value -= self.get_body_size(entry_path)
+            for extension in ('.json', '.body'):
+                try:
+                    os.remove(entry_path + extension)
+                except OSError:
+                    pass
+
+
+class ImageDimensionIndex(object):
+    """
+    A persistent table of image urls and their width, height, content length and ETag, kept in a SQLite
+    database so that an image only has to be downloaded once no matter how many articles or runs it
+    appears in.  Counts of lookups that hit and missed the table are kept in shared memory, so they
+    include lookups made by worker processes forked after the index was created.
+
+    Without a database path the table is kept in a temporary file in the working directory rather than
+    in memory, since an in-memory database is private to the process that opens it, and each parse
+    worker would have to measure every image again.  The file is removed when the process that created
+    the index exits
+    """
+
+    def __init__(self, db_path=None):
+        """
+        :param db_path: the path of the SQLite database file, or None for a temporary file that is shared
+        with forked workers and removed at exit
+        :return:
+        """
+        self.temporary = db_path is None
+        if self.temporary:
+            fd, db_path = tempfile.mkstemp(prefix='images-', suffix='.sqlite', dir=os.getcwd())
+            os.close(fd)
+            self.owner_pid = os.getpid()
+            atexit.register(self.remove)
+        self.db_path = db_path
+        self.hits = multiprocessing.Value('i', 0)
+        self.misses = multiprocessing.Value('i', 0)
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+
+    def get_connection(self):
+        """
+        Returns the database connection for the current process, opening it if needed.  Connections
+        can't be shared with forked processes, so each process opens its own.  Must be called with the
+        lock held
+        :return: a sqlite3.Connection
+        """
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS image_dimensions ('
+                                    'url TEXT PRIMARY KEY, width INTEGER, height INTEGER, '
+                                    'content_length INTEGER, etag TEXT)')
+            self.connection.commit()
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def remove(self):
+        """
+        Closes the database and deletes its file, if it is a temporary file created by this process
+        :return:
+        """
+        if not self.temporary or os.getpid() != self.owner_pid:
+            return
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            if os.path.exists(self.db_path):
+                os.remove(self.db_path)
+
+    def get(self, url):
+        """
+        Looks up an image in the table
+        :param url: the url of the image
+        :return: width, height, content_length, etag, or None if the image isn't in the table
+        """
+        with self.lock:
+            row = self.get_connection().execute('SELECT width, height, content_length, etag '
+                                                'FROM image_dimensions WHERE url = ?', (url,)).fetchone()
+        counter = self.misses if row is None else self.hits
+        with counter.get_lock():
+            counter.value += 1
+        return row
+
+    def put(self, url, width, height, content_length=None, etag=None):
+        """
+        Adds an image to the table, replacing any earlier entry for the same url
+        :param url: the url of the image
+        :param width: the width of the image in pixels
+        :param height: the height of the image in pixels
+        :param content_length: the size of the image file in bytes, if known
+        :param etag: the ETag header the image was served with, if any
+        :return:
+        """
+        with self.lock:
+            connection = self.get_connection()
+            connection.execute('INSERT OR REPLACE INTO image_dimensions VALUES (?, ?, ?, ?, ?)',
+                               (url, width, height, content_length, etag))
+            connection.commit()
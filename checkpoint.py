@@ -0,0 +1,104 @@
+import cPickle
+import json
+import sqlite3
+
+
+class ScrapeCheckpoint(object):
+    """
+    A durable journal of a scrape run, kept in a SQLite database, so that a run that dies part way
+    through can be restarted without losing its work.  The journal records the list of article urls the
+    run collected, and then each article as it is scraped (or the error that stopped it from being
+    scraped) along with the value of the scraper's object_index after the article's IDs were assigned.
+    Articles are always journaled in the order of the article list, so a restarted run replays the
+    journaled articles, restores object_index, and carries on with the rest of the list, giving every
+    article the same post and image IDs it would have had if the run hadn't stopped.
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: the path of the SQLite database file. Created if it doesn't exist
+        :return:
+        """
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS run (run_key TEXT, article_list TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS articles ('
+                                'position INTEGER PRIMARY KEY, url TEXT, article BLOB, error TEXT, '
+                                'object_index INTEGER)')
+        self.connection.commit()
+        self.run_key = None
+
+    def start(self, run_key):
+        """
+        Starts or resumes a run.  If the journal holds a different run, it is cleared
+        :param run_key: a string identifying the run, made from the settings that decide which articles
+        are scraped and which IDs they get
+        :return: whether an earlier run with the same key is being resumed
+        """
+        self.run_key = run_key
+        row = self.connection.execute('SELECT run_key FROM run').fetchone()
+        if row is not None and row[0] == run_key:
+            return True
+
+        self.clear()
+        self.connection.execute('INSERT INTO run VALUES (?, NULL)', (run_key,))
+        self.connection.commit()
+        return False
+
+    def clear(self):
+        """
+        Removes everything from the journal
+        :return:
+        """
+        self.connection.execute('DELETE FROM run')
+        self.connection.execute('DELETE FROM articles')
+        self.connection.commit()
+
+    def get_article_list(self):
+        """
+        Returns the article list journaled for the current run
+        :return: the list of article urls, or None if the run hasn't collected its list yet
+        """
+        row = self.connection.execute('SELECT article_list FROM run WHERE run_key = ?', (self.run_key,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def save_article_list(self, article_list):
+        """
+        Journals the article list collected for the current run
+        :param article_list: the list of article urls
+        :return:
+        """
+        self.connection.execute('UPDATE run SET article_list = ? WHERE run_key = ?',
+                                (json.dumps(article_list), self.run_key))
+        self.connection.commit()
+
+    def iter_articles(self):
+        """
+        Generator over the journaled articles in the order they were scraped
+        :return: yields url, article_dict, error, object_index tuples. article_dict is None if the
+        article couldn't be scraped, and error is None if it could
+        """
+        rows = self.connection.execute('SELECT url, article, error, object_index FROM articles ORDER BY position')
+        for url, article, error, object_index in rows:
+            if article is not None:
+                article = cPickle.loads(str(article))
+            yield url, article, error, object_index
+
+    def add_article(self, position, url, article_dict, error, object_index):
+        """
+        Journals a scraped article, or the error that stopped it from being scraped
+        :param position: the position of the article in the article list
+        :param url: the url of the article
+        :param article_dict: the article dictionary, or None if the article couldn't be scraped
+        :param error: the description of the error, or None if the article was scraped
+        :param object_index: the scraper's object_index after the article's IDs were assigned
+        :return:
+        """
+        if article_dict is not None:
+            article_dict = sqlite3.Binary(cPickle.dumps(article_dict, cPickle.HIGHEST_PROTOCOL))
+        self.connection.execute('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)',
+                                (position, url, article_dict, error, object_index))
+        self.connection.commit()
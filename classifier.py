@@ -1,16 +1,101 @@
+import hashlib
+import itertools
+import marshal
 import os
 import re
 import numpy as np
 from time import time
-from scraper import NewsSiteScraper
-from prettytable import PrettyTable
+from scraper import NewsSiteScraper, ordered_map
+from metrics import get_multilabel_metrics
 from random import randint
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
 from sklearn.preprocessing import MultiLabelBinarizer
 from sklearn.multiclass import OneVsRestClassifier
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, TfidfTransformer, HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.utils import check_random_state
+from features import FeatureStore
 from sklearn.svm import LinearSVC
 
 
+# The first item of the header of a packed training archive, changed whenever the layout changes
+TRAINING_ARCHIVE_FORMAT = 'classification-training-archive-1'
+
+
+class OnlineOneVsRestClassifier(BaseEstimator, ClassifierMixin):
+    """
+    A one vs rest classifier that is trained a mini-batch at a time: each category has its own copy of
+    an SGDClassifier, which partial_fit updates with every batch, so the training set never has to be
+    held in memory.  Used by ArticleClassifier.fit_out_of_core in place of OneVsRestClassifier(LinearSVC()).
+    sklearn's OneVsRestClassifier can't partial_fit multilabel categories, so this stands in for it.
+
+    It is a scikit-learn estimator, so it can be cloned, and fit trains it on a whole training set at
+    once, as cross validation does
+    """
+
+    classes = np.array([0, 1])
+
+    def __init__(self, num_labels=1, estimator=None):
+        """
+        :param num_labels: the number of categories
+        :param estimator: the classifier to copy for each category. An SGDClassifier that makes five
+        passes over the training set when fitted, with no early stopping, is used if none is given.  The
+        passes and tolerance are given explicitly, since scikit-learn's defaults for them change in 0.21
+        :return:
+        """
+        self.num_labels = num_labels
+        self.estimator = estimator
+
+    def make_estimators(self):
+        """
+        Makes a fresh, untrained copy of the estimator for each category
+        :return:
+        """
+        estimator = self.estimator if self.estimator is not None else SGDClassifier(max_iter=5, tol=float('-inf'))
+        self.estimators_ = [clone(estimator) for index in xrange(self.num_labels)]
+
+    def partial_fit(self, x, y):
+        """
+        Trains every category's classifier on a mini-batch
+        :param x: the features of the batch, one row per article
+        :param y: the binarized categories of the batch, one column per category
+        :return: self
+        """
+        if not hasattr(self, 'estimators_'):
+            self.make_estimators()
+        y = np.asarray(y)
+        for index, estimator in enumerate(self.estimators_):
+            estimator.partial_fit(x, y[:, index], classes=self.classes)
+        return self
+
+    def fit(self, x, y):
+        """
+        Trains every category's classifier afresh on a whole training set
+        :param x: the features of the articles, one row per article
+        :param y: the binarized categories, one column per category
+        :return: self
+        """
+        self.make_estimators()
+        y = np.asarray(y)
+        for index, estimator in enumerate(self.estimators_):
+            if len(np.unique(y[:, index])) < 2:
+                # SGDClassifier can't be fitted on one class, but partial_fit is told both classes
+                estimator.partial_fit(x, y[:, index], classes=self.classes)
+            else:
+                estimator.fit(x, y[:, index])
+        return self
+
+    def predict(self, x):
+        """
+        :param x: the features of the articles, one row per article
+        :return: the binarized predicted categories, one column per category
+        """
+        return np.column_stack([estimator.predict(x) for estimator in self.estimators_])
+
+
 class ArticleClassifier(object):
     """
     class to classify a set of text documents into categories based on a training set of data.
@@ -25,14 +110,52 @@ class ArticleClassifier(object):
         ---classification-training-metadata---
         ...Article Body...
     """
-    def __init__(self):
-        self.article_scraper = NewsSiteScraper()
+    def __init__(self, store_path=None, feature_store_dir=None):
+        """
+        :param store_path: the path of an ArticleStore database.  If it is given, the articles scraped
+        for a training set are saved in it, and read_store_training_dictionary can read training sets
+        from it
+        :param feature_store_dir: the directory of a FeatureStore to keep the training set's n-gram
+        counts in, so they are only counted once, or None to count them every time the classifier is
+        trained
+        :return:
+        """
+        self.store_path = store_path
+        self.article_scraper = NewsSiteScraper(store_path=store_path)
+        self.article_store = self.article_scraper.article_store
+        self.ignored_categories = {'Regular News', 'Secondary Story', 'Home Page'}
         self.metadata_regex = re.compile(r"^---classification-training-metadata---$")
         self.category_regex = re.compile(r"^category: (.+)$")
 
         self.vectorizer = TfidfVectorizer(ngram_range=(1, 2))
         self.clf = OneVsRestClassifier(LinearSVC())
 
+        if feature_store_dir is not None:
+            self.feature_store = FeatureStore(feature_store_dir, ngram_range=self.vectorizer.ngram_range)
+        else:
+            self.feature_store = None
+
+    def __getstate__(self):
+        """
+        Leaves the scraper out when the classifier is pickled, as classify_currents.py does with joblib;
+        its thread locks, shared counters and database connections can't be pickled
+        :return:
+        """
+        state = self.__dict__.copy()
+        del state['article_scraper']
+        del state['article_store']
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled classifier, with a new scraper
+        :param state: the state returned by __getstate__
+        :return:
+        """
+        self.__dict__.update(state)
+        self.article_scraper = NewsSiteScraper(store_path=self.store_path)
+        self.article_store = self.article_scraper.article_store
+
     def save_training_set(self, training_dictionary, path='training_articles/'):
         """
         Takes a dictionary of training articles and saves them to the directory
@@ -72,13 +195,15 @@ class ArticleClassifier(object):
         :return:
         """
         base_folder = 'training_articles/'
-        articles_dictionary = self.article_scraper.get_articles_dictionary()
+
+        articles = self.article_scraper.get_articles_dictionary().iteritems()
+
         training_dictionary = dict()
 
         if not os.path.exists(base_folder):
             os.makedirs(base_folder)
 
-        for article_url, article_dict in articles_dictionary.iteritems():
+        for article_url, article_dict in articles:
             categories = article_dict['categories']
             article_body = article_dict['article_body_no_html']
             file_name = article_dict['file_name']
@@ -87,16 +212,47 @@ class ArticleClassifier(object):
                                               'article_body': article_body}
         return training_dictionary
 
-    def read_training_dictionary(self, training_set_path='training_articles/'):
+    def read_store_training_dictionary(self, start_date=None, end_date=None, category=None):
+        """
+        Reads the articles in the article store from the given date range and category, and returns a
+        dictionary in the same form as read_training_dictionary, keyed by article url
+        :param start_date: the earliest article date to include, as yyyy-mm-dd, or None
+        :param end_date: the latest article date to include, as yyyy-mm-dd, or None
+        :param category: only include articles in this category, or None for all categories
+        :raises: ValueError: if the classifier has no article store
+        :return:
+        """
+        if self.article_store is None:
+            raise ValueError("Reading a training set from the article store requires a store_path")
+
+        articles_dictionary = dict()
+        num_no_categories = 0
+
+        for article_url, article_dict in self.article_store.iter_articles(start_date, end_date, category):
+            categories = [category_name for category_name in article_dict['categories']
+                          if category_name not in self.ignored_categories]
+
+            if len(categories) > 0:
+                articles_dictionary[article_url] = {'categories': categories,
+                                                    'article_body': article_dict['article_body_no_html'] or ''}
+            else:
+                num_no_categories += 1
+        print "Number of articles with no categories (removed): " + str(num_no_categories)
+        return articles_dictionary
+
+    def read_training_dictionary(self, training_set_path='training_articles/', workers=1, archive_path=None):
         """
         reads all articles in the given directory and returns a dictionary of dictionaries, where each
         key is a training article path, and each value is a dictionary consisting of a list of the
         training article's categories and its text.  If training_set_path is none or the path doesn't exist,
         a training set is downloaded from news.ucsc.edu
         :param training_set_path:
+        :param workers: the number of files to read at the same time
+        :param archive_path: the path of a packed training archive to read the articles from, or None to
+        read the directory.  The archive is made (or made again, if the directory has changed since it
+        was packed) first
         :return:
         """
-        reading_metadata = False
         articles_dictionary = dict()
 
         """
@@ -106,42 +262,272 @@ class ArticleClassifier(object):
             training_dictionary = self.download_training_set()
             self.save_training_set(training_dictionary, training_set_path)
 
-        num_no_categories = 0
+        if archive_path is not None:
+            articles = self.iter_training_archive(training_set_path, archive_path, workers)
+        else:
+            articles = self.iter_training_files(training_set_path, workers)
 
-        for root, subdirs, files in os.walk(training_set_path):
+        num_no_categories = 0
 
-            for filename in files:
-                file_path = os.path.join(root, filename)
-                if reading_metadata is True:
-                    exit()
-                article_dict = dict()
-                categories = []
-
-                with open(file_path, 'r') as infile:
-                    article_body = ''
-                    for line in infile:
-                        if self.metadata_regex.match(line) is not None:
-                            reading_metadata = not reading_metadata
-                        elif reading_metadata:
-                            matches = self.category_regex.findall(line)
-                            if matches:
-                                if matches[0] != 'Regular News' \
-                                        and matches[0] != 'Secondary Story' \
-                                        and matches[0] != 'Home Page':
-                                    categories.append(matches[0])
-                        else:
-                            article_body += line
-
-                    article_dict['categories'] = categories
-                    article_dict['article_body'] = article_body
-
-                    if len(article_dict['categories']) > 0:
-                        articles_dictionary[file_path] = article_dict
-                    else:
-                        num_no_categories += 1
+        for file_path, categories, article_body in articles:
+            if len(categories) > 0:
+                articles_dictionary[file_path] = {'categories': categories, 'article_body': article_body}
+            else:
+                num_no_categories += 1
         print "Number of articles with no categories (removed): " + str(num_no_categories)
         return articles_dictionary
 
+    def read_training_metadata(self, infile):
+        """
+        Reads the metadata at the top of an open training article a line at a time, leaving the file at
+        the start of the article body.  The metadata is the lines between the first two metadata
+        markers, and must start on the first line; a file that doesn't start with a marker has no
+        metadata, and its first line is part of the body
+        :param infile: the open training article
+        :return: categories, body_start: the article's categories, leaving out the ignored categories, and
+        any of the body that was read along with the metadata
+        """
+        categories = []
+
+        line = infile.readline()
+        if self.metadata_regex.match(line) is None:
+            return categories, line
+
+        while True:
+            line = infile.readline()
+            if not line or self.metadata_regex.match(line) is not None:
+                break
+            matches = self.category_regex.findall(line)
+            if matches and matches[0] not in self.ignored_categories:
+                categories.append(matches[0])
+
+        return categories, ''
+
+    def read_training_categories(self, file_path):
+        """
+        Reads the categories from the metadata of a training article, without reading its body
+        :param file_path: the path of the training article
+        :return: the list of the article's categories, leaving out the ignored categories
+        """
+        with open(file_path, 'r') as infile:
+            categories, body_start = self.read_training_metadata(infile)
+        return categories
+
+    def read_training_article(self, file_path):
+        """
+        Reads a training article: the metadata is read a line at a time, and then the rest of the file
+        is read as the article body in one go
+        :param file_path: the path of the training article
+        :return: categories, article_body, leaving out the ignored categories.  A file that doesn't
+        start with metadata has no categories
+        """
+        with open(file_path, 'r') as infile:
+            categories, body_start = self.read_training_metadata(infile)
+            return categories, body_start + infile.read()
+
+    def iter_training_paths(self, training_set_path='training_articles/'):
+        """
+        Generator over the paths of the training articles in a directory and its subdirectories
+        :param training_set_path:
+        :return: yields file paths
+        """
+        for root, subdirs, files in os.walk(training_set_path):
+            for filename in files:
+                yield os.path.join(root, filename)
+
+    def iter_training_files(self, training_set_path='training_articles/', workers=1):
+        """
+        Generator over every file in a training set directory, in os.walk order
+        :param training_set_path:
+        :param workers: the number of files to read at the same time
+        :return: yields file_path, categories, article_body tuples, including articles with no categories
+        """
+        return self.read_training_files(list(self.iter_training_paths(training_set_path)), workers)
+
+    def read_training_files(self, file_paths, workers=1):
+        """
+        Generator over the training articles in a list of files, in the order of the list.  With more
+        than one worker, the files are read ahead on a pool of threads, but never more than a few per
+        worker, so the articles don't pile up in memory
+        :param file_paths: the paths of the training articles
+        :param workers: the number of files to read at the same time
+        :return: yields file_path, categories, article_body tuples, including articles with no categories
+        """
+        if workers <= 1:
+            for file_path in file_paths:
+                categories, article_body = self.read_training_article(file_path)
+                yield file_path, categories, article_body
+            return
+
+        pool = ThreadPool(workers)
+        try:
+            articles = ordered_map(pool, self.read_training_article, file_paths, workers * 4)
+            for file_path, (categories, article_body) in itertools.izip(file_paths, articles):
+                yield file_path, categories, article_body
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def iter_training_articles(self, training_set_path='training_articles/', workers=1):
+        """
+        Generator over the training articles in a directory, reading one article at a time (or a few
+        per worker).  Articles with no categories are skipped
+        :param training_set_path:
+        :param workers: the number of files to read at the same time
+        :return: yields file_path, categories, article_body tuples
+        """
+        for file_path, categories, article_body in self.iter_training_files(training_set_path, workers):
+            if len(categories) > 0:
+                yield file_path, categories, article_body
+
+    def get_training_set_stamp(self, training_set_path):
+        """
+        Returns a stamp that changes whenever a file is added to, removed from, renamed in or changed in
+        a training set directory, along with the ignored categories the articles were read with.  The
+        path, size and modification time of every file are hashed, so replacing a file with one of an
+        older modification time changes the stamp too
+        :param training_set_path:
+        :return: a hex digest
+        """
+        digest = hashlib.sha1()
+        digest.update(repr(sorted(self.ignored_categories)))
+        for file_path in sorted(self.iter_training_paths(training_set_path)):
+            file_stat = os.stat(file_path)
+            digest.update(repr((os.path.relpath(file_path, training_set_path), file_stat.st_size,
+                                file_stat.st_mtime)))
+        return digest.hexdigest()
+
+    def pack_training_set(self, training_set_path='training_articles/', archive_path='training_articles.marshal',
+                          workers=1):
+        """
+        Packs every article in a training set directory into a single archive file, so that later runs
+        can load the training set with one sequential read instead of opening thousands of files.  The
+        archive holds a header with the stamp of the directory, then one marshalled file_path,
+        categories, article_body tuple per article.  It is written to a temporary file and renamed into
+        place, so an interrupted pack never leaves a broken archive
+        :param training_set_path:
+        :param archive_path: the path of the archive file
+        :param workers: the number of files to read at the same time
+        :return:
+        """
+        stamp = self.get_training_set_stamp(training_set_path)
+        temp_path = archive_path + '.tmp'
+
+        with open(temp_path, 'wb') as outfile:
+            marshal.dump((TRAINING_ARCHIVE_FORMAT, stamp), outfile)
+            for article in self.iter_training_files(training_set_path, workers):
+                marshal.dump(article, outfile)
+
+        os.rename(temp_path, archive_path)
+
+    def read_training_archive_header(self, archive_path):
+        """
+        :param archive_path: the path of the archive file
+        :return: the stamp the archive was packed with, or None if there is no readable archive
+        """
+        try:
+            with open(archive_path, 'rb') as infile:
+                archive_format, stamp = marshal.load(infile)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+        if archive_format != TRAINING_ARCHIVE_FORMAT:
+            return None
+        return stamp
+
+    def iter_training_archive(self, training_set_path='training_articles/', archive_path='training_articles.marshal',
+                              workers=1):
+        """
+        Generator over the articles in a packed training archive.  If the archive is missing, or the
+        training set directory has changed since it was packed, it is packed again first
+        :param training_set_path:
+        :param archive_path: the path of the archive file
+        :param workers: the number of files to read at the same time if the archive has to be packed
+        :return: yields file_path, categories, article_body tuples, including articles with no categories
+        """
+        stamp = self.get_training_set_stamp(training_set_path)
+        if self.read_training_archive_header(archive_path) != stamp:
+            self.pack_training_set(training_set_path, archive_path, workers)
+
+        with open(archive_path, 'rb') as infile:
+            marshal.load(infile)
+            while True:
+                try:
+                    file_path, categories, article_body = marshal.load(infile)
+                except EOFError:
+                    break
+                yield file_path, categories, article_body
+
+    def fit_out_of_core(self, training_set_path='training_articles/', batch_size=1000, n_features=2 ** 20,
+                        workers=1, epochs=5, shuffle=True, random_state=None):
+        """
+        Trains the classifier without ever holding the training set or a vocabulary in memory.  The
+        categories are found first by reading only the metadata of each article.  The articles are then
+        read again in mini-batches of batch_size, turned into features by a HashingVectorizer, which
+        needs no vocabulary, and used to update an OnlineOneVsRestClassifier with partial_fit.  This is
+        repeated for each epoch, by default in a new random order of the files each time, so that the
+        batches aren't all from the same part of the directory and the last ones don't outweigh the
+        rest.  Memory use depends on batch_size, n_features and the number of categories, not on the
+        size of the training set; only the list of file paths is kept.  If the training set path doesn't
+        exist, a training set is downloaded from news.ucsc.edu first.  predict can be used afterwards as
+        usual
+        :param training_set_path:
+        :param batch_size: the number of articles to train on at a time
+        :param n_features: the number of hashed features; more means fewer n-grams share a feature
+        :param workers: the number of files to read at the same time
+        :param epochs: the number of passes over the training set
+        :param shuffle: whether to read the files in a new random order for each epoch, rather than in
+        os.walk order
+        :param random_state: the seed or numpy RandomState to shuffle with, or None
+        :return: a dictionary of category index: category name, as returned by dictionary_to_xytrain
+        """
+        if not os.path.exists(training_set_path):
+            training_dictionary = self.download_training_set()
+            self.save_training_set(training_dictionary, training_set_path)
+
+        categories_dict = dict()
+        file_paths = []
+        for file_path in self.iter_training_paths(training_set_path):
+            categories = self.read_training_categories(file_path)
+            if len(categories) > 0:
+                file_paths.append(file_path)
+            for category in categories:
+                if category not in categories_dict:
+                    categories_dict[category] = len(categories_dict)
+
+        random_state = check_random_state(random_state)
+        self.vectorizer = HashingVectorizer(ngram_range=(1, 2), n_features=n_features)
+        estimator = SGDClassifier(max_iter=5, tol=float('-inf'), random_state=random_state)
+        self.clf = OnlineOneVsRestClassifier(len(categories_dict), estimator)
+
+        print 'training classifier out of core...'
+        t0 = time()
+        num_articles = 0
+
+        for epoch in xrange(epochs):
+            if shuffle:
+                random_state.shuffle(file_paths)
+            articles = self.read_training_files(file_paths, workers)
+
+            while True:
+                batch = list(itertools.islice(articles, batch_size))
+                if not batch:
+                    break
+
+                xtrain = []
+                ytrain = np.zeros((len(batch), len(categories_dict)), dtype=int)
+                for row, (file_path, categories, article_body) in enumerate(batch):
+                    xtrain.append(article_body)
+                    for category in categories:
+                        ytrain[row, categories_dict[category]] = 1
+
+                self.clf.partial_fit(self.vectorizer.transform(xtrain), ytrain)
+                num_articles += len(batch)
+
+        train_time = time() - t0
+        print("train time: %0.3fs for %d articles in %d epochs" % (train_time, num_articles, epochs))
+
+        return {v: k for k, v in categories_dict.items()}
+
     def dictionary_to_xytrain(self, training_dictionary, randomize=False):
         """
         Takes a dictionary of training articles and splits them up into xtrain and ytrain sets. Also returns
@@ -249,114 +635,106 @@ class ArticleClassifier(object):
     def multilabel_confusion_matrix(self, y_true, y_pred, cutoff, class_labels=None):
         """
         Prints a confusion matrix consisting of True positives, False Positives, False Negatives, and
-        True negatives for each class
+        True negatives for each class, with each class's precision, recall and F1 and the macro and
+        micro averaged totals.  The counts for every class are made at once with numpy
         :param y_true:
         :param y_pred:
         :param cutoff:
         :param class_labels:
-        :return:
+        :return: the MultilabelMetrics the table was made from
         """
+        metrics = get_multilabel_metrics(y_true, y_pred, cutoff)
+        print metrics.get_table(class_labels)
+        return metrics
 
-        # Initialize the confusion matrix
-
-        confusion_matrix = []
-
-        totals = [0, 0, 0, 0]
-
-        for index in xrange(len(y_true[0])):
-            confusion_matrix.append([0, 0, 0, 0])
-
-        for article_index in xrange(len(y_true)):
-            predicted_categories_list = y_pred[article_index]
-            for index in xrange(len(predicted_categories_list)):
-                if predicted_categories_list[index] >= cutoff:
-                    if y_true[article_index][index] == 1:
-                        # print "true positive"
-                        confusion_matrix[index][0] += 1
-                        totals[0] += 1
-                    else:
-                        # print "false positive"
-                        confusion_matrix[index][1] += 1
-                        totals[1] += 1
-                else:
-                    if y_true[article_index][index] == 1:
-                        # print "false negative"
-                        confusion_matrix[index][2] += 1
-                        totals[2] += 1
-                    else:
-                        # print "true negative"
-                        confusion_matrix[index][3] += 1
-                        totals[3] += 1
-
-        table = PrettyTable(['Labels', 'True Positives',
-                             'False Positives', 'False Negatives',
-                             'True Negatives', 'Precision',
-                             'Recall', 'F1'
-                             ])
-
-        total_precision = 0
-        precision_samples = 0
-        total_recall = 0
-        recall_samples = 0
-
-        for index in xrange(len(confusion_matrix)):
-
-            # Precision = True Positives / True Positives + False Positives
-            # Recall    = True Positives / True Positives + False Negatives
-
-            if confusion_matrix[index][1] == 0:
-                precision = 1
-            else:
-                precision = (confusion_matrix[index][0] + 0.0) / \
-                            (confusion_matrix[index][0] + confusion_matrix[index][1])
-
-            total_precision += precision
-            precision_samples += 1
-
-            if confusion_matrix[index][2] == 0:
-                recall = 1
-            else:
-                recall = (confusion_matrix[index][0] + 0.0) / \
-                         (confusion_matrix[index][0] + confusion_matrix[index][2])
-            total_recall += recall
-            recall_samples += 1
-
-            if precision + recall == 0:
-                f1_score = 0
-            else:
-                f1_score = 2 * ((precision * recall) / (precision + recall + 0.0))
-
-            if class_labels is None:
-                table.add_row([index, ] + confusion_matrix[index] + [precision, recall])
-            else:
-                table.add_row([class_labels[index], ] + confusion_matrix[index] + [precision, recall, f1_score])
-
-        macro_avg_precision = (total_precision + 0.0) / precision_samples
-        macro_avg_recall = (total_recall + 0.0) / recall_samples
-        macro_avg_f1 = 2 * ((macro_avg_precision * macro_avg_recall) / (macro_avg_precision + macro_avg_recall + 0.0))
+    def get_folds(self, num_samples, k):
+        """
+        Splits the indexes of a training set into k folds for cross validation.  The folds are made with
+        np.array_split, so their sizes differ by at most one and every sample is tested exactly once
+        :param num_samples: the number of samples in the training set
+        :param k: the number of folds
+        :return: a list of k train_indices, test_indices tuples of index arrays
+        """
+        test_folds = np.array_split(np.arange(num_samples), k)
 
-        table.add_row(['Macro Averaged Totals', ] + [str(i) for i in totals] +
-                      [str(macro_avg_precision), str(macro_avg_recall), str(macro_avg_f1)])
+        folds = []
+        for x in xrange(k):
+            train_indices = np.concatenate(test_folds[:x] + test_folds[x + 1:])
+            folds.append((train_indices, test_folds[x]))
+        return folds
 
-        micro_avg_precision = (totals[0] + 0.0) / (totals[0] + totals[1])
-        micro_avg_recall = (totals[0] + 0.0) / (totals[0] + totals[2])
-        micro_avg_f1 = 2 * ((micro_avg_precision * micro_avg_recall) / (micro_avg_precision + micro_avg_recall + 0.0))
+    def get_tfidf_transformer(self):
+        """
+        Returns an unfitted TfidfTransformer with the same weighting as the classifier's vectorizer, for
+        weighting the counts from the feature store
+        :raises: ValueError: if the vectorizer doesn't weight by TF-IDF, such as the HashingVectorizer of
+        fit_out_of_core
+        :return:
+        """
+        if isinstance(self.vectorizer, TfidfVectorizer):
+            return TfidfTransformer(norm=self.vectorizer.norm, use_idf=self.vectorizer.use_idf,
+                                    smooth_idf=self.vectorizer.smooth_idf, sublinear_tf=self.vectorizer.sublinear_tf)
+        if hasattr(self.vectorizer, 'steps') and isinstance(self.vectorizer.steps[-1][1], TfidfTransformer):
+            # fit has already replaced the vectorizer with a feature store pipeline
+            return clone(self.vectorizer.steps[-1][1])
+        raise ValueError("The feature store can only be used with a TF-IDF vectorizer")
+
+    def uses_feature_store(self):
+        """
+        Returns whether training and cross validation read the n-gram counts from the feature store.
+        Hashed features, as made by fit_out_of_core, don't have a vocabulary to store counts for, so
+        they are always made from the articles
+        :return:
+        """
+        return self.feature_store is not None and not isinstance(self.vectorizer, HashingVectorizer)
 
-        table.add_row(['Micro Averaged Totals', ] + [str(i) for i in totals] +
-                      [str(micro_avg_precision), str(micro_avg_recall), str(micro_avg_f1)])
+    def score_fold(self, xtrain, ytrain, train_indices, test_indices, counts=None):
+        """
+        Trains a fresh copy of the vectorizer and classifier on one cross validation fold and scores its
+        predictions for the held out samples.  The classifier's own vectorizer and classifier are left
+        as they were.  If the n-gram counts of the articles are given, the TF-IDF weights are worked out
+        from the counts of the fold's training rows instead of tokenizing the articles again.  The store's
+        vocabulary comes from every article, so only the n-grams that appear in the fold's training rows
+        are kept, as a vectorizer fitted to those rows alone would; n-grams only found in the held out
+        rows would otherwise get the highest idf and skew the normalization of those rows
+        :param xtrain: a numpy object array of the article bodies
+        :param ytrain: the binarized categories
+        :param train_indices: the indexes of the samples to train on
+        :param test_indices: the indexes of the samples to test on
+        :param counts: the n-gram counts of xtrain from the feature store, or None
+        :return: a MultilabelMetrics
+        """
+        clf = clone(self.clf)
+
+        if counts is not None:
+            train_counts = counts[train_indices]
+            columns = np.unique(train_counts.indices)
+            transformer = self.get_tfidf_transformer()
+            x_train = transformer.fit_transform(train_counts[:, columns])
+            x_test = transformer.transform(counts[test_indices][:, columns])
+        else:
+            vectorizer = clone(self.vectorizer)
+            x_train = vectorizer.fit_transform(xtrain[train_indices])
+            x_test = vectorizer.transform(xtrain[test_indices])
 
-        print table
+        clf.fit(x_train, ytrain[train_indices])
+        predicted = clf.predict(x_test)
+        return get_multilabel_metrics(ytrain[test_indices], predicted, 1)
 
-    def kfold_validation(self, k, xtrain, ytrain, inv_categories_dict):
+    def kfold_validation(self, k, xtrain, ytrain, inv_categories_dict, workers=1):
         """
-
-        :param k:
-        :param xtrain:
-        :param ytrain:
-        :param inv_categories_dict:
-        :return:
+        Runs k-fold cross validation, printing the confusion matrix of each fold and then of all the
+        folds together.  The folds are index arrays into the training set, so the articles are never
+        copied.  With more than one worker the folds are run at the same time in a pool of processes,
+        which inherit the training set when they are forked rather than having it sent to them
+        :param k: the number of folds
+        :param xtrain: the list of article bodies
+        :param ytrain: the binarized categories
+        :param inv_categories_dict: a dictionary of category index: category name
+        :param workers: the number of folds to run at the same time
+        :return: the MultilabelMetrics of all the folds together
         """
-        slice_size = len(xtrain) / k
+        global kfold_training_set
 
         labels = []
 
@@ -364,31 +742,62 @@ class ArticleClassifier(object):
         for index in xrange(len(inv_categories_dict.keys())):
             labels.append(inv_categories_dict[index])
 
-        print 'Starting {}-fold Cross Validation.'.format(k)
-        print 'Total sample size: {}. Slice Size: {}'.format(len(xtrain), slice_size)
+        if self.uses_feature_store():
+            counts = self.feature_store.get_counts(xtrain)
+        else:
+            counts = None
 
-        for x in xrange(0, k):
-            slice_start = x * slice_size
-            slice_end = (x + 1) * slice_size
-            print 'Run {} of {}-fold Cross Validation'.format(x + 1, k)
+        xtrain = np.asarray(xtrain, dtype=object)
+        ytrain = np.asarray(ytrain)
+        folds = self.get_folds(len(xtrain), k)
+        fold_sizes = [len(test_indices) for train_indices, test_indices in folds]
 
-            inner_xtrain, inner_ytrain, outer_xtrain, outer_ytrain = \
-                self.slice_training_set(xtrain, ytrain, slice_start, slice_end)
+        print 'Starting {}-fold Cross Validation.'.format(k)
+        print 'Total sample size: {}. Slice Size: {}-{}'.format(len(xtrain), min(fold_sizes), max(fold_sizes))
 
-            self.fit(outer_xtrain, outer_ytrain)
-            predicted = self.predict(inner_xtrain)
-            print self.multilabel_confusion_matrix(inner_ytrain, predicted, 1, labels)
+        pool = None
+        if workers > 1:
+            kfold_training_set = (self, xtrain, ytrain, counts)
+            pool = Pool(min(workers, k))
+            fold_metrics = pool.imap(kfold_worker, folds)
+        else:
+            fold_metrics = (self.score_fold(xtrain, ytrain, train_indices, test_indices, counts)
+                            for train_indices, test_indices in folds)
+
+        total_metrics = None
+        try:
+            for x, metrics in enumerate(fold_metrics):
+                print 'Run {} of {}-fold Cross Validation'.format(x + 1, k)
+                print metrics.get_table(labels)
+                total_metrics = metrics if total_metrics is None else total_metrics + metrics
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                kfold_training_set = None
 
         print '{}-fold Cross Validation Complete.'.format(k)
+        print 'All {} folds together'.format(k)
+        print total_metrics.get_table(labels)
+
+        return total_metrics
 
     def fit(self, xtrain, ytrain):
         """
-
+        Trains the classifier.  If the classifier has a feature store, the n-gram counts of xtrain are
+        read from it (or counted and saved in it the first time), and the vectorizer is replaced by a
+        pipeline of the store's fixed vocabulary and a TfidfTransformer fitted to the counts
         :param xtrain:
         :param ytrain:
         :return:
         """
-        x_train = self.vectorizer.fit_transform(xtrain)
+        if self.uses_feature_store():
+            counts = self.feature_store.get_counts(xtrain)
+            transformer = self.get_tfidf_transformer()
+            x_train = transformer.fit_transform(counts)
+            self.vectorizer = make_pipeline(self.feature_store.get_vectorizer(), transformer)
+        else:
+            x_train = self.vectorizer.fit_transform(xtrain)
         print 'training classifier...'
         t0 = time()
         self.clf.fit(x_train, ytrain)
@@ -408,3 +817,19 @@ class ArticleClassifier(object):
         predict_time = time() - t0
         print("prediction time: %0.3fs" % predict_time)
         return predicted
+
+
+# The classifier, article bodies, categories and n-gram counts of the cross validation in progress.  It is set
+# before the fold worker processes are forked, so they inherit it instead of having it pickled to them
+kfold_training_set = None
+
+
+def kfold_worker(fold):
+    """
+    Scores one cross validation fold in a worker process
+    :param fold: a train_indices, test_indices tuple from ArticleClassifier.get_folds
+    :return: the MultilabelMetrics of the fold
+    """
+    classifier, xtrain, ytrain, counts = kfold_training_set
+    train_indices, test_indices = fold
+    return classifier.score_fold(xtrain, ytrain, train_indices, test_indices, counts)
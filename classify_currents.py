@@ -1,3 +1,4 @@
+import argparse
 import pprint
 import os
 import datetime
@@ -78,7 +79,16 @@ def read_currents_test_data(test_set_path='test_articles/'):
     return currents_articles_dictionary
 
 
-def setup_and_save_classifier():
+def setup_and_save_classifier(store_path=None, start_date=None, end_date=None, category=None):
+    """
+    Trains the classifier and saves it in joblib/.  The training set is read from training_articles/,
+    or, if store_path is given, from the articles in the article store
+    :param store_path: the path of an ArticleStore database to read the training set from, or None
+    :param start_date: with store_path, the earliest article date to train on, as yyyy-mm-dd, or None
+    :param end_date: with store_path, the latest article date to train on, as yyyy-mm-dd, or None
+    :param category: with store_path, only train on articles in this category, or None
+    :return:
+    """
     print "Setting up classifier"
     if os.path.exists('joblib/'):
         if not os.path.isdir('joblib/'):
@@ -88,8 +98,14 @@ def setup_and_save_classifier():
         os.makedirs('joblib/')
         "Creating directory joblib/ to store classifier"
 
-    cls = ArticleClassifier()
-    training_dictionary = cls.read_training_dictionary()
+    cls = ArticleClassifier(store_path=store_path, feature_store_dir='joblib/features/')
+    if store_path is not None:
+        training_dictionary = cls.read_store_training_dictionary(start_date, end_date, category)
+        if not training_dictionary:
+            print 'No categorized articles in the article store match, unable to train'
+            exit()
+    else:
+        training_dictionary = cls.read_training_dictionary()
     xtrain, ytrain, inv_categories_dict = cls.dictionary_to_xytrain(training_dictionary)
     cls.fit(xtrain, ytrain)
 
@@ -109,20 +125,24 @@ def load_classifier():
     return classifier, inv_categories_dict
 
 
-def classify_articles_from_dictionary(test_articles_dictionary):
+def classify_articles_from_dictionary(test_articles_dictionary, store_path=None, start_date=None, end_date=None,
+                                      category=None):
     """
     classifies the article_body keys of each article dictionary in the test set and adds
     a category key and a list of categories to the subdictionary
     :param test_articles_dictionary:
-    :param xtrain:
-    :param ytrain:
+    :param store_path: if the classifier has to be trained, the article store to read the training set
+    from, or None to read training_articles/
+    :param start_date: the earliest article date in the store to train on, or None
+    :param end_date: the latest article date in the store to train on, or None
+    :param category: only train on articles in the store in this category, or None
     :return:
     """
     cls = None
     inv_categories_dict = None
 
     if not os.path.exists('joblib/'):
-        cls, inv_categories_dict = setup_and_save_classifier()
+        cls, inv_categories_dict = setup_and_save_classifier(store_path, start_date, end_date, category)
 
     if cls is None or inv_categories_dict is None:
         cls, inv_categories_dict = load_classifier()
@@ -147,6 +167,24 @@ def strip_tags(html):
     s.feed(html)
     return s.get_data()
 
+parser = argparse.ArgumentParser()
+
+parser.add_argument('--store', action='store', dest='store_path',
+                    help='Article store database to read the training set from, instead of training_articles/. '
+                         'Only used when there is no trained classifier in joblib/ yet')
+parser.add_argument('-s', action='store', dest='start_date',
+                    help='With --store, the earliest article date to train on, eg. yyyy-mm-dd')
+parser.add_argument('-e', action='store', dest='end_date',
+                    help='With --store, the latest article date to train on, eg. yyyy-mm-dd')
+parser.add_argument('--category', action='store', dest='category',
+                    help='With --store, only train on articles in this category')
+
+results = parser.parse_args()
+
+if results.store_path is None and (results.start_date or results.end_date or results.category):
+    print 'classify_currents: -s, -e and --category require --store'
+    exit()
+
 if os.path.exists('categorized_articles/'):
     if not os.path.isdir('categorized_articles/'):
         print 'Path is not a directory, unable to save'
@@ -159,7 +197,8 @@ utils = ArticleUtils()
 
 test_dictionary = read_currents_test_data()
 
-results_dict = classify_articles_from_dictionary(test_dictionary)
+results_dict = classify_articles_from_dictionary(test_dictionary, results.store_path, results.start_date,
+                                                 results.end_date, results.category)
 
 if os.path.exists('categorized_articles/'):
     if not os.path.isdir('categorized_articles/'):
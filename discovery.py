@@ -0,0 +1,306 @@
+import datetime
+import re
+import zlib
+from email.utils import parsedate
+
+import requests
+from lxml import etree
+from requests.packages.urllib3.exceptions import HTTPError as StreamError
+
+from fetcher import PageFetcher
+
+
+# The archive month in a news.ucsc.edu article url, eg. http://news.ucsc.edu/2016/05/example.html
+ARTICLE_MONTH_REGEX = re.compile(r"/(\d{4})/(\d{2})/[^/]+$")
+
+# The year and month at the start of a W3C or ISO 8601 date, as used by sitemaps and Atom
+ISO_MONTH_REGEX = re.compile(r"\s*(\d{4})-(\d{2})")
+
+
+# The errors that stop a feed from being read: failed requests, broken connections while it streams,
+# and malformed xml
+FEED_ERRORS = (requests.exceptions.RequestException, StreamError, zlib.error, etree.XMLSyntaxError)
+
+
+class NoFeedsReadException(Exception):
+    """
+    Exception for when none of the feeds given to FeedDiscovery could be read
+    """
+    def __init__(self, skipped_feeds):
+        Exception.__init__(self, "None of the feeds could be read: " +
+                           '; '.join(feed_url + ' (' + error + ')' for feed_url, error in skipped_feeds))
+
+
+class FeedReader(object):
+    """
+    A file-like object that reads a feed or sitemap a piece at a time from another file-like object,
+    decompressing it on the way if it is gzipped.  Gzipped sitemaps are recognised by their first bytes
+    rather than by their url or headers, and are decompressed without needing to seek, so they can be
+    read straight from the network
+    """
+
+    def __init__(self, fileobj, chunk_size=65536):
+        """
+        :param fileobj: the file-like object to read from
+        :param chunk_size: the number of bytes to read from fileobj at a time
+        :return:
+        """
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decompressor = None
+        self.started = False
+        self.finished = False
+        self.buffer = ''
+
+    def fill_buffer(self):
+        """
+        Reads the next chunk from fileobj into the buffer, decompressing it if needed
+        :return:
+        """
+        chunk = self.fileobj.read(self.chunk_size)
+
+        if not self.started:
+            self.started = True
+            if chunk[:2] == '\x1f\x8b':
+                # 16 + MAX_WBITS tells zlib to expect a gzip header
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        if not chunk:
+            self.finished = True
+            if self.decompressor is not None:
+                self.buffer += self.decompressor.flush()
+        elif self.decompressor is not None:
+            self.buffer += self.decompressor.decompress(chunk)
+        else:
+            self.buffer += chunk
+
+    def read(self, size=-1):
+        """
+        :param size: the number of bytes to read, or -1 to read to the end
+        :return: the bytes read, which are fewer than size only at the end of the feed
+        """
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            self.fill_buffer()
+
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def get_local_name(element):
+    """
+    Returns the tag name of an element without its namespace, or None for comments and
+    processing instructions
+    :param element: the lxml element
+    :return:
+    """
+    if not isinstance(element.tag, basestring):
+        return None
+    return etree.QName(element).localname
+
+
+def get_entry_month(url, date_text):
+    """
+    Works out the archive month an article belongs to, from its url if that has one, and otherwise from
+    the date given for it in the feed
+    :param url: the url of the article
+    :param date_text: the date from the feed, in W3C, ISO 8601 or RFC 822 form, or None
+    :return: year, month, or None if the month can't be worked out
+    """
+    matches = ARTICLE_MONTH_REGEX.search(url)
+    if matches:
+        return int(matches.group(1)), int(matches.group(2))
+
+    if date_text:
+        matches = ISO_MONTH_REGEX.match(date_text)
+        if matches:
+            return int(matches.group(1)), int(matches.group(2))
+        parsed = parsedate(date_text)
+        if parsed is not None:
+            return parsed[0], parsed[1]
+
+    return None
+
+
+class FeedDiscovery(object):
+    """
+    An article discovery backend for ArticleCollector that finds articles in sitemaps and RSS or Atom
+    feeds instead of the monthly archive pages, so that a run over recent months takes one or two
+    requests instead of one per month.  Sitemap indexes are followed to the sitemaps they list, skipping
+    those that haven't changed since before the start of the run.
+
+    Each feed is parsed with lxml's iterparse as it is downloaded, and every entry is discarded as soon
+    as it has been read, so even a sitemap of the whole site is never held in memory.
+
+    A feed that can't be fetched is skipped, and one that breaks off or turns out to be malformed part
+    of the way through keeps the entries read before the error.  Both are reported to the screen and
+    kept in skipped_feeds and partial_feeds for the run summary; if no feed at all can be read,
+    get_articles raises NoFeedsReadException rather than returning an empty list
+
+    Discovery backends have a single method, get_articles(screen, start_month, start_year, end_month,
+    end_year), which returns the list of article urls in the given months
+    """
+
+    def __init__(self, feed_urls, fetcher=None):
+        """
+        :param feed_urls: the urls of the sitemaps (plain or gzipped), sitemap indexes and RSS or Atom
+        feeds to read
+        :param fetcher: the PageFetcher to download feeds with. A PageFetcher without a cache is used
+        if none is given
+        :return:
+        """
+        self.feed_urls = feed_urls
+        self.fetcher = fetcher or PageFetcher()
+
+        # feed_url, error description tuples of the feeds the last get_articles couldn't read at all,
+        # and of those it only read part of
+        self.skipped_feeds = []
+        self.partial_feeds = []
+
+    def read_entry(self, element):
+        """
+        Reads the url and date of a sitemap url, a sitemap index entry, an RSS item or an Atom entry
+        :param element: the lxml element of the entry
+        :return: url, date_text; either can be None
+        """
+        url = None
+        date_text = None
+
+        for child in element:
+            name = get_local_name(child)
+            if name == 'loc':
+                url = (child.text or '').strip()
+            elif name == 'link':
+                if child.get('href') is not None:
+                    # Atom; the alternate link is the article itself
+                    if child.get('rel', 'alternate') == 'alternate':
+                        url = child.get('href').strip()
+                elif child.text:
+                    # RSS
+                    url = child.text.strip()
+            elif name in ('lastmod', 'pubDate', 'published', 'publication_date', 'date') and child.text:
+                date_text = child.text.strip()
+            elif name == 'updated' and child.text and date_text is None:
+                date_text = child.text.strip()
+
+        return url or None, date_text
+
+    def iter_feed(self, feed_url):
+        """
+        Generator over the entries of a sitemap, sitemap index or feed, read as it downloads
+        :param feed_url: the url of the feed
+        :raises: requests.exceptions.HTTPError: if the feed can't be fetched
+        :raises: lxml.etree.XMLSyntaxError: if the feed is malformed, once the entries before the error
+        have been yielded
+        :return: yields kind, url, date_text tuples, where kind is 'sitemap' for the entries of a
+        sitemap index and 'article' for everything else
+        """
+        reader = FeedReader(self.fetcher.open_stream(feed_url))
+        try:
+            for event, element in etree.iterparse(reader, events=('end',), resolve_entities=False,
+                                                  no_network=True):
+                name = get_local_name(element)
+                if name not in ('url', 'sitemap', 'item', 'entry'):
+                    continue
+
+                url, date_text = self.read_entry(element)
+                if url is not None:
+                    yield ('sitemap' if name == 'sitemap' else 'article'), url, date_text
+
+                # throw away the entry, and any text between entries, so the tree stays small
+                element.clear()
+                parent = element.getparent()
+                if parent is not None:
+                    while element.getprevious() is not None:
+                        del parent[0]
+        finally:
+            reader.close()
+
+    def report_feed_error(self, screen, feed_url, e, partial):
+        """
+        Records a feed that couldn't be read, or could only be read in part, and reports it to the screen
+        :param screen: the ProgressSink to report to, or None
+        :param feed_url: the url of the feed
+        :param e: the exception that stopped the feed from being read
+        :param partial: whether any entries were read from the feed before the error
+        :return:
+        """
+        error = "{0}: {1}".format(e.__class__.__name__, e)
+        if partial:
+            self.partial_feeds.append((feed_url, error))
+        else:
+            self.skipped_feeds.append((feed_url, error))
+        if screen is not None:
+            screen.report_feed_error(feed_url, error, partial)
+
+    def get_articles(self, screen=None, start_month=1, start_year=2002, end_month=None, end_year=None):
+        """
+        Returns the urls of the articles in the feeds from the given months, oldest month first.  Articles
+        from the same month keep their feed order, and each url is only returned once
+        :param screen: the ProgressSink to report the progress of the discovery to
+        :raises: NoFeedsReadException: if none of the feeds could be read
+        :return: a list of article urls
+        """
+        now = datetime.datetime.now()
+
+        if end_year is None:
+            end_year = now.year
+
+        if end_month is None:
+            if end_year < now.year:
+                end_month = 12
+            else:
+                end_month = now.month
+
+        first_month = (start_year, start_month)
+        last_month = (end_year, end_month)
+
+        feed_urls = list(self.feed_urls)
+        seen_feeds = set()
+        seen_articles = set()
+        articles = []
+        self.skipped_feeds = []
+        self.partial_feeds = []
+
+        while feed_urls:
+            feed_url = feed_urls.pop(0)
+            if feed_url in seen_feeds:
+                continue
+            seen_feeds.add(feed_url)
+
+            if screen is not None:
+                prog_percent = int(((len(seen_feeds) - 1.0) / (len(seen_feeds) + len(feed_urls))) * 100)
+                screen.report_progress('Getting Article URLs', 'Reading Feed', feed_url, prog_percent)
+                if self.fetcher.throttle is not None:
+                    screen.report_rate(*self.fetcher.throttle.get_stats())
+
+            num_entries = 0
+            try:
+                for kind, url, date_text in self.iter_feed(feed_url):
+                    num_entries += 1
+                    if kind == 'sitemap':
+                        month = get_entry_month('', date_text)
+                        if month is None or month >= first_month:
+                            feed_urls.append(url)
+                        continue
+
+                    month = get_entry_month(url, date_text)
+                    if month is None or month < first_month or month > last_month:
+                        continue
+                    if url not in seen_articles:
+                        seen_articles.add(url)
+                        articles.append((month, len(articles), url))
+            except FEED_ERRORS as e:
+                # the entries read before the error are kept
+                self.report_feed_error(screen, feed_url, e, num_entries > 0)
+
+        if seen_feeds and len(self.skipped_feeds) == len(seen_feeds):
+            raise NoFeedsReadException(self.skipped_feeds)
+
+        articles.sort()
+        return [url for month, position, url in articles]
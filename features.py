@@ -0,0 +1,138 @@
+import cPickle
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+class FeatureStore(object):
+    """
+    A directory holding the word and bigram counts of a training set, so that the articles are only
+    tokenized once rather than every time the classifier is trained or a cross validation fold is run.
+    The counts are kept as the three arrays of a scipy CSR matrix in .npy files, which are memory mapped
+    when they are read back, so worker processes share them rather than each holding a copy.  The
+    vocabulary is kept beside them, with a fingerprint of the articles the counts were made from; if
+    the articles change, the counts are made again.
+
+    The TF-IDF weights are not stored, because they depend on which articles are trained on: each fold
+    works them out from the counts of its own training rows with a TfidfTransformer
+    """
+
+    ARRAY_NAMES = ('data', 'indices', 'indptr')
+
+    def __init__(self, store_dir, ngram_range=(1, 2)):
+        """
+        :param store_dir: the directory to keep the counts in. Created if it doesn't exist
+        :param ngram_range: the smallest and largest n-grams to count
+        :return:
+        """
+        self.store_dir = store_dir
+        self.ngram_range = ngram_range
+        self.vocabulary = None
+
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+
+    def get_path(self, name):
+        """
+        :param name: the name of a file in the store
+        :return: the path of the file
+        """
+        return os.path.join(self.store_dir, name)
+
+    def get_fingerprint(self, documents):
+        """
+        Fingerprints a list of articles, in order
+        :param documents: the article bodies
+        :return: a hex digest
+        """
+        digest = hashlib.sha1()
+        digest.update(repr(self.ngram_range))
+        for document in documents:
+            if isinstance(document, unicode):
+                document = document.encode('utf-8')
+            digest.update(str(len(document)))
+            digest.update(':')
+            digest.update(document)
+        return digest.hexdigest()
+
+    def read_metadata(self):
+        """
+        :return: the stored metadata dictionary, or None if the store is empty
+        """
+        try:
+            with open(self.get_path('metadata.json'), 'r') as infile:
+                return json.load(infile)
+        except (IOError, ValueError):
+            return None
+
+    def load_counts(self):
+        """
+        Reads the stored counts, memory mapping the arrays
+        :return: a scipy CSR matrix with one row per article and one column per n-gram
+        """
+        metadata = self.read_metadata()
+        arrays = [np.load(self.get_path(name + '.npy'), mmap_mode='r') for name in self.ARRAY_NAMES]
+
+        with open(self.get_path('vocabulary.pkl'), 'rb') as infile:
+            self.vocabulary = cPickle.load(infile)
+
+        counts = csr_matrix(tuple(arrays), shape=tuple(metadata['shape']), copy=False)
+        if not counts.has_sorted_indices:
+            # the mapped arrays are read only, and scipy sorts indices in place; stores written by
+            # save_counts are always sorted
+            counts = counts.sorted_indices()
+        return counts
+
+    def save_counts(self, counts, fingerprint):
+        """
+        Writes the counts and the vocabulary.  The metadata is written last, so a store that was only
+        partly written is never read.  The column indices of each row are sorted first, as scipy would
+        otherwise sort them in place in the read only mapped arrays
+        :param counts: the scipy CSR matrix of counts
+        :param fingerprint: the fingerprint of the articles the counts were made from
+        :return:
+        """
+        metadata_path = self.get_path('metadata.json')
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+
+        counts.sort_indices()
+        for name in self.ARRAY_NAMES:
+            np.save(self.get_path(name + '.npy'), getattr(counts, name))
+
+        with open(self.get_path('vocabulary.pkl'), 'wb') as outfile:
+            cPickle.dump(self.vocabulary, outfile, cPickle.HIGHEST_PROTOCOL)
+
+        with open(metadata_path, 'w') as outfile:
+            json.dump({'fingerprint': fingerprint, 'shape': list(counts.shape)}, outfile)
+
+    def get_counts(self, documents):
+        """
+        Returns the n-gram counts of a list of articles, from the store if they were counted before,
+        and otherwise counting and storing them
+        :param documents: the article bodies
+        :return: a scipy CSR matrix with one row per article, in the order of documents
+        """
+        fingerprint = self.get_fingerprint(documents)
+
+        metadata = self.read_metadata()
+        if metadata is not None and metadata['fingerprint'] == fingerprint:
+            return self.load_counts()
+
+        vectorizer = CountVectorizer(ngram_range=self.ngram_range)
+        counts = vectorizer.fit_transform(documents).tocsr()
+        self.vocabulary = vectorizer.vocabulary_
+        self.save_counts(counts, fingerprint)
+        return self.load_counts()
+
+    def get_vectorizer(self):
+        """
+        Returns a CountVectorizer that counts the n-grams of new articles into the store's columns.
+        get_counts must have been called first
+        :return:
+        """
+        return CountVectorizer(ngram_range=self.ngram_range, vocabulary=self.vocabulary)
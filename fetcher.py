@@ -0,0 +1,380 @@
+import cStringIO
+import multiprocessing
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import MaxRetryError
+from requests.packages.urllib3.util.retry import Retry
+
+
+class PageResponse(object):
+    """
+    The parts of an HTTP response the scrapers use.  Returned by PageFetcher whether the response came
+    from the network or from the cache
+    """
+
+    def __init__(self, url, status_code, headers, content, from_cache=False, not_modified=False):
+        """
+        :param url: the url the response was fetched from
+        :param status_code: the HTTP status code
+        :param headers: a dictionary of the response headers, with lowercase keys
+        :param content: the response body
+        :param from_cache: whether the response was read from the cache
+        :param not_modified: whether the server confirmed with a 304 that the cached response is current
+        :return:
+        """
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+        self.not_modified = not_modified
+
+    def raise_for_status(self):
+        """
+        Raises requests.exceptions.HTTPError if the response has an HTTP error status
+        :raises: requests.exceptions.HTTPError: for 4xx and 5xx responses
+        :return:
+        """
+        if 400 <= self.status_code < 600:
+            raise requests.exceptions.HTTPError("{0} Error for url: {1}".format(self.status_code, self.url),
+                                                response=self)
+
+
+class ThrottledStream(object):
+    """
+    A streamed response body that keeps its request in flight for the throttle until it is closed, so
+    that a download counts against the limit on requests in flight for as long as it is being read, and
+    its latency includes reading the body
+    """
+
+    def __init__(self, raw, finish, status_code):
+        """
+        :param raw: the urllib3 response to read from
+        :param finish: the function that tells the throttle the request has finished, given the status
+        :param status_code: the HTTP status of the response
+        :return:
+        """
+        self.raw = raw
+        self.finish = finish
+        self.status_code = status_code
+        self.finished = False
+
+    def read(self, *args, **kwargs):
+        try:
+            return self.raw.read(*args, **kwargs)
+        except Exception:
+            # a body that couldn't be read counts as a failed request
+            self.status_code = None
+            raise
+
+    def close(self):
+        """
+        Closes the response and tells the throttle the request has finished, once
+        :return:
+        """
+        try:
+            self.raw.close()
+        finally:
+            if not self.finished:
+                self.finished = True
+                self.finish(self.status_code)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class PageFetcher(object):
+    """
+    Fetches web pages for the article collector, the article scraper and the image sizer.  If a
+    ResponseCache is given, successful responses are stored in it and later requests for the same url
+    are answered from the cache without using the network.  In revalidate mode, cached responses are
+    instead checked with a conditional GET, and only downloaded again if they have changed.
+
+    Requests are made through a requests.Session, so connections to each host are kept alive and
+    reused.  At most pool_size connections are opened to any one host, and requests that time out or
+    get a 5xx response are retried with exponential backoff.  If a RequestThrottle is given, every
+    request waits for it first, so the request rate and the number of requests in flight stay within
+    its limits.  429 and 503 responses are then retried by the fetcher rather than inside urllib3, with
+    the same backoff or the wait asked for in a Retry-After header, so that the throttle is told about
+    each of them and can slow down.
+
+    Counts of the requests sent, the bytes downloaded and the responses answered from the cache are
+    kept in shared memory, so they include the pages and images fetched by worker processes forked
+    after the fetcher was created.  The bytes of streamed responses aren't counted
+    """
+
+    # The responses that mean the server is overloaded, retried outside urllib3 when there is a throttle
+    THROTTLE_RETRY_STATUS_CODES = (429, 503)
+
+    def __init__(self, cache=None, revalidate=False, pool_size=10, retries=3, backoff_factor=0.5,
+                 timeout=(10, 60), throttle=None):
+        """
+        :param cache: the ResponseCache to use, or None to always fetch from the network
+        :param revalidate: whether to check cached responses with the server before using them
+        :param pool_size: the maximum number of connections kept open to each host
+        :param retries: the number of times to retry a request that failed with a timeout, a
+        connection error, a 429 or a 5xx response
+        :param backoff_factor: the retries wait backoff_factor * 2 ** (retry number - 1) seconds
+        :param timeout: the connect and read timeouts for each request, in seconds
+        :param throttle: the RequestThrottle to pace requests with, or None to send them straight away
+        :return:
+        """
+        self.cache = cache
+        self.revalidate = revalidate
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.throttle = throttle
+
+        self.session = None
+        self.session_pid = None
+        self.session_lock = threading.Lock()
+
+        self.requests_sent = multiprocessing.Value('l', 0)
+        self.bytes_fetched = multiprocessing.Value('l', 0)
+        self.cache_hits = multiprocessing.Value('l', 0)
+
+    def count(self, counter, amount=1):
+        """
+        Adds to one of the shared counters
+        :param counter: the multiprocessing.Value to add to
+        :param amount: the amount to add
+        :return:
+        """
+        with counter.get_lock():
+            counter.value += amount
+
+    def get_stats(self):
+        """
+        Returns the counts of the requests sent, bytes downloaded and cache hits so far
+        :return: a dictionary with requests, bytes_fetched and cache_hits keys
+        """
+        return {
+            'requests': self.requests_sent.value,
+            'bytes_fetched': self.bytes_fetched.value,
+            'cache_hits': self.cache_hits.value
+        }
+
+    def get_session(self):
+        """
+        Returns the requests.Session for the current process, creating it if needed.  Forked worker
+        processes mustn't share the parent's open connections, so each process gets its own session
+        :return: a requests.Session
+        """
+        with self.session_lock:
+            if self.session is None or self.session_pid != os.getpid():
+                if self.throttle is not None:
+                    # retrying a 429 or 503 inside urllib3 would hide it from the throttle, so send_request
+                    # retries them instead
+                    retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                                  status_forcelist=(500, 502, 504), raise_on_status=False,
+                                  respect_retry_after_header=False)
+                else:
+                    retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                                  status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                      pool_block=True, max_retries=retry)
+                self.session = requests.Session()
+                self.session.mount('http://', adapter)
+                self.session.mount('https://', adapter)
+                self.session_pid = os.getpid()
+            return self.session
+
+    def send_request(self, url, **kwargs):
+        """
+        Sends a GET request through the session, waiting for the throttle first if there is one.  With a
+        throttle, a 429 or 503 response is reported to it and the request is retried, after the same
+        backoff urllib3 would wait, or the wait the server asked for in a Retry-After header.  The last
+        response is handed back if every retry gets one
+        :param url: the url to fetch
+        :param kwargs: further arguments to requests.Session.get
+        :return: r, start_time: the requests.Response, and the time the throttle let the request through,
+        to be given to finish once the response has been read, or None if there is no throttle
+        """
+        self.count(self.requests_sent)
+
+        if self.throttle is None:
+            return self.get_session().get(url, timeout=self.timeout, **kwargs), None
+
+        retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=self.THROTTLE_RETRY_STATUS_CODES)
+        while True:
+            start_time = None
+            try:
+                start_time = self.throttle.start()
+                r = self.get_session().get(url, timeout=self.timeout, **kwargs)
+            except BaseException:
+                if start_time is not None:
+                    self.throttle.finish(start_time, None)
+                raise
+
+            if not retry.is_retry('GET', r.status_code, 'Retry-After' in r.headers):
+                return r, start_time
+            try:
+                retry = retry.increment('GET', url, response=r.raw)
+            except MaxRetryError:
+                return r, start_time
+
+            self.throttle.finish(start_time, r.status_code)
+            r.close()
+            retry.sleep(r.raw)
+
+    def finish(self, start_time, status_code):
+        """
+        Tells the throttle that a request sent with send_request has finished
+        :param start_time: the start time returned by send_request
+        :param status_code: the HTTP status of the response
+        :return:
+        """
+        if start_time is not None:
+            self.throttle.finish(start_time, status_code)
+
+    def send(self, url, **kwargs):
+        """
+        Sends a GET request with send_request, and tells the throttle, if there is one, how it went
+        :param url: the url to fetch
+        :param kwargs: further arguments to requests.Session.get
+        :return: a requests.Response
+        """
+        r, start_time = self.send_request(url, **kwargs)
+        self.finish(start_time, r.status_code)
+        return r
+
+    def get_conditional_headers(self, entry):
+        """
+        Returns the If-None-Match and If-Modified-Since request headers for a cached response
+        :param entry: the cache entry returned by ResponseCache.get
+        :return: a dictionary of request headers, empty if the response had no ETag or Last-Modified
+        """
+        request_headers = dict()
+        if 'etag' in entry['headers']:
+            request_headers['If-None-Match'] = entry['headers']['etag']
+        if 'last-modified' in entry['headers']:
+            request_headers['If-Modified-Since'] = entry['headers']['last-modified']
+        return request_headers
+
+    def get(self, url):
+        """
+        Fetches a url, from the cache if possible
+        :param url: the url to fetch
+        :return: a PageResponse
+        """
+        request_headers = dict()
+
+        entry = None
+        if self.cache is not None:
+            entry = self.cache.get(url)
+
+        if entry is not None:
+            if not self.revalidate:
+                self.count(self.cache_hits)
+                return PageResponse(url, entry['status_code'], entry['headers'], entry['content'], from_cache=True)
+            request_headers = self.get_conditional_headers(entry)
+
+        r = self.send(url, headers=request_headers)
+
+        if r.status_code == requests.codes.not_modified and entry is not None:
+            self.count(self.cache_hits)
+            return PageResponse(url, entry['status_code'], entry['headers'], entry['content'],
+                                from_cache=True, not_modified=True)
+
+        headers = dict((key.lower(), value) for key, value in r.headers.iteritems())
+        response = PageResponse(url, r.status_code, headers, r.content)
+        self.count(self.bytes_fetched, len(r.content))
+
+        if self.cache is not None and r.status_code == requests.codes.ok:
+            self.cache.put(url, r.status_code, headers, r.content)
+
+        return response
+
+    def get_if_changed(self, url, etag=None, last_modified=None):
+        """
+        Fetches a url from the network with a conditional GET, using validators the caller kept from an
+        earlier response rather than the ones in the cache.  The cache is never read, but a changed
+        response is stored in it
+        :param url: the url to fetch
+        :param etag: the ETag of the earlier response, or None
+        :param last_modified: the Last-Modified date of the earlier response, or None
+        :return: a PageResponse. If the server confirmed with a 304 that the earlier response is current,
+        not_modified is True and the content is empty
+        """
+        request_headers = dict()
+        if etag is not None:
+            request_headers['If-None-Match'] = etag
+        if last_modified is not None:
+            request_headers['If-Modified-Since'] = last_modified
+
+        r = self.send(url, headers=request_headers)
+        headers = dict((key.lower(), value) for key, value in r.headers.iteritems())
+
+        if r.status_code == requests.codes.not_modified and request_headers:
+            return PageResponse(url, r.status_code, headers, '', not_modified=True)
+
+        self.count(self.bytes_fetched, len(r.content))
+
+        if self.cache is not None and r.status_code == requests.codes.ok:
+            self.cache.put(url, r.status_code, headers, r.content)
+
+        return PageResponse(url, r.status_code, headers, r.content)
+
+    def open_stream(self, url):
+        """
+        Opens a url to be read a piece at a time, so that a large body never has to be held in memory.
+        A complete cached response is used instead if there is one; streamed responses aren't cached.
+        With a throttle, the request stays in flight until the stream is closed
+        :param url: the url to open
+        :raises: requests.exceptions.HTTPError: for 4xx and 5xx responses
+        :return: a file-like object with read and close methods. The caller must close it
+        """
+        if self.cache is not None and not self.revalidate:
+            entry = self.cache.get(url)
+            if entry is not None:
+                self.count(self.cache_hits)
+                return cStringIO.StringIO(entry['content'])
+
+        r, start_time = self.send_request(url, stream=True)
+        try:
+            r.raise_for_status()
+        except requests.exceptions.HTTPError:
+            r.close()
+            self.finish(start_time, r.status_code)
+            raise
+
+        r.raw.decode_content = True
+        if start_time is None:
+            return r.raw
+        return ThrottledStream(r.raw, lambda status_code: self.finish(start_time, status_code), r.status_code)
+
+    def get_head(self, url, num_bytes):
+        """
+        Fetches only the first num_bytes of a url, using an HTTP Range request.  If the server ignores
+        the range and sends the whole body, the download is stopped after num_bytes.  A complete cached
+        response is used instead if there is one; partial responses are never cached
+        :param url: the url to fetch
+        :param num_bytes: the number of bytes to fetch from the start of the body
+        :return: a PageResponse whose content is at most num_bytes long, with status 206 or 200
+        """
+        if self.cache is not None and not self.revalidate:
+            entry = self.cache.get(url)
+            if entry is not None:
+                self.count(self.cache_hits)
+                return PageResponse(url, entry['status_code'], entry['headers'], entry['content'][:num_bytes],
+                                    from_cache=True)
+
+        r, start_time = self.send_request(url, headers={'Range': 'bytes=0-{0}'.format(num_bytes - 1)}, stream=True)
+        status_code = None
+        try:
+            headers = dict((key.lower(), value) for key, value in r.headers.iteritems())
+            content = r.raw.read(num_bytes, decode_content=True)
+            status_code = r.status_code
+        finally:
+            r.close()
+            # the request stays in flight for the throttle until the head has been read
+            self.finish(start_time, status_code)
+        self.count(self.bytes_fetched, len(content))
+
+        return PageResponse(url, r.status_code, headers, content)
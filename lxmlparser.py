@@ -0,0 +1,492 @@
+import re
+
+from bs4.dammit import EncodingDetector
+from lxml import etree
+
+
+# The characters BeautifulSoup counts as whitespace when it collapses whitespace-only strings
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# Tags whose whitespace BeautifulSoup leaves alone
+PRESERVE_WHITESPACE_TAGS = ('pre', 'textarea')
+
+# Tags BeautifulSoup writes as <tag/> when they are empty
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+                       'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+                       'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'])
+
+# Tags whose text BeautifulSoup writes without escaping
+CDATA_CONTAINING_TAGS = frozenset(['script', 'style'])
+
+# Tags whose strings BeautifulSoup keeps as Script, Stylesheet or TemplateString, which get_text leaves out
+STRING_CONTAINER_TAGS = frozenset(['script', 'style', 'template'])
+
+# Attributes BeautifulSoup treats as whitespace separated lists, by tag; '*' applies to every tag
+MULTI_VALUED_ATTRIBUTES = {
+    '*': ('class', 'accesskey', 'dropzone'),
+    'a': ('rel', 'rev'),
+    'link': ('rel', 'rev'),
+    'td': ('headers',),
+    'th': ('headers',),
+    'form': ('accept-charset',),
+    'object': ('archive',),
+    'area': ('rel',),
+    'icon': ('sizes',),
+    'iframe': ('sandbox',),
+    'output': ('for',)
+}
+
+NON_WHITESPACE_REGEX = re.compile(r"\S+")
+
+# Start or end tags with a namespace prefix, such as Word's <o:p> or <st1:place>.  libxml2's HTML parser
+# drops the prefix from the tag name, so these pages can't be written out the way BeautifulSoup writes them
+PREFIXED_TAG_REGEX = re.compile(r"</?[A-Za-z_][-\w.]*:")
+
+# The encoding BeautifulSoup writes into the charset of meta tags, as str() of a tag encodes it to utf-8
+OUTPUT_ENCODING = u'utf-8'
+
+# The charset in the content of a <meta http-equiv="content-type"> tag, as BeautifulSoup finds it
+META_CONTENT_CHARSET_REGEX = re.compile(r"((^|;)\s*charset=)([^;]*)", re.M)
+
+
+class UnsupportedPageException(Exception):
+    """
+    Raised for a page that lxml can't read the same way BeautifulSoup does, so that it can be parsed with
+    BeautifulSoup instead
+    """
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+# Compiled XPath expressions, keyed by (tag name, attribute, value, first only)
+compiled_selectors = dict()
+
+
+def get_selector(name, attribute=None, value=None, first=False):
+    """
+    Returns a compiled XPath expression that finds the descendants of an element with the given tag
+    name, and, if an attribute is given, with that attribute value.  For the class attribute, the
+    value only has to be one of the element's classes
+    :param name: the tag name
+    :param attribute: the attribute to match, or None to match every tag with the name
+    :param value: the value of the attribute
+    :param first: whether to only find the first matching descendant in document order
+    :return: an lxml.etree.XPath
+    """
+    key = (name, attribute, value, first)
+    if key not in compiled_selectors:
+        if attribute is None:
+            path = './/' + name
+        elif attribute == 'class':
+            path = ".//{0}[contains(concat(' ', normalize-space(@class), ' '), ' {1} ')]".format(name, value)
+        else:
+            path = ".//{0}[@{1}='{2}']".format(name, attribute, value)
+        if first:
+            path = '(' + path + ')[1]'
+        compiled_selectors[key] = etree.XPath(path)
+    return compiled_selectors[key]
+
+
+def is_element(node):
+    """
+    Returns whether an lxml node is an element, rather than a comment or processing instruction
+    :param node: the lxml node
+    :return:
+    """
+    return isinstance(node.tag, basestring)
+
+
+def is_decodable(root):
+    """
+    Returns whether every string in a parsed document can be decoded.  libxml2 only reports bytes that
+    aren't valid in the document's encoding when a string is read, whereas BeautifulSoup reads every
+    string while it parses, and moves on to the next encoding it would try if any of them fails
+    :param root: the root lxml element
+    :return:
+    """
+    try:
+        for node in root.iter():
+            node.text
+            node.tail
+            if is_element(node):
+                node.attrib.items()
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def get_node_string(node):
+    """
+    Returns the string BeautifulSoup keeps for a comment or processing instruction
+    :param node: the lxml comment or processing instruction
+    :return:
+    """
+    if isinstance(node, etree._ProcessingInstruction):
+        return node.target + u' ' + (node.text or u'')
+    return node.text or u''
+
+
+def collapse_whitespace(text):
+    """
+    Collapses a string that is nothing but whitespace to a single newline, or a single space if it
+    has no newlines, the way BeautifulSoup does while it parses
+    :param text: the string, or None
+    :return: the collapsed string
+    """
+    if text and not text.strip(ASCII_SPACES):
+        if '\n' in text:
+            return u'\n'
+        return u' '
+    return text
+
+
+def collapse_tree_whitespace(root):
+    """
+    Collapses the whitespace-only strings under an element, other than those in pre and textarea tags
+    :param root: the lxml element
+    :return:
+    """
+    preserved = set()
+    for element in root.iter(*PRESERVE_WHITESPACE_TAGS):
+        preserved.update(element.iter())
+
+    for node in root.iter():
+        if node not in preserved and not isinstance(node, etree._ProcessingInstruction):
+            text = node.text
+            collapsed = collapse_whitespace(text)
+            if collapsed != text:
+                node.text = collapsed
+        if node is not root and node.getparent() not in preserved:
+            tail = node.tail
+            collapsed = collapse_whitespace(tail)
+            if collapsed != tail:
+                node.tail = collapsed
+
+
+def escape(text):
+    """
+    Escapes &, < and > the way BeautifulSoup's minimal formatter does
+    :param text: the string to escape
+    :return:
+    """
+    return text.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;')
+
+
+def quote_attribute(value):
+    """
+    Quotes an attribute value the way BeautifulSoup does
+    :param value: the escaped attribute value
+    :return:
+    """
+    if u'"' in value:
+        if u"'" in value:
+            return u'"' + value.replace(u'"', u'&quot;') + u'"'
+        return u"'" + value + u"'"
+    return u'"' + value + u'"'
+
+
+def get_attribute_items(node):
+    """
+    Returns the attributes of an element as BeautifulSoup writes them: the declared encoding in a meta
+    tag is replaced with the encoding the tag is written in
+    :param node: the lxml element
+    :return: a list of name, value tuples
+    """
+    items = node.attrib.items()
+    if node.tag != 'meta':
+        return items
+
+    attributes = dict(items)
+    http_equiv = attributes.get('http-equiv')
+    if 'charset' in attributes:
+        attributes['charset'] = OUTPUT_ENCODING
+    elif 'content' in attributes and http_equiv is not None and http_equiv.lower() == 'content-type':
+        attributes['content'] = META_CONTENT_CHARSET_REGEX.sub(lambda match: match.group(1) + OUTPUT_ENCODING,
+                                                               attributes['content'])
+    return attributes.items()
+
+
+def serialize_node(node, parts):
+    """
+    Writes a node the way str() of the equivalent BeautifulSoup tag writes it, not including its tail
+    :param node: the lxml element, comment or processing instruction
+    :param parts: the list to append the pieces of the markup to
+    :return:
+    """
+    if isinstance(node, etree._Comment):
+        parts.append(u'<!--' + (node.text or u'') + u'-->')
+        return
+    if isinstance(node, etree._ProcessingInstruction):
+        parts.append(u'<?' + get_node_string(node) + u'>')
+        return
+
+    name = node.tag
+    multi_valued = MULTI_VALUED_ATTRIBUTES['*'] + MULTI_VALUED_ATTRIBUTES.get(name, ())
+
+    attributes = []
+    for key, value in sorted(get_attribute_items(node)):
+        if key in multi_valued:
+            value = u' '.join(NON_WHITESPACE_REGEX.findall(value))
+        attributes.append(key + u'=' + quote_attribute(escape(value)))
+
+    parts.append(u'<' + name)
+    if attributes:
+        parts.append(u' ' + u' '.join(attributes))
+
+    if name in VOID_TAGS and node.text is None and len(node) == 0:
+        parts.append(u'/>')
+        return
+    parts.append(u'>')
+
+    escape_text = name not in CDATA_CONTAINING_TAGS
+
+    if node.text:
+        parts.append(escape(node.text) if escape_text else node.text)
+    for child in node:
+        serialize_node(child, parts)
+        if child.tail:
+            parts.append(escape(child.tail) if escape_text else child.tail)
+
+    parts.append(u'</' + name + u'>')
+
+
+class LxmlTag(object):
+    """
+    Wraps an lxml element in the parts of the bs4.element.Tag interface that ArticleScraper uses, so that
+    the same code reads articles parsed by either backend, and gives the same results for both
+    """
+
+    def __init__(self, element, zapped=None):
+        """
+        :param element: the lxml element to wrap
+        :param zapped: the set of elements of the same document whose contents have been zapped, shared by
+        every LxmlTag of the document
+        :return:
+        """
+        self.element = element
+        self.zapped = zapped if zapped is not None else set()
+
+    @property
+    def name(self):
+        return self.element.tag
+
+    @property
+    def contents(self):
+        """
+        The children of the element, as strings and LxmlTags
+        :return:
+        """
+        contents = []
+        if self.element.text:
+            contents.append(self.element.text)
+        for child in self.element:
+            if is_element(child):
+                contents.append(LxmlTag(child, self.zapped))
+            else:
+                contents.append(get_node_string(child))
+            if child.tail:
+                contents.append(child.tail)
+        return contents
+
+    def __getitem__(self, key):
+        return self.element.attrib[key]
+
+    def __setitem__(self, key, value):
+        self.element.set(key, value)
+
+    def __contains__(self, item):
+        return item in self.contents
+
+    def __str__(self):
+        parts = []
+        serialize_node(self.element, parts)
+        return u''.join(parts).encode('utf-8')
+
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+
+    def find(self, name, attrs=None):
+        """
+        Returns the first descendant with the given tag name and, optionally, attribute value
+        :param name: the tag name
+        :param attrs: a dictionary of one attribute and its value, or None
+        :return: an LxmlTag, or None if there is no matching descendant
+        """
+        attribute, value = (attrs.items()[0] if attrs else (None, None))
+        matches = get_selector(name, attribute, value, first=True)(self.element)
+        if matches:
+            return LxmlTag(matches[0], self.zapped)
+        return None
+
+    def get_text(self):
+        """
+        Returns all of the text in the element, not including comments, or the contents of script, style
+        and template tags.  Zapping turns those contents into plain strings in a BeautifulSoup tree, so
+        they are included once the element or a tag around them has been zapped
+        :return: a unicode string
+        """
+        ancestors = list(self.element.iterancestors())
+        contained = any(ancestor.tag in STRING_CONTAINER_TAGS for ancestor in ancestors)
+        zapped = any(ancestor in self.zapped for ancestor in ancestors)
+
+        strings = []
+        stack = [(self.element, contained and not zapped, zapped)]
+        while stack:
+            node, contained, zapped = stack.pop()
+            if isinstance(node, basestring):
+                strings.append(node)
+                continue
+            if node.tail and node is not self.element and not contained:
+                stack.append((node.tail, contained, zapped))
+            if is_element(node):
+                child_zapped = zapped or node in self.zapped
+                child_contained = not child_zapped and (contained or node.tag in STRING_CONTAINER_TAGS)
+                stack.extend((child, child_contained, child_zapped) for child in reversed(node))
+                if node.text and not child_contained:
+                    stack.append((node.text, child_contained, child_zapped))
+        return u''.join(strings)
+
+    def zap_contents(self, gremlin_zapper):
+        """
+        Converts any Windows cp1252 or unicode characters in the text of the element to ASCII
+        equivalents.  Comments and processing instructions are turned into plain text, and the element
+        is remembered as zapped so that get_text includes the contents of script, style and template
+        tags inside it, as ArticleScraper.zap_tag_contents does to BeautifulSoup tags
+        :param gremlin_zapper: the GremlinZapper to convert the text with
+        :return:
+        """
+        def zap(text):
+            return gremlin_zapper.zap_string(unicode(text))
+
+        self.zapped.add(self.element)
+
+        stack = [self.element]
+        while stack:
+            element = stack.pop()
+            if element.text:
+                element.text = zap(element.text)
+
+            previous = None
+            for child in list(element):
+                if is_element(child):
+                    if child.tail:
+                        child.tail = zap(child.tail)
+                    stack.append(child)
+                    previous = child
+                    continue
+
+                text = zap(get_node_string(child))
+                if child.tail:
+                    text += zap(child.tail)
+                if previous is None:
+                    element.text = (element.text or '') + text
+                else:
+                    previous.tail = (previous.tail or '') + text
+                child.tail = None
+                element.remove(child)
+
+
+class LxmlArticleParser(object):
+    """
+    Picks the tags ArticleScraper reads out of an article page using lxml directly, without building a
+    BeautifulSoup tree.  Pages are decoded the way BeautifulSoup decodes them, and the tags found are
+    returned as LxmlTags, so the article dictionary comes out the same as with BeautifulSoup
+    """
+
+    def __init__(self, selectors, list_keys):
+        """
+        :param selectors: the tags to find inside div#main, by tag name, as in scraper.ARTICLE_SELECTORS
+        :param list_keys: the keys under which every matching tag is kept, rather than just the first
+        :return:
+        """
+        self.list_keys = list_keys
+        self.category_selector = etree.XPath("//*[@name='category']")
+        self.main_selector = etree.XPath("(//div[@id='main'])[1]")
+
+        self.selectors = []
+        for name, entries in selectors.iteritems():
+            for attribute, value, key in entries:
+                selector = get_selector(name, attribute, value, first=key not in list_keys)
+                self.selectors.append((key, selector))
+
+    def parse_document(self, page_html):
+        """
+        Parses an article page, trying the same encodings BeautifulSoup would, in the same order
+        :param page_html: the raw html of the page
+        :raises: UnsupportedPageException: if the page isn't valid in the encoding lxml reads it with.
+        libxml2 joins up the text around markup it leaves out before it is decoded, whereas BeautifulSoup
+        decodes each piece of text on its own, and so can reject an encoding that lxml accepts
+        :return: the root lxml element, or None if the page is empty
+        """
+        if isinstance(page_html, unicode):
+            markup, encodings = page_html, [None]
+        else:
+            # encodings is a generator, and only runs chardet if the declared encodings all fail
+            detector = EncodingDetector(page_html, is_html=True)
+            markup, encodings = detector.markup, detector.encodings
+
+        for encoding in encodings:
+            try:
+                # fed rather than parsed in one call, as BeautifulSoup does, since libxml2's push
+                # parser recovers from some broken markup differently
+                parser = etree.HTMLParser(encoding=encoding, strip_cdata=False, recover=True)
+                parser.feed(markup)
+                root = parser.close()
+            except (UnicodeDecodeError, LookupError, etree.ParserError):
+                continue
+            except etree.XMLSyntaxError:
+                return None
+            if root is None or not is_decodable(root):
+                continue
+            if encoding is not None:
+                try:
+                    markup.decode(encoding)
+                except (UnicodeDecodeError, LookupError):
+                    raise UnsupportedPageException('Page is not valid ' + encoding)
+            return root
+        return None
+
+    def collect_article_tags(self, page_html):
+        """
+        Finds every tag the scraper reads in an article page
+        :param page_html: the raw html of the page
+        :raises: UnsupportedPageException: if the page can't be read the same way BeautifulSoup reads it.
+        Namespace prefixed tags, such as those pasted from Word, lose their prefix in lxml, and libxml2
+        builds a different tree from BeautifulSoup's around null bytes
+        :return: a dictionary of LxmlTags and lists of LxmlTags, keyed as ArticleScraper.collect_article_tags
+        keys them.  'main' is None if the page has no div#main
+        """
+        article_tags = {'main': None, 'categories': []}
+        for key in self.list_keys:
+            article_tags[key] = []
+
+        if PREFIXED_TAG_REGEX.search(page_html) is not None:
+            raise UnsupportedPageException('Page has namespace prefixed tags')
+        if '\x00' in page_html:
+            raise UnsupportedPageException('Page has null bytes')
+
+        root = self.parse_document(page_html)
+        if root is None:
+            return article_tags
+
+        zapped = set()
+        article_tags['categories'] = [LxmlTag(element, zapped) for element in self.category_selector(root)]
+
+        main = self.main_selector(root)
+        if not main:
+            return article_tags
+        main = main[0]
+        collapse_tree_whitespace(main)
+        article_tags['main'] = LxmlTag(main, zapped)
+
+        for key, selector in self.selectors:
+            matches = selector(main)
+            if key in self.list_keys:
+                article_tags[key].extend(LxmlTag(element, zapped) for element in matches)
+            elif matches and key not in article_tags:
+                article_tags[key] = LxmlTag(matches[0], zapped)
+
+        return article_tags
@@ -0,0 +1,119 @@
+import sqlite3
+
+
+class ArchiveManifest(object):
+    """
+    A record, kept in a SQLite database, of the news.ucsc.edu monthly archive index pages the article
+    collector has read: for each month, the article urls it listed, a fingerprint of that list, and the
+    ETag and Last-Modified validators the page was served with.  Later runs use it to skip archive
+    pages that haven't changed and to report only the articles that weren't listed before.  Months
+    whose archive page wasn't found are recorded too, with the negated status code, so later runs don't
+    request them again.
+
+    Changes are not committed until commit() is called, so a run that dies before its articles are
+    written leaves the manifest as it was, and the next run finds the same new articles again
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: the path of the SQLite database file. Created if it doesn't exist
+        :return:
+        """
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS months ('
+                                'archive_url TEXT PRIMARY KEY, fingerprint TEXT, etag TEXT, last_modified TEXT, '
+                                'status INTEGER DEFAULT 200)')
+        # manifests made before missing months were recorded have no status column
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(months)')]
+        if 'status' not in columns:
+            self.connection.execute('ALTER TABLE months ADD COLUMN status INTEGER DEFAULT 200')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS month_articles ('
+                                'archive_url TEXT, position INTEGER, article_url TEXT, '
+                                'PRIMARY KEY (archive_url, position))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS month_articles_article_url '
+                                'ON month_articles (article_url)')
+        self.connection.commit()
+
+    def get_months(self):
+        """
+        Returns every month in the manifest
+        :return: a dictionary of archive_url: (fingerprint, etag, last_modified, status). status is
+        negative for a month whose page wasn't found
+        """
+        months = dict()
+        for archive_url, fingerprint, etag, last_modified, status in self.connection.execute(
+                'SELECT archive_url, fingerprint, etag, last_modified, status FROM months'):
+            months[archive_url] = (fingerprint, etag, last_modified, status)
+        return months
+
+    def has_article(self, article_url):
+        """
+        Returns whether an article was listed in any month of the manifest
+        :param article_url: the url of the article
+        :return:
+        """
+        row = self.connection.execute('SELECT 1 FROM month_articles WHERE article_url = ? LIMIT 1',
+                                      (article_url,)).fetchone()
+        return row is not None
+
+    def update_validators(self, archive_url, etag, last_modified):
+        """
+        Records new validators for a month whose article list hasn't changed
+        :param archive_url: the url of the archive index page
+        :param etag: the ETag the page was served with, or None
+        :param last_modified: the Last-Modified date the page was served with, or None
+        :return:
+        """
+        self.connection.execute('UPDATE months SET etag = ?, last_modified = ? WHERE archive_url = ?',
+                                (etag, last_modified, archive_url))
+
+    def update_month(self, archive_url, fingerprint, etag, last_modified, article_list):
+        """
+        Records the article list of a month, replacing the one recorded before
+        :param archive_url: the url of the archive index page
+        :param fingerprint: the fingerprint of the article list
+        :param etag: the ETag the page was served with, or None
+        :param last_modified: the Last-Modified date the page was served with, or None
+        :param article_list: the article urls listed on the page, in page order
+        :return:
+        """
+        self.connection.execute('INSERT OR REPLACE INTO months VALUES (?, ?, ?, ?, 200)',
+                                (archive_url, fingerprint, etag, last_modified))
+        self.connection.execute('DELETE FROM month_articles WHERE archive_url = ?', (archive_url,))
+        self.connection.executemany('INSERT INTO month_articles VALUES (?, ?, ?)',
+                                    [(archive_url, position, article_url)
+                                     for position, article_url in enumerate(article_list)])
+
+    def record_missing_month(self, archive_url, status):
+        """
+        Records a month whose archive page wasn't found, so that later runs don't request it again.
+        Articles an earlier run found on the page stay in the manifest
+        :param archive_url: the url of the archive index page
+        :param status: the status code the page was served with, such as 404
+        :return:
+        """
+        self.connection.execute('INSERT OR REPLACE INTO months VALUES (?, NULL, NULL, NULL, ?)',
+                                (archive_url, -status))
+
+    def forget_articles(self, article_urls):
+        """
+        Removes articles from the manifest, such as those a run couldn't scrape, so that the next run
+        finds them again.  The months that listed them are removed too, so their archive pages are read
+        again rather than taken to be unchanged; the other articles those months listed stay in the
+        manifest, so they aren't scraped again
+        :param article_urls: the urls of the articles to forget
+        :return:
+        """
+        for article_url in article_urls:
+            self.connection.execute('DELETE FROM months WHERE archive_url IN '
+                                    '(SELECT archive_url FROM month_articles WHERE article_url = ?)', (article_url,))
+            self.connection.execute('DELETE FROM month_articles WHERE article_url = ?', (article_url,))
+
+    def commit(self):
+        """
+        Saves the changes made since the last commit
+        :return:
+        """
+        self.connection.commit()
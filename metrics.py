@@ -0,0 +1,133 @@
+import numpy as np
+from prettytable import PrettyTable
+
+
+def to_dense_array(y):
+    """
+    Returns a label matrix as a dense numpy array
+    :param y: a list of lists, a numpy array or a scipy sparse matrix
+    :return:
+    """
+    if hasattr(y, 'toarray'):
+        return y.toarray()
+    return np.asarray(y)
+
+
+class MultilabelMetrics(object):
+    """
+    The confusion counts and the precision, recall and F1 of a multilabel classification, per label and
+    micro and macro averaged.  Everything is worked out from the (number of labels, 4) array of true
+    positive, false positive, false negative and true negative counts with a few array operations, so
+    the metrics of several cross validation folds can be combined by adding their counts.
+
+    The per label scores follow the classifier's original table: precision is 1 for a label with no
+    false positives, recall is 1 for a label with no false negatives, and F1 is 0 when both precision
+    and recall are 0.  The macro averaged F1 is worked out from the macro averaged precision and recall,
+    not averaged over the labels.  The micro averages follow the same rules on the totals
+    """
+
+    def __init__(self, counts):
+        """
+        :param counts: an array of shape (number of labels, 4) holding each label's true positives,
+        false positives, false negatives and true negatives
+        :return:
+        """
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.true_positives = self.counts[:, 0]
+        self.false_positives = self.counts[:, 1]
+        self.false_negatives = self.counts[:, 2]
+        self.true_negatives = self.counts[:, 3]
+        self.totals = self.counts.sum(axis=0)
+
+        self.precision = self.get_ratio(self.true_positives, self.false_positives)
+        self.recall = self.get_ratio(self.true_positives, self.false_negatives)
+        self.f1 = self.get_f1(self.precision, self.recall)
+
+        # summed in label order, so the averages come out exactly as the original loop's did
+        self.macro_precision = sum(self.precision.tolist()) / len(self.precision)
+        self.macro_recall = sum(self.recall.tolist()) / len(self.recall)
+        self.macro_f1 = float(self.get_f1(self.macro_precision, self.macro_recall))
+
+        self.micro_precision = float(self.get_ratio(self.totals[0], self.totals[1]))
+        self.micro_recall = float(self.get_ratio(self.totals[0], self.totals[2]))
+        self.micro_f1 = float(self.get_f1(self.micro_precision, self.micro_recall))
+
+    def get_ratio(self, true_positives, errors):
+        """
+        Works out precision (when errors are false positives) or recall (when errors are false negatives)
+        :param true_positives: an array or count of true positives
+        :param errors: an array or count of false positives or false negatives
+        :return: true_positives / (true_positives + errors), or 1 where there are no errors
+        """
+        true_positives = np.asarray(true_positives, dtype=np.float64)
+        errors = np.asarray(errors)
+        return np.where(errors == 0, 1.0, true_positives / np.maximum(true_positives + errors, 1))
+
+    def get_f1(self, precision, recall):
+        """
+        Works out the F1 score, the harmonic mean of precision and recall
+        :param precision: an array or value of precision
+        :param recall: an array or value of recall
+        :return: the F1 scores, 0 where precision and recall are both 0
+        """
+        precision = np.asarray(precision, dtype=np.float64)
+        recall = np.asarray(recall, dtype=np.float64)
+        both = precision + recall
+        return np.where(both == 0, 0.0, 2 * ((precision * recall) / np.where(both == 0, 1, both)))
+
+    def get_table(self, class_labels=None):
+        """
+        Renders the metrics as the classifier's confusion matrix table
+        :param class_labels: the names of the labels in column order, or None to number them
+        :return: a PrettyTable
+        """
+        table = PrettyTable(['Labels', 'True Positives',
+                             'False Positives', 'False Negatives',
+                             'True Negatives', 'Precision',
+                             'Recall', 'F1'
+                             ])
+
+        for index, label_counts in enumerate(self.counts.tolist()):
+            # the original table showed the ints 1 and 0 for the scores it didn't divide to get
+            precision = 1 if label_counts[1] == 0 else float(self.precision[index])
+            recall = 1 if label_counts[2] == 0 else float(self.recall[index])
+            f1_score = 0 if precision + recall == 0 else float(self.f1[index])
+
+            label = index if class_labels is None else class_labels[index]
+            table.add_row([label, ] + label_counts + [precision, recall, f1_score])
+
+        totals = [str(i) for i in self.totals.tolist()]
+        table.add_row(['Macro Averaged Totals', ] + totals +
+                      [str(self.macro_precision), str(self.macro_recall), str(self.macro_f1)])
+        table.add_row(['Micro Averaged Totals', ] + totals +
+                      [str(self.micro_precision), str(self.micro_recall), str(self.micro_f1)])
+        return table
+
+    def __add__(self, other):
+        """
+        Combines the metrics of two sets of predictions over the same labels, such as two cross
+        validation folds
+        :param other: another MultilabelMetrics
+        :return: a MultilabelMetrics of the summed counts
+        """
+        return MultilabelMetrics(self.counts + other.counts)
+
+
+def get_multilabel_metrics(y_true, y_pred, cutoff):
+    """
+    Counts the true positives, false positives, false negatives and true negatives of every label at
+    once, and works out the metrics from them
+    :param y_true: the binarized true labels, one row per article and one column per label
+    :param y_pred: the predicted label scores, in the same shape as y_true
+    :param cutoff: the score at or above which a label counts as predicted
+    :return: a MultilabelMetrics
+    """
+    actual = to_dense_array(y_true) == 1
+    predicted = to_dense_array(y_pred) >= cutoff
+
+    true_positives = (predicted & actual).sum(axis=0)
+    false_positives = (predicted & ~actual).sum(axis=0)
+    false_negatives = (~predicted & actual).sum(axis=0)
+    true_negatives = actual.shape[0] - true_positives - false_positives - false_negatives
+
+    return MultilabelMetrics(np.column_stack((true_positives, false_positives, false_negatives, true_negatives)))
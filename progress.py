@@ -0,0 +1,251 @@
+import collections
+import json
+import re
+import sys
+import time
+
+
+# The exception class name at the start of an error description, eg. "HTTPError: 404 Client Error"
+ERROR_TYPE_REGEX = re.compile(r"^(\w+): ")
+
+
+def get_error_type(error):
+    """
+    Returns the type of the exception an error description was made from
+    :param error: the description of the error, as made by scraper.describe_error
+    :return: the exception class name, or 'Exception' if the description doesn't start with one
+    """
+    matches = ERROR_TYPE_REGEX.match(error)
+    if matches:
+        return matches.group(1)
+    return 'Exception'
+
+
+class ProgressSink(object):
+    """
+    The interface the article collector and article scraper report their progress through.  This
+    class reports nothing, but keeps the counts the other sinks report: the number of articles scraped
+    and the rate they were scraped at, the failures by exception type, and, if it is given the page
+    fetcher, the requests made, bytes fetched and cache hits.  Subclasses override the methods for the
+    reports they show, calling the methods here first
+    """
+
+    def __init__(self, fetcher=None, interval=0):
+        """
+        :param fetcher: the PageFetcher whose counts to include in the metrics, or None
+        :param interval: the least time in seconds between reports, other than the first report of
+        each stage and the last
+        :return:
+        """
+        self.fetcher = fetcher
+        self.interval = interval
+        self.start_time = time.time()
+        self.last_report_time = None
+        self.header = None
+        self.description = None
+        self.url = None
+        self.progress_percent = 0
+        self.articles = 0
+        self.failures = collections.Counter()
+        self.rate = None
+        self.feed_errors = []
+
+    def start_session(self):
+        """
+        Starts reporting
+        :return:
+        """
+        self.start_time = time.time()
+
+    def end_session(self):
+        """
+        Stops reporting
+        :return:
+        """
+        pass
+
+    def report_progress(self, header, description, url, progress_percent):
+        """
+        Records what is being worked on
+        :param header: the stage of the run, eg. 'Scraping Articles'
+        :param description: what is being done to the url, eg. 'Scraping Article'
+        :param url: the url currently being processed
+        :param progress_percent: the percentage of the stage that has been completed
+        :return:
+        """
+        self.header = header
+        self.description = description
+        self.url = url
+        self.progress_percent = progress_percent
+
+    def report_rate(self, concurrency_limit, in_flight, requests_per_second, average_latency):
+        """
+        Records the state of the request throttle
+        :param concurrency_limit: the number of requests currently allowed in flight
+        :param in_flight: the number of requests in flight
+        :param requests_per_second: the recent throughput
+        :param average_latency: the average request latency in seconds, or None if there is none yet
+        :return:
+        """
+        self.rate = (concurrency_limit, in_flight, requests_per_second, average_latency)
+
+    def report_article(self, article_url, error=None):
+        """
+        Counts a finished article
+        :param article_url: the url of the article
+        :param error: the description of the error that stopped the article from being scraped, or
+        None if it was scraped
+        :return:
+        """
+        self.articles += 1
+        if error is not None:
+            self.failures[get_error_type(error)] += 1
+
+    def report_feed_error(self, feed_url, error, partial):
+        """
+        Records a feed that couldn't be read, or was only read in part
+        :param feed_url: the url of the feed
+        :param error: the description of the error that stopped the feed from being read
+        :param partial: whether the entries before the error were read
+        :return:
+        """
+        self.feed_errors.append((feed_url, error, partial))
+
+    def is_due(self, header, progress_percent):
+        """
+        Returns whether enough time has passed since the last report to report again, and marks the
+        report as made if so.  The first report of a stage and the report at 100% are always due
+        :param header: the stage being reported on
+        :param progress_percent: the percentage of the stage that has been completed
+        :return:
+        """
+        now = time.time()
+        due = (self.last_report_time is None or header != self.header or progress_percent >= 100 or
+               now - self.last_report_time >= self.interval)
+        if due:
+            self.last_report_time = now
+        return due
+
+    def get_metrics(self):
+        """
+        Returns the counts kept so far
+        :return: a dictionary of metrics
+        """
+        elapsed = max(time.time() - self.start_time, 0.001)
+        metrics = {
+            'elapsed': round(elapsed, 3),
+            'stage': self.header,
+            'progress_percent': self.progress_percent,
+            'articles': self.articles,
+            'articles_per_second': round(self.articles / elapsed, 3),
+            'failures': dict(self.failures)
+        }
+        if self.fetcher is not None:
+            metrics.update(self.fetcher.get_stats())
+        if self.rate is not None:
+            metrics['concurrency_limit'] = self.rate[0]
+            metrics['requests_per_second'] = round(self.rate[2], 3)
+        if self.feed_errors:
+            metrics['feeds_partial'] = sum(1 for feed_url, error, partial in self.feed_errors if partial)
+            metrics['feeds_skipped'] = len(self.feed_errors) - metrics['feeds_partial']
+        return metrics
+
+
+class LogProgressSink(ProgressSink):
+    """
+    Reports progress as plain lines of text, for runs without a terminal, such as cron jobs.  A line is
+    written at most every interval seconds, and whenever a new stage starts or a stage finishes
+    """
+
+    def __init__(self, stream=None, fetcher=None, interval=10.0):
+        """
+        :param stream: the file to write to. Standard error is used if none is given
+        :param fetcher: the PageFetcher whose counts to include in the lines, or None
+        :param interval: the least time in seconds between lines
+        :return:
+        """
+        ProgressSink.__init__(self, fetcher=fetcher, interval=interval)
+        self.stream = stream or sys.stderr
+
+    def write_line(self, message):
+        """
+        Writes a line with the time and the current counts
+        :param message: the start of the line
+        :return:
+        """
+        metrics = self.get_metrics()
+        line = "[{0}] {1} | {2} articles, {3:.2f}/s, {4} failed".format(
+            time.strftime('%H:%M:%S'), message, metrics['articles'], metrics['articles_per_second'],
+            sum(self.failures.itervalues()))
+        if self.fetcher is not None:
+            line += ", {0} requests, {1:.1f} MB fetched, {2} cache hits".format(
+                metrics['requests'], metrics['bytes_fetched'] / 1048576.0, metrics['cache_hits'])
+        self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def report_progress(self, header, description, url, progress_percent):
+        due = self.is_due(header, progress_percent)
+        ProgressSink.report_progress(self, header, description, url, progress_percent)
+        if due:
+            self.write_line("{0} {1}%: {2}: {3}".format(header, progress_percent, description, url))
+
+    def report_feed_error(self, feed_url, error, partial):
+        ProgressSink.report_feed_error(self, feed_url, error, partial)
+        self.write_line("{0} feed {1}: {2}".format('Partly read' if partial else 'Skipped', feed_url, error))
+
+    def end_session(self):
+        ProgressSink.end_session(self)
+        self.write_line("Finished")
+        for error_type, count in sorted(self.failures.iteritems()):
+            self.stream.write("    {0}: {1}\n".format(error_type, count))
+        self.stream.flush()
+
+
+class JsonLinesProgressSink(ProgressSink):
+    """
+    Writes the run's metrics as a JSON object per line, for collecting by monitoring tools.  A line is
+    written at most every interval seconds, whenever a new stage starts or a stage finishes, and at the
+    end of the run.  Each line holds the time, the stage and its progress, the number of articles and
+    articles per second, the failures by exception type, and, if the sink has the page fetcher, the
+    requests made, bytes fetched and cache hits
+    """
+
+    def __init__(self, stream=None, fetcher=None, interval=5.0):
+        """
+        :param stream: the file to write to. Standard error is used if none is given
+        :param fetcher: the PageFetcher whose counts to include in the metrics, or None
+        :param interval: the least time in seconds between lines
+        :return:
+        """
+        ProgressSink.__init__(self, fetcher=fetcher, interval=interval)
+        self.stream = stream or sys.stderr
+
+    def write_metrics(self, event, details=None):
+        """
+        Writes a line of metrics
+        :param event: 'progress', 'feed_error' for a feed that couldn't be read, or 'end' for the last
+        line of the run
+        :param details: a dictionary of other values to write in the line, or None
+        :return:
+        """
+        metrics = self.get_metrics()
+        metrics['event'] = event
+        metrics['time'] = round(time.time(), 3)
+        if details is not None:
+            metrics.update(details)
+        self.stream.write(json.dumps(metrics, sort_keys=True) + '\n')
+        self.stream.flush()
+
+    def report_progress(self, header, description, url, progress_percent):
+        due = self.is_due(header, progress_percent)
+        ProgressSink.report_progress(self, header, description, url, progress_percent)
+        if due:
+            self.write_metrics('progress')
+
+    def report_feed_error(self, feed_url, error, partial):
+        ProgressSink.report_feed_error(self, feed_url, error, partial)
+        self.write_metrics('feed_error', {'feed_url': feed_url, 'error': error, 'partial': partial})
+
+    def end_session(self):
+        ProgressSink.end_session(self)
+        self.write_metrics('end')
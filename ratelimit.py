@@ -0,0 +1,246 @@
+import collections
+import multiprocessing
+import time
+
+
+class TokenBucket(object):
+    """
+    A token bucket rate limiter.  Tokens are added at rate per second, up to burst tokens, and each
+    request takes one, waiting for it if the bucket is empty.  Over any stretch of time no more than
+    rate requests per second are started, plus the burst.  The tokens are kept in shared memory, so
+    worker processes forked after the bucket is made draw from the same bucket as their parent
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        :param rate: the number of tokens added per second
+        :param burst: the most tokens the bucket holds
+        :return:
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = multiprocessing.Value('d', float(burst), lock=False)
+        self.last_fill = multiprocessing.Value('d', time.time(), lock=False)
+        self.lock = multiprocessing.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, first waiting until there is one
+        :return:
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+                tokens = min(self.burst, self.tokens.value + (now - self.last_fill.value) * self.rate)
+                self.last_fill.value = now
+                if tokens >= 1:
+                    self.tokens.value = tokens - 1
+                    return
+                self.tokens.value = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDController(object):
+    """
+    Limits the number of requests in flight, adjusting the limit with additive increase, multiplicative
+    decrease (AIMD), as TCP does.  Each request that comes back quickly raises the limit by 1 / limit, so
+    the limit grows by about one for every limit requests.  A 429 or 503 response, a failed request, or
+    a rise in latency cuts the limit by decrease_factor, at most once per cooldown seconds, so a burst of
+    slow responses to requests that were all sent at the old limit only counts once.
+
+    Latency is smoothed with an exponentially weighted moving average, and counts as risen when the
+    average is above target_latency, or above latency_factor times the lowest average seen so far.
+
+    The limit, the requests in flight and the latencies are kept in shared memory, so worker processes
+    forked after the controller is made count against the same limit as their parent
+    """
+
+    BACKOFF_STATUS_CODES = (429, 503)
+
+    def __init__(self, initial_limit=1, min_limit=1, max_limit=8, target_latency=5.0, latency_factor=3.0,
+                 decrease_factor=0.5, cooldown=1.0, smoothing=0.2):
+        """
+        :param initial_limit: the number of requests allowed in flight at the start
+        :param min_limit: the lowest the limit is cut to
+        :param max_limit: the highest the limit is raised to
+        :param target_latency: the average latency in seconds above which the limit is cut
+        :param latency_factor: the limit is also cut when the average latency rises above this many
+        times the lowest average seen
+        :param decrease_factor: the limit is multiplied by this when it is cut
+        :param cooldown: the least time in seconds between cuts
+        :param smoothing: the weight of each new latency in the moving average
+        :return:
+        """
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.latency_factor = latency_factor
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+        self.shared_limit = multiprocessing.Value('d', float(initial_limit), lock=False)
+        self.shared_in_flight = multiprocessing.Value('l', 0, lock=False)
+        # the latencies are 0 until the first request finishes
+        self.shared_average_latency = multiprocessing.Value('d', 0.0, lock=False)
+        self.shared_lowest_latency = multiprocessing.Value('d', 0.0, lock=False)
+        self.last_decrease = multiprocessing.Value('d', 0.0, lock=False)
+        self.condition = multiprocessing.Condition()
+
+    @property
+    def limit(self):
+        return self.shared_limit.value
+
+    @property
+    def in_flight(self):
+        return self.shared_in_flight.value
+
+    @property
+    def average_latency(self):
+        """
+        The moving average of the request latency in seconds, or None before any request has finished
+        :return:
+        """
+        return self.shared_average_latency.value or None
+
+    def acquire(self):
+        """
+        Waits until another request is allowed in flight, and counts it
+        :return:
+        """
+        with self.condition:
+            while self.shared_in_flight.value >= int(self.shared_limit.value):
+                self.condition.wait()
+            self.shared_in_flight.value += 1
+
+    def cancel(self):
+        """
+        Gives back a place in flight taken by acquire for a request that was never sent, without
+        adjusting the limit
+        :return:
+        """
+        with self.condition:
+            self.shared_in_flight.value -= 1
+            self.condition.notify_all()
+
+    def release(self, latency, status_code):
+        """
+        Counts a request as finished and adjusts the limit
+        :param latency: the time in seconds the request took
+        :param status_code: the HTTP status of the response, or None if the request failed
+        :return:
+        """
+        # latencies of 0 would read as no latency yet
+        latency = max(latency, 1e-6)
+
+        with self.condition:
+            self.shared_in_flight.value -= 1
+
+            average_latency = self.shared_average_latency.value
+            if not average_latency:
+                average_latency = latency
+            else:
+                average_latency += self.smoothing * (latency - average_latency)
+            self.shared_average_latency.value = average_latency
+
+            lowest_latency = self.shared_lowest_latency.value
+            if not lowest_latency or average_latency < lowest_latency:
+                lowest_latency = self.shared_lowest_latency.value = average_latency
+
+            latency_risen = (average_latency > self.target_latency or
+                             average_latency > self.latency_factor * lowest_latency)
+
+            limit = self.shared_limit.value
+            if status_code is None or status_code in self.BACKOFF_STATUS_CODES or latency_risen:
+                now = time.time()
+                if now - self.last_decrease.value >= self.cooldown:
+                    self.shared_limit.value = max(self.min_limit, limit * self.decrease_factor)
+                    self.last_decrease.value = now
+            else:
+                self.shared_limit.value = min(self.max_limit, limit + 1.0 / limit)
+
+            self.condition.notify_all()
+
+
+class RequestThrottle(object):
+    """
+    Paces the requests made by a PageFetcher: a TokenBucket caps the request rate, and an AIMDController
+    caps the number of requests in flight.  Also keeps the throughput over the last few seconds for the
+    command line display.
+
+    The bucket, the controller and the count of finished requests are all in shared memory, so the
+    parse worker processes, which fork with a copy of the fetcher and use it to measure images, share
+    one rate and one concurrency limit with the parent rather than each getting their own.  The throttle
+    must be made before the workers are forked
+    """
+
+    def __init__(self, rate=None, burst=1, controller=None, throughput_window=10.0):
+        """
+        :param rate: the most requests to start per second, or None for no rate limit
+        :param burst: the number of requests that can be started at once after a quiet spell
+        :param controller: the AIMDController to use. One with the default settings is used if none is given
+        :param throughput_window: the number of seconds over which throughput is measured
+        :return:
+        """
+        self.rate = rate
+        self.burst = burst
+        self.controller = controller or AIMDController()
+        self.throughput_window = throughput_window
+
+        if rate:
+            self.bucket = TokenBucket(rate, burst)
+        else:
+            self.bucket = None
+
+        self.num_finished = multiprocessing.Value('l', 0)
+        # time, num_finished samples taken by get_stats, going back one throughput window
+        self.finished_samples = collections.deque()
+
+    def start(self):
+        """
+        Waits until a request may be sent.  If the wait for the bucket is interrupted, the place taken in
+        the controller is given back, so it isn't lost
+        :return: the time the request was let through, to be given to finish
+        """
+        self.controller.acquire()
+        try:
+            if self.bucket is not None:
+                self.bucket.acquire()
+        except BaseException:
+            self.controller.cancel()
+            raise
+        return time.time()
+
+    def finish(self, start_time, status_code):
+        """
+        Records that a request has finished
+        :param start_time: the time returned by start
+        :param status_code: the HTTP status of the response, or None if the request failed
+        :return:
+        """
+        self.controller.release(time.time() - start_time, status_code)
+        with self.num_finished.get_lock():
+            self.num_finished.value += 1
+
+    def get_stats(self):
+        """
+        Returns the current state of the throttle, counting the requests of every process.  The
+        throughput is worked out from the finished request counts seen by earlier calls, so it should
+        be called from one thread, as the progress display does
+        :return: concurrency_limit, in_flight, requests_per_second, average_latency. average_latency is
+        None before any request has finished
+        """
+        now = time.time()
+        samples = self.finished_samples
+        samples.append((now, self.num_finished.value))
+        while len(samples) > 1 and samples[1][0] <= now - self.throughput_window:
+            samples.popleft()
+        elapsed = now - samples[0][0]
+        if elapsed > 0:
+            requests_per_second = (samples[-1][1] - samples[0][1]) / elapsed
+        else:
+            requests_per_second = 0.0
+        controller = self.controller
+        return int(controller.limit), controller.in_flight, requests_per_second, controller.average_latency
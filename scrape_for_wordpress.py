@@ -36,12 +36,79 @@ parser.add_argument('-e', action='store', dest='end_date_string',
 parser.add_argument('-i', action='store', dest='start_index', type=int,
                     help='The starting index for post and image IDs. Default is 0')
 
+parser.add_argument('-w', action='store', dest='workers', type=int,
+                    help='The number of pages to fetch at the same time. Default is 1')
+
+parser.add_argument('-p', action='store', dest='parse_workers', type=int,
+                    help='The number of processes to parse articles in. Default is 1')
+
+parser.add_argument('--cache-dir', action='store', dest='cache_dir',
+                    help='Directory to cache downloaded pages and images in. Default is no cache')
+
+parser.add_argument('--cache-size', action='store', dest='cache_size', type=int,
+                    help='The maximum size of the cache in megabytes. Default is 1024')
+
+parser.add_argument('--incremental', action='store_true',
+                    help='Only download and parse articles that changed since the last run. Requires --cache-dir')
+
+parser.add_argument('-o', action='store', dest='output_dir',
+                    help='Directory to write the import files to. Default is the current directory')
+
+parser.add_argument('--split-size', action='store', dest='split_size', type=float,
+                    help='The size in megabytes at which to start a new import file. Default is 5')
+
+parser.add_argument('--split-items', action='store', dest='split_items', type=int,
+                    help='The number of articles at which to start a new import file. Default is no limit')
+
+parser.add_argument('--checkpoint', action='store', dest='checkpoint_path',
+                    help='File to journal the run in, so that an interrupted run can be resumed by running it again')
+
+parser.add_argument('--store', action='store', dest='store_path',
+                    help='Article store database to save every scraped article in')
+
+parser.add_argument('--from-store', action='store_true',
+                    help='Export the articles in the article store instead of scraping news.ucsc.edu. Requires --store')
+
+parser.add_argument('--category', action='store', dest='category',
+                    help='With --from-store, only export articles in this category')
+
+parser.add_argument('--manifest', action='store', dest='manifest_path',
+                    help='File recording the archive pages read by earlier runs, so only articles added since then are scraped')
+
+parser.add_argument('--revalidate-months', action='store', dest='revalidate_months', type=int,
+                    help='With --manifest, how many months before the newest month in it to check for changes. '
+                         'Default is 12')
+
+parser.add_argument('--feed', action='append', dest='feed_urls',
+                    help='Sitemap or RSS/Atom feed url to find articles in instead of the monthly archive pages. '
+                         'Can be given more than once')
+
+parser.add_argument('--rate', action='store', dest='rate', type=float,
+                    help='The most requests to send per second; 0 for no limit. Default is 10')
+
+parser.add_argument('--parser', action='store', dest='parser_backend', choices=('bs4', 'lxml'),
+                    help='The parser to read article pages with: bs4 or the faster lxml. Default is bs4')
+
+parser.add_argument('--progress', action='store', dest='progress', choices=('curses', 'log', 'json'),
+                    help='How to report progress: a curses progress bar, a line of text every few seconds, '
+                         'or a JSON line of metrics every few seconds. Default is curses')
+
+parser.add_argument('--progress-file', action='store', dest='progress_file',
+                    help='File to append log or json progress to. Default is standard error')
+
 parser.add_argument("--markdown", help="Generate Jekyll Markdown Files from Articles",
                     action="store_true")
 
 results = parser.parse_args()
 
 start_index = results.start_index or 0
+workers = results.workers or 1
+parse_workers = results.parse_workers or 1
+cache_size = results.cache_size or 1024
+output_dir = results.output_dir or '.'
+split_bytes = int((results.split_size or 5) * 1024 * 1024)
+rate = results.rate if results.rate is not None else 10.0
+revalidate_months = results.revalidate_months if results.revalidate_months is not None else 12
 
 now = datetime.datetime.now()
 
@@ -66,6 +133,25 @@ if start_month_year[1] == end_month_year[1] and start_month_year[0] > end_month_
     print "newsparser: Start date may not be after end date"
     exit()
 
-nsp = NewsSiteScraper(start_index=start_index)
+if results.incremental and results.cache_dir is None:
+    print "newsparser: --incremental requires --cache-dir"
+    exit()
 
-nsp.get_wordpress_import(results.markdown, start_month_year[0], start_month_year[1], end_month_year[0], end_month_year[1])
+if results.from_store and results.store_path is None:
+    print "newsparser: --from-store requires --store"
+    exit()
+
+nsp = NewsSiteScraper(start_index=start_index, workers=workers, parse_workers=parse_workers,
+                      cache_dir=results.cache_dir, cache_size=cache_size,
+                      incremental=results.incremental, output_dir=output_dir,
+                      split_bytes=split_bytes, split_items=results.split_items,
+                      checkpoint_path=results.checkpoint_path, store_path=results.store_path,
+                      parser_backend=results.parser_backend or 'bs4', manifest_path=results.manifest_path,
+                      feed_urls=results.feed_urls, rate=rate, progress=results.progress or 'curses',
+                      progress_file=results.progress_file, revalidate_months=revalidate_months)
+
+if results.from_store:
+    nsp.get_wordpress_import_from_store(results.markdown, start_month_year[0], start_month_year[1],
+                                        end_month_year[0], end_month_year[1], results.category)
+else:
+    nsp.get_wordpress_import(results.markdown, start_month_year[0], start_month_year[1], end_month_year[0], end_month_year[1])
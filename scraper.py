@@ -1,17 +1,34 @@
 import datetime
+import hashlib
+import itertools
+import json
 import os
 import re
+import shelve
+import threading
 import time
+from collections import deque
 from email.utils import formatdate
-from urlparse import urljoin
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from urlparse import urljoin, urlparse
 
 import bs4
 import requests
 from bs4 import BeautifulSoup
 from tidylib import tidy_fragment
-from unidecode import unidecode
 
+from cache import ResponseCache, ImageDimensionIndex
+from checkpoint import ScrapeCheckpoint
+from discovery import FeedDiscovery
+from manifest import ArchiveManifest
+from ratelimit import AIMDController, RequestThrottle
+from store import ArticleStore
+from fetcher import PageFetcher
+from lxmlparser import LxmlArticleParser, LxmlTag, UnsupportedPageException
+from progress import LogProgressSink, JsonLinesProgressSink
 from utils import GremlinZapper, CommandLineDisplay, ArticleUtils
+from wxr import RotatingWXRSink
 
 
 class ContentNotHTMLException(Exception):
@@ -37,11 +54,98 @@ class BodyIsNoneException(Exception):
     def __init__(self):
         Exception.__init__(self, "Body is None")
 
+
+def ordered_map(pool, func, iterable, window):
+    """
+    Generator that runs func over iterable on a worker pool and yields the results in the order of
+    iterable.  Unlike pool.imap, at most window items are taken from iterable ahead of the result
+    being consumed, so a slow consumer never causes the results to pile up in memory.  Only as many
+    items as the pool has workers are run at once; the rest of the window waits in the pool's queue or
+    holds a finished result
+    :param pool: the multiprocessing Pool or ThreadPool to run func on
+    :param func: the function to apply to each item
+    :param iterable: the items to apply func to
+    :param window: the maximum number of items submitted to the pool and not yet yielded
+    :return: yields func(item) for each item in iterable
+    """
+    pending = deque()
+    item_iter = iter(iterable)
+
+    for item in itertools.islice(item_iter, window):
+        pending.append(pool.apply_async(func, (item,)))
+
+    while pending:
+        result = pending.popleft().get()
+        for item in itertools.islice(item_iter, 1):
+            pending.append(pool.apply_async(func, (item,)))
+        yield result
+
+
+def describe_error(e):
+    """
+    Describes an exception for the diagnostic file and the checkpoint, naming its class so that the
+    progress sinks can count failures by exception type
+    :param e: the exception
+    :return: a string such as "HTTPError: 404 Client Error"
+    """
+    return "{0}: {1}".format(e.__class__.__name__, e)
+
+
+# The tags ArticleScraper.collect_article_tags picks out of div#main, by tag name.  Each entry is
+# (attribute, value, key): a tag matches if the attribute has the value (for class, if the value is one
+# of its classes), or always if the attribute is None.  The tag is stored in the article tags under key
+ARTICLE_SELECTORS = {
+    'span': [('class', 'name', 'author'),
+             ('class', 'tel', 'author_telephone'),
+             ('class', 'role', 'author_role'),
+             ('class', 'message-from', 'message_from'),
+             ('class', 'message-to', 'message_to')],
+    'p': [('class', 'date', 'date'),
+          ('class', 'subhead', 'subhead')],
+    'h1': [('id', 'title', 'title')],
+    'div': [('class', 'article-body', 'article_body')],
+    'figure': [('class', 'article-image', 'figures')],
+    'img': [(None, None, 'images')],
+    'iframe': [(None, None, 'iframes')],
+    'a': [(None, None, 'links')]
+}
+
+# The keys in ARTICLE_SELECTORS under which every matching tag is kept, rather than just the first
+ARTICLE_LIST_KEYS = ('figures', 'images', 'iframes', 'links')
+
+# The parsers ArticleScraper can read article pages with
+PARSER_BACKENDS = ('bs4', 'lxml')
+
+# The ways NewsSiteScraper can report its progress
+PROGRESS_SINKS = ('curses', 'log', 'json')
+
+
 class ArticleCollector(object):
     """
     Class that iterates through the archives of news.ucsc.edu and returns a list of article urls.
     """
 
+    def __init__(self, workers=1, fetcher=None, manifest=None, discovery=None, revalidate_months=None):
+        """
+        :param workers: the number of archive index pages to fetch and parse at the same time
+        :param fetcher: the PageFetcher to download pages with. A PageFetcher without a cache is used
+        if none is given
+        :param manifest: the ArchiveManifest of the archive pages read by earlier runs.  If given, only
+        the articles that weren't in the manifest are returned, and the manifest is updated
+        :param discovery: a discovery backend, such as a FeedDiscovery, to find the articles with
+        instead of reading the monthly archive pages, or None to read the archive pages.  A backend is
+        any object with a get_articles(screen, start_month, start_year, end_month, end_year) method
+        :param revalidate_months: with a manifest, how many months before the newest month in it to
+        revalidate with conditional GETs.  Older months in the manifest are taken to be unchanged without
+        a request.  None to revalidate every month
+        :return:
+        """
+        self.workers = workers
+        self.fetcher = fetcher or PageFetcher()
+        self.manifest = manifest
+        self.discovery = discovery
+        self.revalidate_months = revalidate_months
+
     def get_soup_from_url(self, page_url):
         """
         Takes the url of a web page and returns a BeautifulSoup Soup object representation
@@ -50,7 +154,7 @@ class ArticleCollector(object):
         :raises: r.raise_for_status: if the url doesn't return an HTTP 200 response
         :return: A Soup object representing the page html
         """
-        r = requests.get(page_url)
+        r = self.fetcher.get(page_url)
         if r.status_code != requests.codes.ok:
             r.raise_for_status()
         if r.headers['content-type'] != 'text/html; charset=UTF-8':
@@ -113,38 +217,192 @@ class ArticleCollector(object):
 
         try:
             soup = self.get_soup_from_url(archive_url)
-            archive_lists = soup.find_all('ul', {'class': "archive-list"})
+            return self.get_articles_from_soup(archive_url, soup)
+        except requests.exceptions.HTTPError:
+            return []
 
-            article_dictionary = dict()
+    def get_articles_from_soup(self, archive_url, soup):
+        """
+        Returns the articles listed on an archive index page, in page order without duplicates
+        :param archive_url: the url of the archive index page
+        :param soup: the BeautifulSoup object of the page
+        :return: a list of article urls
+        """
+        archive_lists = soup.find_all('ul', {'class': "archive-list"})
 
-            for archive_list in archive_lists:
-                links = archive_list.find_all('a')
-                for link in links:
-                    url = archive_url + link['href']
-                    article_dictionary[url] = ""
-            return self.dict_keys_to_list(article_dictionary)
-        except requests.exceptions.HTTPError:
+        article_list = []
+        seen_urls = set()
+
+        for archive_list in archive_lists:
+            links = archive_list.find_all('a')
+            for link in links:
+                url = archive_url + link['href']
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    article_list.append(url)
+        return article_list
+
+    def get_recent_archive_urls(self):
+        """
+        Returns the archive index urls of the current and previous months, which can still gain articles
+        :return: a set of archive index urls
+        """
+        now = datetime.datetime.now()
+        if now.month > 1:
+            previous_month, previous_year = now.month - 1, now.year
+        else:
+            previous_month, previous_year = 12, now.year - 1
+
+        return set(['http://news.ucsc.edu/' + str(now.year) + '/' + "%02d" % (now.month,) + '/',
+                    'http://news.ucsc.edu/' + str(previous_year) + '/' + "%02d" % (previous_month,) + '/'])
+
+    def get_month_number(self, archive_url):
+        """
+        Returns the number of months between the start of year 0 and the month of an archive index url,
+        so that months can be compared and subtracted
+        :param archive_url: an archive index url, such as http://news.ucsc.edu/2015/11/
+        :return: year * 12 + month - 1
+        """
+        year, month = archive_url.rstrip('/').split('/')[-2:]
+        return int(year) * 12 + int(month) - 1
+
+    def get_oldest_revalidated_month(self, known_months):
+        """
+        Returns the month number of the oldest month in the manifest to revalidate, which is
+        revalidate_months before the newest month whose page was found
+        :param known_months: the months of the manifest, as returned by ArchiveManifest.get_months
+        :return: a month number as returned by get_month_number, or None to revalidate every month
+        """
+        found_months = [self.get_month_number(archive_url) for archive_url, known_month in known_months.iteritems()
+                        if known_month[3] >= 0]
+        if self.revalidate_months is None or not found_months:
+            return None
+        return max(found_months) - self.revalidate_months
+
+    def check_archive(self, archive_url, known_month, recent, revalidate=True):
+        """
+        Reads an archive index page for a run that uses the manifest.  Months that aren't in the
+        manifest are always fetched.  Months that are, are fetched with a conditional GET, so an
+        unchanged page costs a 304 and isn't parsed.  Months that aren't recent are taken to be
+        unchanged without a request if their page had no validators, if they are older than the
+        revalidation window, or if their page wasn't found
+        :param archive_url: the url of the archive index page
+        :param known_month: the fingerprint, etag, last_modified, status tuple of the month from the
+        manifest, or None if the month isn't in it
+        :param recent: whether the month is the current or previous month
+        :param revalidate: whether the month is within the revalidation window
+        :raises: ContentNotHTMLException: if the page isn't html
+        :return: article_list, etag, last_modified, status. article_list is None if the page hasn't
+        changed or couldn't be fetched, and status is None if no request was sent
+        """
+        if known_month is None:
+            etag, last_modified = None, None
+        else:
+            fingerprint, etag, last_modified, status = known_month
+            if not recent and (not revalidate or status < 0 or (etag is None and last_modified is None)):
+                return None, None, None, None
+
+        r = self.fetcher.get_if_changed(archive_url, etag, last_modified)
+        if r.not_modified:
+            return None, etag, last_modified, r.status_code
+        if r.status_code != requests.codes.ok:
+            return None, None, None, r.status_code
+        if r.headers['content-type'] != 'text/html; charset=UTF-8':
+            raise ContentNotHTMLException
+
+        article_list = self.get_articles_from_soup(archive_url, BeautifulSoup(r.content, 'lxml'))
+        return article_list, r.headers.get('etag'), r.headers.get('last-modified'), r.status_code
+
+    def record_archive(self, archive_url, known_month, article_list, etag, last_modified, status):
+        """
+        Updates the manifest with the result of check_archive, and returns the articles on the page
+        that weren't in the manifest before.  A page whose article list has the same fingerprint as
+        before only has its validators updated, and a page that wasn't found is recorded as missing
+        :param archive_url: the url of the archive index page
+        :param known_month: the month from the manifest, as given to check_archive
+        :param article_list: the article list returned by check_archive
+        :param etag: the etag returned by check_archive
+        :param last_modified: the last_modified returned by check_archive
+        :param status: the status returned by check_archive
+        :return: a list of the new article urls, in page order
+        """
+        if status == requests.codes.not_found:
+            self.manifest.record_missing_month(archive_url, status)
+            return []
+        if article_list is None:
             return []
 
+        fingerprint = hashlib.sha1('\n'.join(article_list).encode('utf-8')).hexdigest()
+        if known_month is not None and known_month[0] == fingerprint:
+            self.manifest.update_validators(archive_url, etag, last_modified)
+            return []
+
+        new_articles = [article_url for article_url in article_list if not self.manifest.has_article(article_url)]
+        self.manifest.update_month(archive_url, fingerprint, etag, last_modified, article_list)
+        return new_articles
+
     def get_articles(self, screen=None, start_month=1, start_year=2002, end_month=None, end_year=None):
         """
-        Returns a list of the urls of all articles in the news.ucsc.edu archive
-        :param screen: the command line screen to write updates to
+        Returns a list of the urls of all articles in the news.ucsc.edu archive.  When the collector
+        has more than one worker, the archive index pages are fetched and parsed in parallel, but the
+        returned list is always in archive order with duplicate urls removed.  When the collector has a
+        manifest, only the articles that weren't in it are returned
+        :param screen: the ProgressSink to report the progress of the collector to
         :return: a list of all news.ucsc.edu article urls
         """
+        if self.discovery is not None:
+            return self.discovery.get_articles(screen, start_month, start_year, end_month, end_year)
+
         url_list = self.generate_urls(start_month, start_year, end_month, end_year)
         article_list = []
+        seen_articles = set()
 
         num_urls = len(url_list)
         current_url_num = 1
         prog_percent = 0
 
-        for url in url_list:
-            if screen is not None:
-                screen.report_progress('Getting Article URLs', 'Getting Articles From', url, prog_percent)
-                prog_percent = int(((current_url_num + 0.0) / num_urls) * 100)
-                current_url_num += 1
-            article_list.extend(self.get_articles_from_url(url))
+        if self.manifest is not None:
+            known_months = self.manifest.get_months()
+            recent_urls = self.get_recent_archive_urls()
+            oldest_revalidated = self.get_oldest_revalidated_month(known_months)
+
+            def read_archive(archive_url):
+                revalidate = oldest_revalidated is None or self.get_month_number(archive_url) >= oldest_revalidated
+                return self.check_archive(archive_url, known_months.get(archive_url), archive_url in recent_urls,
+                                          revalidate)
+        else:
+            read_archive = self.get_articles_from_url
+
+        pool = None
+        if self.workers > 1:
+            pool = ThreadPool(self.workers)
+            # imap hands back each month's results in the order of url_list
+            results = pool.imap(read_archive, url_list)
+        else:
+            results = itertools.imap(read_archive, url_list)
+
+        try:
+            for url in url_list:
+                if screen is not None:
+                    screen.report_progress('Getting Article URLs', 'Getting Articles From', url, prog_percent)
+                    if self.fetcher.throttle is not None:
+                        screen.report_rate(*self.fetcher.throttle.get_stats())
+                    prog_percent = int(((current_url_num + 0.0) / num_urls) * 100)
+                    current_url_num += 1
+                month_articles = next(results)
+                if self.manifest is not None:
+                    # the manifest is only used from this thread
+                    month_articles = self.record_archive(url, known_months.get(url), *month_articles)
+                for article_url in month_articles:
+                    if article_url not in seen_articles:
+                        seen_articles.add(article_url)
+                        article_list.append(article_url)
+            if screen is not None and url_list:
+                screen.report_progress('Getting Article URLs', 'Found Articles', str(len(article_list)), 100)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
         return article_list
 
 
@@ -153,8 +411,17 @@ class ArticleWriter(object):
     Takes an articles_dictionary and generates a wordpress import file.  also generates jekyll
     markdown files if specified to do so
     """
-    def __init__(self):
+    def __init__(self, output_dir='.', split_bytes=5242880, split_items=None):
+        """
+        :param output_dir: the directory to write the import files and markdown files to
+        :param split_bytes: the size in bytes at which to start a new import file, or None for no limit
+        :param split_items: the number of articles at which to start a new import file, or None for no limit
+        :return:
+        """
         self.utils = ArticleUtils()
+        self.output_dir = output_dir
+        self.split_bytes = split_bytes
+        self.split_items = split_items
 
     def write_markdown(self, article_url, article_dict):
         """
@@ -176,7 +443,7 @@ class ArticleWriter(object):
             - post_id
             - article_body (the main text of the article)
 
-        Creates a new file in the current directory with all data except article_body and date in YAML
+        Creates a new file in output_dir with all data except article_body and date in YAML
         metadata format:
             ---
             layout: post
@@ -232,7 +499,10 @@ class ArticleWriter(object):
         except ValueError:
             raise NoDateException()
 
-        fo = open(article_dict['file_name'], "w")
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        fo = open(os.path.join(self.output_dir, article_dict['file_name']), "w")
         fo.write("---\n")
         fo.write("layout: post\n")
         fo.write("title: \"" + title + "\"\n")
@@ -307,113 +577,72 @@ class ArticleWriter(object):
         fo.write(article_dict['source_permalink'] + "\n")
         fo.close()
 
-    def write_wordpress_import_file(self, articles_dictionary, markdown=False):
+    def render_wordpress_item(self, article_url, article_dict):
         """
-        Takes a list of dictionaries with information about an article and
-        creates a wordpress import files of maximum size 5MB
-        :param articles_dictionary:
-        :param markdown:
-        :return:
+        Returns the wordpress import xml for an article: the post item followed by an attachment item
+        for each of its images
+        :param article_url: the url of the article
+        :param article_dict: the article dictionary
+        :raises: NoDateException: if the article's date can't be parsed
+        :return: the xml of the article's items
         """
+        upload_url = 'http://dev-ucsc-news.pantheonsite.io/'
 
-        import_file_num = 0
+        image_upload_string = 'wp-content/uploads/'
 
-        five_megabytes = 5242880
+        parts = []
 
-        upload_url = 'http://dev-ucsc-news.pantheonsite.io/'
+        title = article_dict['title'] or ''
+        title = title.replace('"', "'")
+        subhead = article_dict['subhead']
+        if subhead is not None:
+            subhead = subhead.replace('"', "'")
+        author = article_dict['author'] or ''
+        article_author = article_dict['article_author']
+        post_id = article_dict['post_id']
+        raw_date = article_dict['date']
+        article_author_telephone = article_dict['article_author_telephone']
+        article_author_title = article_dict['article_author_title']
+        message_from = article_dict['message_from']
+        message_to = article_dict['message_to']
+        categories = article_dict['categories']
+        url_slug = self.utils.get_url_slug(article_url)
+        article_url_ending = self.utils.get_url_ending(article_url)
 
-        image_upload_string = 'wp-content/uploads/'
+        try:
+            date_object = datetime.datetime.strptime(raw_date, "%Y-%m-%d")
+            image_url_date = date_object.strftime("%Y/%m/")
 
-        fo = open('wordpress-news-site-scraper-import-' + str(import_file_num) + '.xml', "w")
-        fo.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        fo.write('<rss version="2.0"\n')
-        fo.write('    xmlns:excerpt="http://wordpress.org/export/1.2/excerpt/"\n')
-        fo.write('    xmlns:content="http://purl.org/rss/1.0/modules/content/"\n')
-        fo.write('    xmlns:wfw="http://wellformedweb.org/CommentAPI/"\n')
-        fo.write('    xmlns:dc="http://purl.org/dc/elements/1.1/"\n')
-        fo.write('    xmlns:wp="http://wordpress.org/export/1.2/">\n\n')
-        fo.write('  <channel>\n\n')
-        fo.write('    <language>en-US</language>\n')
-        fo.write('    <wp:wxr_version>1.2</wp:wxr_version>\n\n\n')
-
-        for article_url, article_dict in articles_dictionary.iteritems():
-
-            if markdown:
-                self.write_markdown(article_url, article_dict)
-
-            old_file_position = fo.tell()
-            fo.seek(0, os.SEEK_END)
-            size = fo.tell()
-            fo.seek(old_file_position, os.SEEK_SET)
-
-            if size > five_megabytes:
-                import_file_num += 1
-                fo.write('\n  </channel>\n')
-                fo.write('</rss>\n\n')
-                fo.close()
-                fo = open('wordpress-news-site-scraper-import-' + str(import_file_num) + '.xml', "w")
-                fo.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                fo.write('<rss version="2.0"\n')
-                fo.write('    xmlns:excerpt="http://wordpress.org/export/1.2/excerpt/"\n')
-                fo.write('    xmlns:content="http://purl.org/rss/1.0/modules/content/"\n')
-                fo.write('    xmlns:wfw="http://wellformedweb.org/CommentAPI/"\n')
-                fo.write('    xmlns:dc="http://purl.org/dc/elements/1.1/"\n')
-                fo.write('    xmlns:wp="http://wordpress.org/export/1.2/">\n\n')
-                fo.write('  <channel>\n\n')
-                fo.write('    <language>en-US</language>\n')
-                fo.write('    <wp:wxr_version>1.2</wp:wxr_version>\n\n\n')
-
-            title = article_dict['title'] or ''
-            title = title.replace('"', "'")
-            subhead = article_dict['subhead']
-            if subhead is not None:
-                subhead = subhead.replace('"', "'")
-            author = article_dict['author'] or ''
-            article_author = article_dict['article_author']
-            post_id = article_dict['post_id']
-            raw_date = article_dict['date']
-            article_author_telephone = article_dict['article_author_telephone']
-            article_author_title = article_dict['article_author_title']
-            message_from = article_dict['message_from']
-            message_to = article_dict['message_to']
-            categories = article_dict['categories']
-            url_slug = self.utils.get_url_slug(article_url)
-            article_url_ending = self.utils.get_url_ending(article_url)
+            post_date_string = formatdate(time.mktime(date_object.timetuple()))
+            date_string_no_tz = date_object.strftime("%Y-%m-%d %H:%M:%S")
 
-            try:
-                date_object = datetime.datetime.strptime(raw_date, "%Y-%m-%d")
-                image_url_date = date_object.strftime("%Y/%m/")
-
-                post_date_string = formatdate(time.mktime(date_object.timetuple()))
-                date_string_no_tz = date_object.strftime("%Y-%m-%d %H:%M:%S")
-
-            except ValueError:
-                raise NoDateException()
-
-            fo.write('      <item>\n')
-            fo.write('        <title>' + title + '</title>\n')
-            fo.write('        <pubDate>' + post_date_string + '</pubDate>\n')
-            fo.write('        <wp:post_id>' + post_id + '</wp:post_id>\n')
-            fo.write('        <description></description> \n')
-            fo.write('        <content:encoded><![CDATA[')
-
-            for image_url in article_dict['images_dictionary']:
-                values_dict = article_dict['images_dictionary'][image_url]
-
-                # The hacky url ending is used because of a bug in the wordpress importer
-                # when media is imported from a url, any percent encoded characters
-                # are replaced with the encoding digits.  for example, any %20's in the
-                # url will become 20's in the media's url on the wordpress server
-                url_ending = self.utils.get_url_ending(image_url)
-                hacky_url_ending = url_ending
-                hacky_url_ending = hacky_url_ending.replace("%", "")
-
-                image_caption = values_dict['image_caption'] or ""
-                image_width = values_dict['image_width']
-                image_height = values_dict['image_height']
-                image_id = values_dict['image_id']
-
-                fo.write("[caption id=\"attachment_" +
+        except ValueError:
+            raise NoDateException()
+
+        parts.append('      <item>\n')
+        parts.append('        <title>' + title + '</title>\n')
+        parts.append('        <pubDate>' + post_date_string + '</pubDate>\n')
+        parts.append('        <wp:post_id>' + post_id + '</wp:post_id>\n')
+        parts.append('        <description></description> \n')
+        parts.append('        <content:encoded><![CDATA[')
+
+        for image_url in article_dict['images_dictionary']:
+            values_dict = article_dict['images_dictionary'][image_url]
+
+            # The hacky url ending is used because of a bug in the wordpress importer
+            # when media is imported from a url, any percent encoded characters
+            # are replaced with the encoding digits.  for example, any %20's in the
+            # url will become 20's in the media's url on the wordpress server
+            url_ending = self.utils.get_url_ending(image_url)
+            hacky_url_ending = url_ending
+            hacky_url_ending = hacky_url_ending.replace("%", "")
+
+            image_caption = values_dict['image_caption'] or ""
+            image_width = values_dict['image_width']
+            image_height = values_dict['image_height']
+            image_id = values_dict['image_id']
+
+            parts.append("[caption id=\"attachment_" +
                          image_id + "\" align=\"alignright\" width=\"" + image_width +
                          "\"]<a href=\"" + upload_url + image_upload_string +
                          image_url_date + hacky_url_ending + "\">"
@@ -424,113 +653,140 @@ class ArticleWriter(object):
                          "\" height=\"" + image_height + "\" /></a>" + image_caption +
                          "[/caption]\n")
 
-            fo.write(article_dict['article_body'] + '\n')
-            fo.write(article_dict['source_permalink'] + "\n]]></content:encoded>\n")
-
-            fo.write('        <excerpt:encoded><![CDATA[]]></excerpt:encoded>\n')
-            fo.write('        <dc:creator><![CDATA[' + author + ']]></dc:creator>\n')
-            fo.write('        <wp:post_date>' + date_string_no_tz + '</wp:post_date>\n')
-            fo.write('        <wp:post_date_gmt>' + date_string_no_tz + '</wp:post_date_gmt>\n')
-            fo.write('        <wp:comment_status>closed</wp:comment_status>\n')
-            fo.write('        <wp:ping_status>open</wp:ping_status>\n')
-            fo.write('        <wp:post_name>' + url_slug + '</wp:post_name>\n')
-            fo.write('        <wp:status>publish</wp:status>\n')
-            fo.write('        <wp:post_parent>0</wp:post_parent>\n')
-            fo.write('        <wp:menu_order>0</wp:menu_order>\n')
-            fo.write('        <wp:post_type>post</wp:post_type>\n')
-            fo.write('        <wp:post_password></wp:post_password>\n')
-            fo.write('        <wp:is_sticky>0</wp:is_sticky>\n\n')
-
-            for category_name in categories:
-                category_nicename = self.utils.get_nicename(category_name)
-                fo.write('        <category domain="category" nicename="' + category_nicename + '">'
+        parts.append(article_dict['article_body'] + '\n')
+        parts.append(article_dict['source_permalink'] + "\n]]></content:encoded>\n")
+
+        parts.append('        <excerpt:encoded><![CDATA[]]></excerpt:encoded>\n')
+        parts.append('        <dc:creator><![CDATA[' + author + ']]></dc:creator>\n')
+        parts.append('        <wp:post_date>' + date_string_no_tz + '</wp:post_date>\n')
+        parts.append('        <wp:post_date_gmt>' + date_string_no_tz + '</wp:post_date_gmt>\n')
+        parts.append('        <wp:comment_status>closed</wp:comment_status>\n')
+        parts.append('        <wp:ping_status>open</wp:ping_status>\n')
+        parts.append('        <wp:post_name>' + url_slug + '</wp:post_name>\n')
+        parts.append('        <wp:status>publish</wp:status>\n')
+        parts.append('        <wp:post_parent>0</wp:post_parent>\n')
+        parts.append('        <wp:menu_order>0</wp:menu_order>\n')
+        parts.append('        <wp:post_type>post</wp:post_type>\n')
+        parts.append('        <wp:post_password></wp:post_password>\n')
+        parts.append('        <wp:is_sticky>0</wp:is_sticky>\n\n')
+
+        for category_name in categories:
+            category_nicename = self.utils.get_nicename(category_name)
+            parts.append('        <category domain="category" nicename="' + category_nicename + '">'
                          '<![CDATA[' + category_name + ']]></category>\n')
 
-            fo.write('        <wp:postmeta>\n')
-            fo.write('            <wp:meta_key><![CDATA[_edit_last]]></wp:meta_key>\n')
-            fo.write('            <wp:meta_value><![CDATA[1]]></wp:meta_value>\n')
-            fo.write('        </wp:postmeta>\n')
-
-            if subhead is not None:
-                fo.write('        <wp:postmeta>\n')
-                fo.write('            <wp:meta_key><![CDATA[subhead]]></wp:meta_key>\n')
-                fo.write('            <wp:meta_value><![CDATA[' + subhead + ']]></wp:meta_value>\n')
-                fo.write('        </wp:postmeta>\n')
-
-            if article_author is not None:
-                fo.write('        <wp:postmeta>\n')
-                fo.write('            <wp:meta_key><![CDATA[article_author]]></wp:meta_key>\n')
-                fo.write('            <wp:meta_value><![CDATA[' + article_author + ']]></wp:meta_value>\n')
-                fo.write('        </wp:postmeta>\n')
-
-            if article_author_title is not None:
-                fo.write('        <wp:postmeta>\n')
-                fo.write('            <wp:meta_key><![CDATA[article_author_title]]></wp:meta_key>\n')
-                fo.write('            <wp:meta_value><![CDATA[' + article_author_title + ']]></wp:meta_value>\n')
-                fo.write('        </wp:postmeta>\n')
-
-            if article_author_telephone is not None:
-                fo.write('        <wp:postmeta>\n')
-                fo.write('            <wp:meta_key><![CDATA[article_author_telephone]]></wp:meta_key>\n')
-                fo.write('            <wp:meta_value><![CDATA[' + article_author_telephone + ']]></wp:meta_value>\n')
-                fo.write('        </wp:postmeta>\n')
-
-            if message_from is not None:
-                fo.write('        <wp:postmeta>\n')
-                fo.write('            <wp:meta_key><![CDATA[message_from]]></wp:meta_key>\n')
-                fo.write('            <wp:meta_value><![CDATA[' + message_from + ']]></wp:meta_value>\n')
-                fo.write('        </wp:postmeta>\n')
-
-            if message_to is not None:
-                fo.write('        <wp:postmeta>\n')
-                fo.write('            <wp:meta_key><![CDATA[message_to]]></wp:meta_key>\n')
-                fo.write('            <wp:meta_value><![CDATA[' + message_to + ']]></wp:meta_value>\n')
-                fo.write('        </wp:postmeta>\n')
-
-            fo.write('      </item>\n\n\n')
-
-            for image_url in article_dict['images_dictionary']:
-                values_dict = article_dict['images_dictionary'][image_url]
-
-                image_caption = values_dict['image_caption'] or ""
-                image_id = values_dict['image_id']
-                url_ending = self.utils.get_url_ending(image_url)
-                hacky_url_ending = url_ending
-                hacky_url_ending = hacky_url_ending.replace("%", "")
-
-                fo.write('        <item>\n')
-                fo.write('          <title>' + image_id + '</title>\n')
-                fo.write('          <link>' + upload_url + image_url_date + article_url_ending +
+        parts.append('        <wp:postmeta>\n')
+        parts.append('            <wp:meta_key><![CDATA[_edit_last]]></wp:meta_key>\n')
+        parts.append('            <wp:meta_value><![CDATA[1]]></wp:meta_value>\n')
+        parts.append('        </wp:postmeta>\n')
+
+        if subhead is not None:
+            parts.append('        <wp:postmeta>\n')
+            parts.append('            <wp:meta_key><![CDATA[subhead]]></wp:meta_key>\n')
+            parts.append('            <wp:meta_value><![CDATA[' + subhead + ']]></wp:meta_value>\n')
+            parts.append('        </wp:postmeta>\n')
+
+        if article_author is not None:
+            parts.append('        <wp:postmeta>\n')
+            parts.append('            <wp:meta_key><![CDATA[article_author]]></wp:meta_key>\n')
+            parts.append('            <wp:meta_value><![CDATA[' + article_author + ']]></wp:meta_value>\n')
+            parts.append('        </wp:postmeta>\n')
+
+        if article_author_title is not None:
+            parts.append('        <wp:postmeta>\n')
+            parts.append('            <wp:meta_key><![CDATA[article_author_title]]></wp:meta_key>\n')
+            parts.append('            <wp:meta_value><![CDATA[' + article_author_title + ']]></wp:meta_value>\n')
+            parts.append('        </wp:postmeta>\n')
+
+        if article_author_telephone is not None:
+            parts.append('        <wp:postmeta>\n')
+            parts.append('            <wp:meta_key><![CDATA[article_author_telephone]]></wp:meta_key>\n')
+            parts.append('            <wp:meta_value><![CDATA[' + article_author_telephone + ']]></wp:meta_value>\n')
+            parts.append('        </wp:postmeta>\n')
+
+        if message_from is not None:
+            parts.append('        <wp:postmeta>\n')
+            parts.append('            <wp:meta_key><![CDATA[message_from]]></wp:meta_key>\n')
+            parts.append('            <wp:meta_value><![CDATA[' + message_from + ']]></wp:meta_value>\n')
+            parts.append('        </wp:postmeta>\n')
+
+        if message_to is not None:
+            parts.append('        <wp:postmeta>\n')
+            parts.append('            <wp:meta_key><![CDATA[message_to]]></wp:meta_key>\n')
+            parts.append('            <wp:meta_value><![CDATA[' + message_to + ']]></wp:meta_value>\n')
+            parts.append('        </wp:postmeta>\n')
+
+        parts.append('      </item>\n\n\n')
+
+        for image_url in article_dict['images_dictionary']:
+            values_dict = article_dict['images_dictionary'][image_url]
+
+            image_caption = values_dict['image_caption'] or ""
+            image_id = values_dict['image_id']
+            url_ending = self.utils.get_url_ending(image_url)
+            hacky_url_ending = url_ending
+            hacky_url_ending = hacky_url_ending.replace("%", "")
+
+            parts.append('        <item>\n')
+            parts.append('          <title>' + image_id + '</title>\n')
+            parts.append('          <link>' + upload_url + image_url_date + article_url_ending +
                          '/attachment/' + image_id + '/</link>\n')
-                fo.write('          <pubDate>' + post_date_string + '</pubDate>\n')
-                fo.write('          <dc:creator><![CDATA[' + author + ']]></dc:creator>\n')
-                fo.write('          <guid isPermaLink="false">' + image_url + '</guid>\n')
-                fo.write('          <description/>\n')
-                fo.write('          <content:encoded><![CDATA[]]></content:encoded>\n')
-                fo.write('          <excerpt:encoded><![CDATA[' + image_caption + ']]></excerpt:encoded>\n')
-                fo.write('          <wp:post_id>' + image_id + '</wp:post_id>\n')
-                fo.write('          <wp:post_date>' + date_string_no_tz + '</wp:post_date>\n')
-                fo.write('          <wp:post_date_gmt>' + date_string_no_tz + '</wp:post_date_gmt>\n')
-                fo.write('          <wp:comment_status>closed</wp:comment_status>\n')
-                fo.write('          <wp:ping_status>closed</wp:ping_status>\n')
-                fo.write('          <wp:post_name></wp:post_name>\n')
-                fo.write('          <wp:status>inherit</wp:status>\n')
-                fo.write('          <wp:post_parent>' + post_id + '</wp:post_parent>\n')
-                fo.write('          <wp:menu_order>0</wp:menu_order>\n')
-                fo.write('          <wp:post_type>attachment</wp:post_type>\n')
-                fo.write('          <wp:post_password/>\n')
-                fo.write('          <wp:is_sticky>0</wp:is_sticky>\n')
-                fo.write('          <wp:attachment_url>' + image_url + '</wp:attachment_url>\n')
-                fo.write('          <wp:postmeta>\n')
-                fo.write('              <wp:meta_key><![CDATA[_wp_attached_file]]></wp:meta_key>\n')
-                fo.write('              <wp:meta_value><![CDATA[' + image_url_date +
+            parts.append('          <pubDate>' + post_date_string + '</pubDate>\n')
+            parts.append('          <dc:creator><![CDATA[' + author + ']]></dc:creator>\n')
+            parts.append('          <guid isPermaLink="false">' + image_url + '</guid>\n')
+            parts.append('          <description/>\n')
+            parts.append('          <content:encoded><![CDATA[]]></content:encoded>\n')
+            parts.append('          <excerpt:encoded><![CDATA[' + image_caption + ']]></excerpt:encoded>\n')
+            parts.append('          <wp:post_id>' + image_id + '</wp:post_id>\n')
+            parts.append('          <wp:post_date>' + date_string_no_tz + '</wp:post_date>\n')
+            parts.append('          <wp:post_date_gmt>' + date_string_no_tz + '</wp:post_date_gmt>\n')
+            parts.append('          <wp:comment_status>closed</wp:comment_status>\n')
+            parts.append('          <wp:ping_status>closed</wp:ping_status>\n')
+            parts.append('          <wp:post_name></wp:post_name>\n')
+            parts.append('          <wp:status>inherit</wp:status>\n')
+            parts.append('          <wp:post_parent>' + post_id + '</wp:post_parent>\n')
+            parts.append('          <wp:menu_order>0</wp:menu_order>\n')
+            parts.append('          <wp:post_type>attachment</wp:post_type>\n')
+            parts.append('          <wp:post_password/>\n')
+            parts.append('          <wp:is_sticky>0</wp:is_sticky>\n')
+            parts.append('          <wp:attachment_url>' + image_url + '</wp:attachment_url>\n')
+            parts.append('          <wp:postmeta>\n')
+            parts.append('              <wp:meta_key><![CDATA[_wp_attached_file]]></wp:meta_key>\n')
+            parts.append('              <wp:meta_value><![CDATA[' + image_url_date +
                          hacky_url_ending + ']]></wp:meta_value>\n')
-                fo.write('          </wp:postmeta>\n')
-                fo.write('        </item>\n\n\n')
+            parts.append('          </wp:postmeta>\n')
+            parts.append('        </item>\n\n\n')
 
-        fo.write('\n  </channel>\n')
-        fo.write('</rss>\n\n')
-        fo.close()
+        return ''.join(parts)
+
+    def write_wordpress_import_file(self, articles, markdown=False):
+        """
+        Takes a list of dictionaries with information about an article and
+        creates wordpress import files in output_dir, starting a new file whenever the current one
+        would pass split_bytes or hold more than split_items articles
+        :param articles: an articles dictionary, or an iterable of article_url, article_dict tuples
+        such as the generator returned by ArticleScraper.iter_scraped_articles
+        :param markdown:
+        :return: the paths of the import files that were written
+        """
+        if isinstance(articles, dict):
+            articles = articles.iteritems()
+
+        sink = RotatingWXRSink(self.output_dir, max_bytes=self.split_bytes, max_items=self.split_items)
+
+        # the sink is closed even if scraping or rendering an article fails, so the writer threads are
+        # stopped and the articles written so far end up in complete import files
+        try:
+            for article_url, article_dict in articles:
+
+                if markdown:
+                    self.write_markdown(article_url, article_dict)
+
+                sink.write_item(self.render_wordpress_item(article_url, article_dict))
+        finally:
+            file_paths = sink.close()
+
+        return file_paths
 
 
 class ArticleScraper(object):
@@ -539,17 +795,59 @@ class ArticleScraper(object):
     by jekyll to create a wordpress import file.  Also creates a file of statistics on the scrapeability
     the articles
     """
-    def __init__(self, start_index=0):
+    def __init__(self, start_index=0, workers=1, per_host_limit=2, parse_workers=1, fetcher=None,
+                 image_index=None, parser_backend='bs4'):
         """
         Initializes the index counter for parsed objects to start_index or 0 if none is given
+        :param start_index: the starting index for post and image IDs
+        :param workers: the number of article pages to fetch at the same time
+        :param per_host_limit: the maximum number of simultaneous requests made to any one host
+        :param parse_workers: the number of processes to parse fetched articles in
+        :param fetcher: the PageFetcher to download articles and images with. A PageFetcher without
+        a cache is used if none is given
+        :param image_index: the ImageDimensionIndex to look up image sizes in before downloading them.
+        An in-memory index is used if none is given
+        :param parser_backend: 'bs4' to parse article pages with BeautifulSoup, or 'lxml' to read them
+        with lxml directly, which is faster and gives the same article dictionaries. Pages lxml can't read the
+        same way are parsed with BeautifulSoup
+        :raises: ValueError: if parser_backend isn't 'bs4' or 'lxml'
         :return:
         """
+        if parser_backend not in PARSER_BACKENDS:
+            raise ValueError("Unknown parser backend: " + str(parser_backend))
+
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.per_host_limit = per_host_limit
+        self.host_semaphores = dict()
+        self.host_semaphores_lock = threading.Lock()
+        self.fetcher = fetcher or PageFetcher()
+        self.image_index = image_index or ImageDimensionIndex()
+
+        # In incremental mode, a shelf of the articles scraped by earlier runs, keyed by utf-8 url
+        self.article_shelf = None
+        self.previous_urls = set()
+        self.fetch_counts = {'new': 0, 'refetched': 0, 'reused': 0, 'resumed': 0}
+
+        # The ScrapeCheckpoint to journal scraped articles in, so an interrupted run can be resumed
+        self.checkpoint = None
+
+        # The ArticleStore to save every scraped article in
+        self.article_store = None
+
+        self.parser_backend = parser_backend
+        if parser_backend == 'lxml':
+            self.lxml_parser = LxmlArticleParser(ARTICLE_SELECTORS, ARTICLE_LIST_KEYS)
+        else:
+            self.lxml_parser = None
+
         self.gremlin_zapper = GremlinZapper()
-        self.utils = ArticleUtils()
+        self.utils = ArticleUtils(fetcher=self.fetcher)
         self.object_index = start_index
         self.date_regex = re.compile(r"[A-Za-z]+\s*\d{1,2}\,\s*\d{4}")
         self.word_regex = re.compile(r"([^\s\n\r\t]+)")
         self.author_regex = re.compile(r"By\s*(.+)")
+        self.non_ascii_regex = re.compile(u"[^\x00-\x7f]")
 
         self.author_whitelist = {
             'tim stephens':                 'Tim Stephens',
@@ -575,23 +873,71 @@ class ArticleScraper(object):
     def zap_tag_contents(self, tag):
         """
         Converts any Windows cp1252 or unicode characters in the text of
-        a BeautifulSoup bs4.element.Tag Object to ASCII equivalents
+        a BeautifulSoup bs4.element.Tag Object, or an LxmlTag, to ASCII equivalents.  The tree is
+        walked with a stack rather than recursively, so deeply nested pages can't exhaust the
+        recursion limit, and plain strings that are already ASCII are left as they are.  Other strings,
+        such as comments, are always replaced, which turns them into plain strings
         :rtype: bs4.element.Tag
         :param tag: the Tag object to convert
         :return: None
         """
-        if hasattr(tag, 'contents'):
-            content_length = len(tag.contents)
+        if isinstance(tag, LxmlTag):
+            tag.zap_contents(self.gremlin_zapper)
+            return
+
+        if not hasattr(tag, 'contents'):
+            return
+
+        stack = [tag]
+
+        while stack:
+            current = stack.pop()
+
+            for child in list(current.contents):
+                if isinstance(child, bs4.element.Tag):
+                    stack.append(child)
+                elif isinstance(child, bs4.element.NavigableString):
+                    if type(child) is bs4.element.NavigableString and not self.non_ascii_regex.search(child):
+                        continue
+                    child.replace_with(self.gremlin_zapper.zap_string(child))
 
-            gzapper = GremlinZapper()
+    def get_host_semaphore(self, page_url):
+        """
+        Returns the semaphore that limits the number of simultaneous requests to the host of page_url
+        :param page_url: the url of the page about to be fetched
+        :return: a threading.BoundedSemaphore shared by all urls on the same host
+        """
+        host = urlparse(page_url).netloc
+        with self.host_semaphores_lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self.host_semaphores[host]
+
+    def get_page_response(self, page_url):
+        """
+        Fetches a web page and returns the response
+        :param page_url: the url of the page to be fetched
+        :raises: r.raise_for_status: if the url doesn't return an HTTP 200 response
+        :raises: ContentNotHTMLException: if the url doesn't return html
+        :return: the fetcher.PageResponse for the page
+        """
+        with self.get_host_semaphore(page_url):
+            r = self.fetcher.get(page_url)
+        if r.status_code != requests.codes.ok:
+            r.raise_for_status()
+        if r.headers['content-type'] != 'text/html; charset=UTF-8':
+            raise ContentNotHTMLException()
+        return r
 
-            for x in range(0, content_length):
-                if isinstance(tag.contents[x], bs4.element.NavigableString):
-                    unicode_entry = gzapper.kill_gremlins(tag.contents[x])
-                    unicode_entry = unidecode(unicode_entry)
-                    tag.contents[x].replace_with(unicode_entry)
-                elif isinstance(tag.contents[x], bs4.element.Tag):
-                    self.zap_tag_contents(tag.contents[x])
+    def get_page_html(self, page_url):
+        """
+        Fetches a web page and returns its raw html
+        :param page_url: the url of the page to be fetched
+        :raises: r.raise_for_status: if the url doesn't return an HTTP 200 response
+        :raises: ContentNotHTMLException: if the url doesn't return html
+        :return: the page html as a byte string
+        """
+        return self.get_page_response(page_url).content
 
     def get_soup_from_url(self, page_url):
         """
@@ -601,34 +947,213 @@ class ArticleScraper(object):
         :raises: r.raise_for_status: if the url doesn't return an HTTP 200 response
         :return: A Soup object representing the page html
         """
-        r = requests.get(page_url)
-        if r.status_code != requests.codes.ok:
-            r.raise_for_status()
-        if r.headers['content-type'] != 'text/html; charset=UTF-8':
-            raise ContentNotHTMLException()
-        return BeautifulSoup(r.content, 'lxml')
+        return BeautifulSoup(self.get_page_html(page_url), 'lxml')
 
-    def get_author_info(self, body):
+    def get_shelf_key(self, article_url):
+        """
+        Returns the key of an article in the article shelf
+        :param article_url: the url of the article
+        :return: the url as a utf-8 byte string
+        """
+        if isinstance(article_url, unicode):
+            return article_url.encode('utf-8')
+        return article_url
+
+    def fetch_article(self, article_url):
+        """
+        Fetches the html of an article without raising, so that it can be run on a worker thread.
+        The article's status is 'reused' if it was scraped by an earlier incremental run and the server
+        says it hasn't changed since, 'refetched' if it was scraped before but has changed, and 'new'
+        otherwise
+        :param article_url: the url of the article to fetch
+        :return: article_url, page_html, error, status: error is None unless the fetch failed, in which
+        case page_html is None and error is the description of the exception
+        """
+        try:
+            r = self.get_page_response(article_url)
+        except Exception as e:
+            return article_url, None, describe_error(e), 'new'
+
+        if self.get_shelf_key(article_url) not in self.previous_urls:
+            status = 'new'
+        elif r.not_modified:
+            status = 'reused'
+        else:
+            status = 'refetched'
+        return article_url, r.content, None, status
+
+    def fetch_articles(self, article_list):
+        """
+        Generator that fetches the articles in article_list on a pool of worker threads and yields
+        them in the same order as article_list.  At most workers requests are in flight at once, one per
+        thread, and at most twice as many pages as there are workers are queued or held fetched ahead of
+        the one being consumed, so the fetched html never piles up in memory
+        :param article_list: the list of article urls to fetch
+        :return: yields article_url, page_html, error, status tuples as returned by fetch_article
+        """
+        if self.workers <= 1:
+            for article_url in article_list:
+                yield self.fetch_article(article_url)
+            return
+
+        pool = ThreadPool(self.workers)
+        try:
+            for fetched in ordered_map(pool, self.fetch_article, article_list, self.workers * 2):
+                yield fetched
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def parse_article(self, article_url, page_html):
+        """
+        Parses a fetched article without raising, so that it can be run in a worker process.  The
+        post and image IDs in the returned dictionary are numbered from 1 rather than from the
+        scraper's object_index; assign_ids shifts them once the article's place in the run is known
+        :param article_url: the url the html was fetched from
+        :param page_html: the raw html of the article page
+        :return: article_url, article_dict, num_ids, error: error is None unless parsing failed, in
+        which case article_dict is None. num_ids is the number of IDs the article used
+        """
+        start_index = self.object_index
+        self.object_index = 0
+        try:
+            article_dict = self.scrape_article_html(article_url, page_html)
+            return article_url, article_dict, self.object_index, None
+        except Exception as e:
+            return article_url, None, 0, describe_error(e)
+        finally:
+            self.object_index = start_index
+
+    def parse_fetched_article(self, fetched):
+        """
+        Parses an article_url, page_html, error, status tuple from fetch_articles with parse_article.
+        Articles that are being reused from an earlier run aren't parsed
+        :param fetched: the tuple returned by fetch_article
+        :return: the tuple returned by parse_article, with the fetch status added to the end
+        """
+        article_url, page_html, error, status = fetched
+        if error is not None:
+            return article_url, None, 0, error, status
+        if status == 'reused':
+            return article_url, None, 0, None, status
+        return self.parse_article(article_url, page_html) + (status,)
+
+    def parse_articles(self, fetched_articles):
+        """
+        Generator that parses the pages yielded by fetch_articles and yields the results of
+        parse_article in the same order.  If the scraper has more than one parse worker, the parsing
+        is done in a pool of processes
+        :param fetched_articles: an iterable of article_url, page_html, error, status tuples
+        :return: yields article_url, article_dict, num_ids, error, status tuples
+        """
+        if self.parse_workers <= 1:
+            for fetched in fetched_articles:
+                yield self.parse_fetched_article(fetched)
+            return
+
+        pool = Pool(self.parse_workers, initializer=init_parse_worker,
+                    initargs=(self.fetcher, self.image_index, self.parser_backend))
+        try:
+            for parsed in ordered_map(pool, parse_article_worker, fetched_articles, self.parse_workers * 2):
+                yield parsed
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def assign_ids(self, article_dict, num_ids):
+        """
+        Moves the IDs of an article returned by parse_article after the scraper's current object_index,
+        and advances object_index past them.  IDs are handed out in the order articles are assigned,
+        so they are the same however many workers parsed the articles
+        :param article_dict: the article dictionary returned by parse_article
+        :param num_ids: the number of IDs the article used
+        :return:
+        """
+        offset = self.object_index
+        article_dict['post_id'] = str(int(article_dict['post_id']) + offset)
+        for values_dict in article_dict['images_dictionary'].itervalues():
+            values_dict['image_id'] = str(int(values_dict['image_id']) + offset)
+        self.object_index += num_ids
+
+    def get_image_dimens(self, image_url):
+        """
+        Gets the width and height of an image, from the image index if it has been seen before
+        :param image_url: the url of the image
+        :return: width, height
+        """
+        image_info = self.image_index.get(image_url)
+        if image_info is None:
+            image_info = self.utils.get_image_info(image_url)
+            self.image_index.put(image_url, *image_info)
+        return image_info[0], image_info[1]
+
+    def collect_article_tags(self, soup):
+        """
+        Walks the tree of an article page once and picks out every tag the scraper reads, instead of
+        searching the tree separately for each one.  Tags that are only read once are stored under their
+        key in ARTICLE_SELECTORS, and only the first one in the page is kept; tags that are read as a
+        list (figures, images, iframes and links) are all kept, in document order.  Every tag except the
+        category meta tags must be inside div#main
+        :param soup: the BeautifulSoup object of the whole article page
+        :return: a dictionary of tags and lists of tags, keyed as in ARTICLE_SELECTORS, plus 'main' and
+        'categories'.  'main' is None if the page has no div#main
+        """
+        article_tags = {'main': None, 'categories': []}
+        for key in ARTICLE_LIST_KEYS:
+            article_tags[key] = []
+
+        stack = [(soup, False)]
+
+        while stack:
+            tag, in_main = stack.pop()
+
+            if tag.get('name') == 'category':
+                article_tags['categories'].append(tag)
+
+            if not in_main and article_tags['main'] is None and tag.name == 'div' and tag.get('id') == 'main':
+                article_tags['main'] = tag
+                in_main = True
+            elif in_main and tag.name in ARTICLE_SELECTORS:
+                for attribute, value, key in ARTICLE_SELECTORS[tag.name]:
+                    if attribute is None:
+                        matches = True
+                    elif attribute == 'class':
+                        matches = value in (tag.get('class') or ())
+                    else:
+                        matches = tag.get(attribute) == value
+
+                    if matches:
+                        if key in ARTICLE_LIST_KEYS:
+                            article_tags[key].append(tag)
+                        elif key not in article_tags:
+                            article_tags[key] = tag
+
+            children = [child for child in tag.contents if isinstance(child, bs4.element.Tag)]
+            stack.extend((child, in_main) for child in reversed(children))
+
+        return article_tags
+
+    def get_author_info(self, article_tags):
         """
         finds and returns the author info from a news.ucsc.edu article, or None
-        :param body: the BeautifulSoup object representing the news.ucsc.edu article body
+        :param article_tags: the tags of the article returned by collect_article_tags
         :return: author, author_role, author_telephone: of the news.ucsc.edu article
         """
-        author_tag = body.find("span", {"class": "name"})
+        author_tag = article_tags.get('author')
         if author_tag is not None:
             self.zap_tag_contents(author_tag)
             author = author_tag.get_text()
         else:
             author = 'Public Information Office'
 
-        author_telephone_tag = body.find("span", {"class": "tel"})
+        author_telephone_tag = article_tags.get('author_telephone')
         if author_telephone_tag is not None:
             self.zap_tag_contents(author_telephone_tag)
             author_telephone = author_telephone_tag.get_text()
         else:
             author_telephone = None
 
-        author_role_tag = body.find("span", {"class": "role"})
+        author_role_tag = article_tags.get('author_role')
         if author_role_tag is not None:
             self.zap_tag_contents(author_role_tag)
             author_role = author_role_tag.get_text()
@@ -650,19 +1175,19 @@ class ArticleScraper(object):
         else:
             return 'Public Information Office', author
 
-    def get_campus_message_info(self, body):
+    def get_campus_message_info(self, article_tags):
         """
         Gets the sender and audience for a campus message
-        :param body:
+        :param article_tags: the tags of the article returned by collect_article_tags
         :return:
         """
-        raw_message_from = body.find("span", {"class": "message-from"})
+        raw_message_from = article_tags.get('message_from')
         if raw_message_from is not None:
             message_from = self.gremlin_zapper.zap_string(raw_message_from.get_text())
         else:
             message_from = None
 
-        raw_message_to = body.find("span", {"class": "message-to"})
+        raw_message_to = article_tags.get('message_to')
         if raw_message_to is not None:
             message_to = self.gremlin_zapper.zap_string(raw_message_to.get_text())
         else:
@@ -670,14 +1195,14 @@ class ArticleScraper(object):
 
         return message_from, message_to
 
-    def get_date(self, body):
+    def get_date(self, article_tags):
         """
         returns date of news.ucsc.edu article or raises exception
-        :param body:
+        :param article_tags: the tags of the article returned by collect_article_tags
         :raises
         :return:
         """
-        date_tag = body.find("p", {"class": "date"})
+        date_tag = article_tags.get('date')
         if date_tag is not None:
             date_string = date_tag.get_text()
             matches = self.date_regex.findall(date_string)
@@ -693,20 +1218,20 @@ class ArticleScraper(object):
         else:
             raise NoDateException()
 
-    def get_headers(self, body):
+    def get_headers(self, article_tags):
         """
         returns title and subhead of news.ucsc.edu article
-        :param body:
+        :param article_tags: the tags of the article returned by collect_article_tags
         :return:
         """
-        title_tag = body.find("h1", {"id": "title"})
+        title_tag = article_tags.get('title')
         if title_tag is not None:
             raw_title = title_tag.get_text()
             title = self.gremlin_zapper.zap_string(raw_title)
         else:
             title = None
 
-        subhead_tag = body.find("p", {"class": "subhead"})
+        subhead_tag = article_tags.get('subhead')
         if subhead_tag is not None:
             raw_subhead = subhead_tag.get_text()
             subhead = self.gremlin_zapper.zap_string(raw_subhead)
@@ -715,17 +1240,17 @@ class ArticleScraper(object):
 
         return title, subhead
 
-    def get_images(self, article_url, body):
+    def get_images(self, article_url, article_tags):
         """
         Creates a dictionary of dictionaries of information about images in the article
         :param article_url
-        :param body:
+        :param article_tags: the tags of the article returned by collect_article_tags
         :return:
         """
 
         images_dictionary = dict()
 
-        figures = body.findAll("figure", {"class": "article-image"})
+        figures = article_tags['figures']
 
         for figure in figures:
 
@@ -748,7 +1273,7 @@ class ArticleScraper(object):
                 else:
                     image_caption = ''
 
-                image_width, image_height = self.utils.get_image_dimens(image_src)
+                image_width, image_height = self.get_image_dimens(image_src)
                 if 'height' in image_tag:
                     image_height = image_tag['height']
                 if 'width' in image_tag:
@@ -761,21 +1286,21 @@ class ArticleScraper(object):
                     'image_id': image_id
                 }
 
-        images = body.findAll("img")
+        images = article_tags['images']
         if images is not None:
             for image in images:
                 image_relative_src = image['src']
                 image_src = urljoin(article_url, image_relative_src)
                 image['src'] = image_src
 
-        iframes = body.findAll("iframe")
+        iframes = article_tags['iframes']
         if iframes is not None:
             for iframe in iframes:
                 iframe_relative_src = iframe['src']
                 iframe_src = urljoin(article_url, iframe_relative_src)
                 iframe['src'] = iframe_src
 
-        links = body.findAll("a")
+        links = article_tags['links']
         if links is not None:
             for link in links:
                 link_relative_src = link['href']
@@ -784,13 +1309,13 @@ class ArticleScraper(object):
 
         return images_dictionary
 
-    def get_article_text(self, body):
+    def get_article_text(self, article_tags):
         """
         Gets the article main text
-        :param body:
+        :param article_tags: the tags of the article returned by collect_article_tags
         :return:
         """
-        raw_article_body = body.find("div", {"class": "article-body"})
+        raw_article_body = article_tags.get('article_body')
 
         article_body_no_html = raw_article_body
 
@@ -810,13 +1335,13 @@ class ArticleScraper(object):
 
         return article_body, article_body_no_html
 
-    def get_categories(self, page_html):
+    def get_categories(self, article_tags):
         """
         Gets the categories of the given news.ucsc.edu article page
-        :param page_html:
+        :param article_tags: the tags of the article returned by collect_article_tags
         :return:
         """
-        category_tags = page_html.findAll(attrs={"name": "category"})
+        category_tags = article_tags['categories']
 
         categories = []
 
@@ -832,25 +1357,49 @@ class ArticleScraper(object):
         :param article_url:
         :return:
         """
-        soup = self.get_soup_from_url(article_url)
+        return self.scrape_article_html(article_url, self.get_page_html(article_url))
 
-        categories = self.get_categories(soup)
+    def parse_article_tags(self, page_html):
+        """
+        Parses an article page with the scraper's parser backend and finds the tags the scraper reads.
+        Pages the lxml backend can't read the same way BeautifulSoup does are parsed with BeautifulSoup
+        :param page_html: the raw html of the article page
+        :return: the tags of the article, as returned by collect_article_tags
+        """
+        if self.parser_backend == 'lxml':
+            try:
+                return self.lxml_parser.collect_article_tags(page_html)
+            except UnsupportedPageException:
+                pass
+        return self.collect_article_tags(BeautifulSoup(page_html, 'lxml'))
+
+    def scrape_article_html(self, article_url, page_html):
+        """
+        Parses the already fetched html of a news.ucsc.edu article and returns the article dictionary
+        :param article_url: the url the html was fetched from
+        :param page_html: the raw html of the article page
+        :return: the article dictionary
+        """
+        article_tags = self.parse_article_tags(page_html)
+
+        if article_tags['main'] is None:
+            raise BodyIsNoneException()
 
-        body = soup.find("div", {"id": "main"})
+        categories = self.get_categories(article_tags)
 
-        author, article_author_title, article_author_telephone = self.get_author_info(body)
+        author, article_author_title, article_author_telephone = self.get_author_info(article_tags)
 
         author, article_author,  = self.categorize_author(author)
 
-        date = self.get_date(body)
+        date = self.get_date(article_tags)
 
-        title, subhead = self.get_headers(body)
+        title, subhead = self.get_headers(article_tags)
 
         # images_dictionary = dict()
 
-        images_dictionary = self.get_images(article_url, body)
+        images_dictionary = self.get_images(article_url, article_tags)
 
-        message_from, message_to = self.get_campus_message_info(body)
+        message_from, message_to = self.get_campus_message_info(article_tags)
 
         slug = self.utils.get_url_slug(article_url)
 
@@ -858,7 +1407,7 @@ class ArticleScraper(object):
 
         file_name = date + '-' + slug + ".md"
 
-        article_body, article_body_no_html = self.get_article_text(body)
+        article_body, article_body_no_html = self.get_article_text(article_tags)
 
         return {
             'file_name': file_name,
@@ -879,54 +1428,232 @@ class ArticleScraper(object):
             'post_id': str(self.get_next_index())
         }
 
-    def scrape_articles(self, article_list, screen=None):
+    def iter_scraped_articles(self, article_list, screen=None, unscrapeable_article_dict=None):
         """
-        Scrapes the urls in article_list and writes the resulting articles
+        Generator that scrapes the urls in article_list and yields each article as soon as it is ready,
+        so that the articles can be written out without ever holding all of them in memory.  Pages are
+        fetched by fetch_articles and parsed by parse_articles, and IDs are assigned here in the order
+        of article_list so that post and image IDs don't depend on the number of workers.
+
+        If the scraper has a checkpoint, each article is journaled in it as soon as its IDs are
+        assigned, and the articles already in the journal are replayed rather than scraped again
         :param article_list: The list of article URLs to scrape
-        :param screen: the CommandLineDisplay object to update the progress of the scraper with
-        :return:
+        :param screen: the ProgressSink to report the progress of the scraper to
+        :param unscrapeable_article_dict: a dictionary to record the articles that couldn't be scraped
+        in, with the description of the error as the value
+        :return: yields article_url, article_dict tuples in the order of article_list
         """
         num_urls = len(article_list)
         current_url_num = 1
         prog_percent = 0
 
-        unscrapeable_article_dict = dict()
+        if unscrapeable_article_dict is None:
+            unscrapeable_article_dict = dict()
 
-        articles_dictionary = dict()
+        if self.article_shelf is not None:
+            self.previous_urls = set(key for key in self.article_shelf.keys() if key != OBJECT_INDEX_KEY)
+            self.object_index = max(self.object_index, self.article_shelf.get(OBJECT_INDEX_KEY, 0))
+
+        num_completed = 0
+
+        if self.checkpoint is not None:
+            for article, article_info, error, object_index in self.checkpoint.iter_articles():
+                if screen is not None:
+                    screen.report_progress('Scraping Articles', 'Resuming Article', article, prog_percent)
+                    prog_percent = int(((current_url_num + 0.0) / num_urls) * 100)
+                    current_url_num += 1
+
+                num_completed += 1
+                self.object_index = object_index
+                if screen is not None:
+                    screen.report_article(article, error)
 
-        for article in article_list:
+                if error is not None:
+                    unscrapeable_article_dict[article] = error
+                    continue
+
+                self.fetch_counts['resumed'] += 1
+                yield article, article_info
+
+        parsed_articles = self.parse_articles(self.fetch_articles(article_list[num_completed:]))
+
+        for position, (article, article_info, num_ids, error, status) in enumerate(parsed_articles, num_completed):
             if screen is not None:
                 screen.report_progress('Scraping Articles', 'Scraping Article', article, prog_percent)
+                if self.fetcher.throttle is not None:
+                    screen.report_rate(*self.fetcher.throttle.get_stats())
                 prog_percent = int(((current_url_num + 0.0) / num_urls) * 100)
                 current_url_num += 1
+                screen.report_article(article, error)
 
-            try:
-                article_info = self.scrape_article(article)
+            if error is not None:
+                unscrapeable_article_dict[article] = error
+                if self.checkpoint is not None:
+                    self.checkpoint.add_article(position, article, None, error, self.object_index)
+                continue
 
-                articles_dictionary[article] = article_info
+            self.fetch_counts[status] += 1
 
-            except Exception as e:
-                unscrapeable_article_dict[article] = str(e)
-                # screen.end_session()
-                # print e
-                # exit()
+            if status == 'reused':
+                # reused articles keep the IDs they were given when they were first scraped
+                article_info = self.article_shelf[self.get_shelf_key(article)]
+            else:
+                self.assign_ids(article_info, num_ids)
+                if self.article_shelf is not None:
+                    self.article_shelf[self.get_shelf_key(article)] = article_info
+
+            if self.checkpoint is not None:
+                self.checkpoint.add_article(position, article, article_info, None, self.object_index)
+
+            if self.article_store is not None:
+                self.article_store.put_article(article, article_info, self.utils.get_url_slug(article))
+
+            yield article, article_info
+
+        if self.article_shelf is not None:
+            self.article_shelf[OBJECT_INDEX_KEY] = self.object_index
+            self.article_shelf.sync()
+
+    def scrape_articles(self, article_list, screen=None):
+        """
+        Scrapes the urls in article_list and returns the resulting articles
+        :param article_list: The list of article URLs to scrape
+        :param screen: the ProgressSink to report the progress of the scraper to
+        :return: articles_dictionary, unscrapeable_article_dict
+        """
+        unscrapeable_article_dict = dict()
+
+        articles_dictionary = dict()
+
+        for article, article_info in self.iter_scraped_articles(article_list, screen, unscrapeable_article_dict):
+            articles_dictionary[article] = article_info
 
         return articles_dictionary, unscrapeable_article_dict
 
 
+# The article shelf key under which the next unused object_index is kept between incremental runs
+OBJECT_INDEX_KEY = '__object_index__'
+
+parse_worker_scraper = None
+
+
+def init_parse_worker(fetcher, image_index, parser_backend):
+    """
+    Initializer for the processes in ArticleScraper.parse_articles' pool; gives each process its
+    own ArticleScraper to parse with
+    :param fetcher: the PageFetcher the parent scraper uses, so images are fetched through the same cache
+    :param image_index: the ImageDimensionIndex the parent scraper uses
+    :param parser_backend: the parser backend the parent scraper uses
+    :return:
+    """
+    global parse_worker_scraper
+    parse_worker_scraper = ArticleScraper(fetcher=fetcher, image_index=image_index, parser_backend=parser_backend)
+
+
+def parse_article_worker(fetched):
+    """
+    Parses a fetched article in a worker process of ArticleScraper.parse_articles' pool
+    :param fetched: the article_url, page_html, error tuple returned by ArticleScraper.fetch_article
+    :return: the tuple returned by ArticleScraper.parse_article
+    """
+    return parse_worker_scraper.parse_fetched_article(fetched)
+
+
 class NewsSiteScraper(object):
     """
     Class that iterates through all the news archives of news.ucsc.edu and generates markdown files for them
     """
 
-    def __init__(self, start_index=0):
+    def __init__(self, start_index=0, workers=1, parse_workers=1, cache_dir=None, cache_size=1024,
+                 incremental=False, output_dir='.', split_bytes=5242880, split_items=None,
+                 checkpoint_path=None, store_path=None, parser_backend='bs4', manifest_path=None,
+                 feed_urls=None, rate=10.0, progress='curses', progress_file=None, revalidate_months=12):
         """
+        :param start_index: the starting index for post and image IDs
+        :param workers: the number of pages to fetch at the same time
+        :param parse_workers: the number of processes to parse articles in
+        :param cache_dir: the directory to cache downloaded pages and images in, or None for no cache
+        :param cache_size: the maximum size of the cache in megabytes
+        :param incremental: whether to revalidate cached pages and reuse the articles scraped by earlier
+        runs when they haven't changed.  Requires a cache_dir, which the scraped articles are kept in
+        :param output_dir: the directory to write the import files and markdown files to
+        :param split_bytes: the size in bytes at which to start a new import file, or None for no limit
+        :param split_items: the number of articles at which to start a new import file, or None for no limit
+        :param checkpoint_path: the path of a ScrapeCheckpoint database to journal the run in, so that it
+        can be resumed if it is interrupted, or None to not keep a journal
+        :param store_path: the path of an ArticleStore database to save every scraped article in, and to
+        export articles from with get_wordpress_import_from_store, or None for no store
+        :param parser_backend: the parser to read article pages with, 'bs4' or 'lxml'
+        :param manifest_path: the path of an ArchiveManifest database of the archive pages read by earlier
+        runs, so that only the articles added since then are scraped, or None to scrape every article
+        :param feed_urls: a list of sitemap and RSS or Atom feed urls to find articles in instead of the
+        monthly archive pages, or None to read the archive pages.  The manifest isn't used with feeds
+        :param rate: the most requests to send per second, or None for no rate limit.  The number of
+        requests in flight is also adjusted to the server's latency, up to the number of workers
+        :param progress: how to report progress: 'curses' for a progress bar, 'log' for a line of text
+        every few seconds, or 'json' for a JSON object of metrics every few seconds
+        :param progress_file: the file to write 'log' or 'json' progress to, or None for standard error
+        :param revalidate_months: with a manifest, how many months before the newest month in it to check
+        for changes.  Older months are taken to be unchanged.  None to check every month
         :return:
         """
-        self.screen = CommandLineDisplay()
-        self.article_collector = ArticleCollector()
-        self.article_scraper = ArticleScraper(start_index=start_index)
-        self.writer = ArticleWriter()
+        if incremental and cache_dir is None:
+            raise ValueError("Incremental scraping requires a cache directory")
+
+        if progress not in PROGRESS_SINKS:
+            raise ValueError("Unknown progress sink: {0}".format(progress))
+
+        if cache_dir is not None:
+            cache = ResponseCache(cache_dir, max_bytes=cache_size * 1024 * 1024)
+        else:
+            cache = None
+        throttle = RequestThrottle(rate=rate, burst=max(workers, 1),
+                                   controller=AIMDController(initial_limit=1, max_limit=max(workers, 2)))
+        self.fetcher = PageFetcher(cache=cache, revalidate=incremental, pool_size=max(workers, 2),
+                                   throttle=throttle)
+
+        if cache_dir is not None:
+            image_index = ImageDimensionIndex(os.path.join(cache_dir, 'images.sqlite'))
+        else:
+            image_index = ImageDimensionIndex()
+
+        if manifest_path is not None:
+            manifest = ArchiveManifest(manifest_path)
+        else:
+            manifest = None
+
+        if progress == 'curses':
+            self.screen = CommandLineDisplay(fetcher=self.fetcher)
+        else:
+            stream = open(progress_file, 'a') if progress_file is not None else None
+            if progress == 'log':
+                self.screen = LogProgressSink(stream=stream, fetcher=self.fetcher)
+            else:
+                self.screen = JsonLinesProgressSink(stream=stream, fetcher=self.fetcher)
+        if feed_urls:
+            discovery = FeedDiscovery(feed_urls, fetcher=self.fetcher)
+        else:
+            discovery = None
+
+        self.article_collector = ArticleCollector(workers=workers, fetcher=self.fetcher, manifest=manifest,
+                                                  discovery=discovery, revalidate_months=revalidate_months)
+        self.article_scraper = ArticleScraper(start_index=start_index, workers=workers,
+                                              parse_workers=parse_workers, fetcher=self.fetcher,
+                                              image_index=image_index, parser_backend=parser_backend)
+        self.writer = ArticleWriter(output_dir=output_dir, split_bytes=split_bytes, split_items=split_items)
+        self.start_index = start_index
+
+        if checkpoint_path is not None:
+            self.article_scraper.checkpoint = ScrapeCheckpoint(checkpoint_path)
+
+        if store_path is not None:
+            self.article_store = ArticleStore(store_path)
+        else:
+            self.article_store = None
+        self.article_scraper.article_store = self.article_store
+
+        if incremental:
+            self.article_scraper.article_shelf = shelve.open(os.path.join(cache_dir, 'articles.shelf'))
 
     def write_diagnostic_file(self, diagnostic_dictionary):
         """
@@ -943,6 +1670,57 @@ class NewsSiteScraper(object):
             fo.write(key + ':\n')
             fo.write(value + '\n\n')
 
+    def get_article_list(self, start_month, start_year, end_month, end_year):
+        """
+        Collects the list of article urls in the given time period.  If the run is being journaled, the
+        list is saved in the checkpoint, and a resumed run uses the saved list instead of collecting it
+        again
+        :param start_month:
+        :param start_year:
+        :param end_month:
+        :param end_year:
+        :return: the list of article urls
+        """
+        checkpoint = self.article_scraper.checkpoint
+
+        if checkpoint is not None:
+            run_key = json.dumps([start_month, start_year, end_month, end_year, self.start_index])
+            if checkpoint.start(run_key):
+                article_list = checkpoint.get_article_list()
+                if article_list is not None:
+                    return article_list
+
+        article_list = self.article_collector.get_articles(self.screen, start_month, start_year, end_month, end_year)
+
+        if checkpoint is not None:
+            checkpoint.save_article_list(article_list)
+            # the journaled list now holds the new articles, so the manifest can forget them
+            self.finish_manifest()
+
+        return article_list
+
+    def finish_manifest(self, unscrapeable_dict=None):
+        """
+        Commits the archive pages read by this run to the manifest, once the new articles they listed
+        have been written or journaled.  Articles that couldn't be scraped are left out of the manifest,
+        so the next run tries them again
+        :param unscrapeable_dict: the articles that couldn't be scraped, keyed by url, or None if they
+        haven't been scraped yet
+        :return:
+        """
+        if self.article_collector.manifest is not None:
+            if unscrapeable_dict:
+                self.article_collector.manifest.forget_articles(unscrapeable_dict.keys())
+            self.article_collector.manifest.commit()
+
+    def finish_checkpoint(self):
+        """
+        Clears the checkpoint journal once a run has finished, so the next run starts from scratch
+        :return:
+        """
+        if self.article_scraper.checkpoint is not None:
+            self.article_scraper.checkpoint.clear()
+
     def get_articles_dictionary(self, start_month=1, start_year=2002, end_month=None, end_year=None):
         """
         Returns an articles dictionary of all the articles in the given time period
@@ -954,17 +1732,24 @@ class NewsSiteScraper(object):
         """
         self.screen.start_session()
 
-        article_list = self.article_collector.get_articles(self.screen, start_month, start_year, end_month, end_year)
+        try:
+            article_list = self.get_article_list(start_month, start_year, end_month, end_year)
 
-        articles_dictionary, unscrapeable_dict = self.article_scraper.scrape_articles(article_list, screen=self.screen)
+            articles_dictionary, unscrapeable_dict = self.article_scraper.scrape_articles(article_list,
+                                                                                          screen=self.screen)
+        finally:
+            self.screen.end_session()
 
-        self.screen.end_session()
+        self.finish_manifest(unscrapeable_dict)
+        self.finish_checkpoint()
 
         return articles_dictionary
 
     def get_wordpress_import(self, markdown, start_month=1, start_year=2002, end_month=None, end_year=None):
         """
-        Runs the news.ucsc.edu article scraper with the given start and end dates
+        Runs the news.ucsc.edu article scraper with the given start and end dates.  Each article is
+        written to the import file (and markdown file) as soon as it has been scraped, so only one
+        article at a time is kept in memory
         :param start_month:
         :param start_year:
         :param end_month:
@@ -972,15 +1757,91 @@ class NewsSiteScraper(object):
         :param markdown
         :return:
         """
+        unscrapeable_dict = dict()
 
-        # article_list = self.article_collector.get_articles(self.screen, start_month, start_year, end_month, end_year)
+        self.screen.start_session()
 
-        articles_dictionary = self.get_articles_dictionary(start_month, start_year, end_month, end_year)
+        try:
+            article_list = self.get_article_list(start_month, start_year, end_month, end_year)
 
-        # print type(self.screen)
+            articles = self.article_scraper.iter_scraped_articles(article_list, screen=self.screen,
+                                                                  unscrapeable_article_dict=unscrapeable_dict)
 
-        print 'Writing Articles...'
+            self.writer.write_wordpress_import_file(articles, markdown)
+        finally:
+            self.screen.end_session()
 
-        self.writer.write_wordpress_import_file(articles_dictionary, markdown)
+        self.finish_manifest(unscrapeable_dict)
+        self.finish_checkpoint()
 
         print 'Done'
+
+        self.print_run_summary()
+
+    def get_date_range(self, start_month, start_year, end_month, end_year):
+        """
+        Converts a range of months to the first and last dates in the range
+        :param start_month:
+        :param start_year:
+        :param end_month: the last month, or None for no end
+        :param end_year: the year of the last month, or None for no end
+        :return: start_date, end_date as yyyy-mm-dd strings; end_date is None if there is no end
+        """
+        start_date = "{0:04d}-{1:02d}-01".format(start_year, start_month)
+
+        if end_year is None:
+            end_date = None
+        else:
+            # every date in the month sorts before day 31
+            end_date = "{0:04d}-{1:02d}-31".format(end_year, end_month or 12)
+
+        return start_date, end_date
+
+    def get_wordpress_import_from_store(self, markdown, start_month=1, start_year=2002, end_month=None,
+                                        end_year=None, category=None):
+        """
+        Writes a wordpress import of the articles in the article store from the given time period,
+        without scraping news.ucsc.edu
+        :param markdown: whether to also write markdown files
+        :param start_month:
+        :param start_year:
+        :param end_month:
+        :param end_year:
+        :param category: only export articles in this category, or None for all categories
+        :return:
+        """
+        if self.article_store is None:
+            raise ValueError("Exporting from the article store requires a store_path")
+
+        start_date, end_date = self.get_date_range(start_month, start_year, end_month, end_year)
+
+        articles = self.article_store.iter_articles(start_date, end_date, category)
+
+        self.writer.write_wordpress_import_file(articles, markdown)
+
+        print 'Done'
+
+    def print_run_summary(self):
+        """
+        Prints how many of the scraped articles were new, fetched again because they changed, reused
+        from an earlier run without being fetched again, or replayed from the checkpoint of an
+        interrupted run, how often image sizes were found in the
+        image index, and, with a feed discovery backend, which feeds couldn't be read
+        :return:
+        """
+        fetch_counts = self.article_scraper.fetch_counts
+        image_index = self.article_scraper.image_index
+        print 'Articles new: {0}, refetched: {1}, reused: {2}, resumed: {3}'.format(fetch_counts['new'],
+                                                                                   fetch_counts['refetched'],
+                                                                                   fetch_counts['reused'],
+                                                                                   fetch_counts['resumed'])
+        print 'Image index hits: {0}, misses: {1}'.format(image_index.hits.value, image_index.misses.value)
+
+        discovery = self.article_collector.discovery
+        if discovery is not None and (discovery.skipped_feeds or discovery.partial_feeds):
+            print 'Feeds skipped: {0}, partly read: {1}'.format(len(discovery.skipped_feeds),
+                                                                len(discovery.partial_feeds))
+            for feed_url, error in discovery.skipped_feeds:
+                print '    skipped ' + feed_url + ': ' + error
+            for feed_url, error in discovery.partial_feeds:
+                print '    partly read ' + feed_url + ': ' + error
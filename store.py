@@ -0,0 +1,99 @@
+import cPickle
+import sqlite3
+
+
+class ArticleStore(object):
+    """
+    A local SQLite store of scraped articles.  Every article dictionary is kept whole, and its date,
+    author, slug and categories are also kept in indexed columns, so that the articles for a date range,
+    category or author can be read back quickly without scraping news.ucsc.edu again
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: the path of the SQLite database file. Created if it doesn't exist
+        :return:
+        """
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS articles ('
+                                'url TEXT PRIMARY KEY, slug TEXT, date TEXT, author TEXT, article BLOB)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS article_categories ('
+                                'url TEXT, category TEXT, PRIMARY KEY (url, category))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS articles_date ON articles (date)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS articles_author ON articles (author)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS articles_slug ON articles (slug)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS article_categories_category '
+                                'ON article_categories (category)')
+        self.connection.commit()
+
+    def put_article(self, url, article_dict, slug):
+        """
+        Adds an article to the store, replacing any earlier version of it
+        :param url: the url of the article
+        :param article_dict: the article dictionary returned by ArticleScraper
+        :param slug: the url slug of the article
+        :return:
+        """
+        author = article_dict['article_author'] or article_dict['author']
+        article = sqlite3.Binary(cPickle.dumps(article_dict, cPickle.HIGHEST_PROTOCOL))
+
+        self.connection.execute('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)',
+                                (url, slug, article_dict['date'], author, article))
+        self.connection.execute('DELETE FROM article_categories WHERE url = ?', (url,))
+        self.connection.executemany('INSERT OR IGNORE INTO article_categories VALUES (?, ?)',
+                                    [(url, category) for category in article_dict['categories']])
+        self.connection.commit()
+
+    def get_article(self, url):
+        """
+        Returns an article from the store
+        :param url: the url of the article
+        :return: the article dictionary, or None if the article isn't in the store
+        """
+        row = self.connection.execute('SELECT article FROM articles WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        return cPickle.loads(str(row[0]))
+
+    def iter_articles(self, start_date=None, end_date=None, category=None, author=None):
+        """
+        Generator over the stored articles that match all of the given conditions, oldest first
+        :param start_date: the earliest article date to include, as yyyy-mm-dd, or None
+        :param end_date: the latest article date to include, as yyyy-mm-dd, or None
+        :param category: only include articles in this category, or None for all categories
+        :param author: only include articles by this author, or None for all authors
+        :return: yields article_url, article_dict tuples
+        """
+        query = 'SELECT articles.url, articles.article FROM articles'
+        conditions = []
+        parameters = []
+
+        if category is not None:
+            query += ' JOIN article_categories ON article_categories.url = articles.url'
+            conditions.append('article_categories.category = ?')
+            parameters.append(category)
+        if start_date is not None:
+            conditions.append('articles.date >= ?')
+            parameters.append(start_date)
+        if end_date is not None:
+            conditions.append('articles.date <= ?')
+            parameters.append(end_date)
+        if author is not None:
+            conditions.append('articles.author = ?')
+            parameters.append(author)
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY articles.date, articles.url'
+
+        for url, article in self.connection.execute(query, parameters):
+            yield url, cPickle.loads(str(article))
+
+    def count_articles(self):
+        """
+        Returns the number of articles in the store
+        :return:
+        """
+        return self.connection.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
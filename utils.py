@@ -1,10 +1,13 @@
 import re
 import curses
-import urllib
+import struct
 import cStringIO
 from unidecode import unidecode
 from PIL import Image
 
+from fetcher import PageFetcher
+from progress import ProgressSink
+
 
 class ImageException(Exception):
     def __init__(self, image_url):
@@ -15,7 +18,15 @@ class ArticleUtils:
     This class provides functions to manipulate and reformat information scraped from
     articles, like urls, category names, etc.
     """
-    def __init__(self):
+    def __init__(self, fetcher=None, image_probe_bytes=16384):
+        """
+        :param fetcher: the PageFetcher to download images with. A PageFetcher without a cache is used
+        if none is given
+        :param image_probe_bytes: the number of bytes at the start of an image to read its size from
+        :return:
+        """
+        self.fetcher = fetcher or PageFetcher()
+        self.image_probe_bytes = image_probe_bytes
         self.article_slug_regex = re.compile(r".*\/([^\/\.]+)(?:.[^\.\/]+$)*")
         self.article_ending_regex = re.compile(r".*\/([^\/]+)")
 
@@ -57,34 +68,119 @@ class ArticleUtils:
         else:
             raise Exception("unable to find ending for article: " + page_url + "\n")
 
-    def get_image_dimens(self, image_url):
+    def get_image_size_from_header(self, header):
+        """
+        Reads the width and height of a PNG, GIF or JPEG image from the first bytes of the image file
+        :param header: the start of the image file
+        :return: width, height, or None if the header isn't long enough or isn't a PNG, GIF or JPEG
         """
-        Uses the PIL Pillow fork to get the width and height of an image from a url
+        if header.startswith('\x89PNG\r\n\x1a\n'):
+            if len(header) < 24:
+                return None
+            return struct.unpack('>II', header[16:24])
+
+        if header.startswith('GIF87a') or header.startswith('GIF89a'):
+            if len(header) < 10:
+                return None
+            return struct.unpack('<HH', header[6:10])
+
+        if header.startswith('\xff\xd8'):
+            # walk the JPEG segments until a start of frame marker, which holds the dimensions
+            position = 2
+            while position + 9 <= len(header):
+                if header[position] != '\xff':
+                    return None
+                marker = ord(header[position + 1])
+                if marker == 0xff:
+                    # fill byte
+                    position += 1
+                    continue
+                if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                    height, width = struct.unpack('>HH', header[position + 5:position + 9])
+                    return width, height
+                if marker == 0xd8 or 0xd0 <= marker <= 0xd7:
+                    # markers without a length
+                    position += 2
+                    continue
+                segment_length = struct.unpack('>H', header[position + 2:position + 4])[0]
+                position += 2 + segment_length
+            return None
+
+        return None
+
+    def get_content_length(self, response):
+        """
+        Returns the size of the whole file a response is for, even if the response only holds part of it
+        :param response: a fetcher.PageResponse
+        :return: the size of the file in bytes, or None if the server didn't say
+        """
+        content_range = response.headers.get('content-range')
+        if content_range is not None and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        if response.status_code == 200 and 'content-length' in response.headers:
+            return int(response.headers['content-length'])
+        return None
+
+    def get_image_info(self, image_url):
+        """
+        Gets the width and height of an image from a url, along with the size of the image file and its
+        ETag.  Only the first image_probe_bytes of the image are downloaded if the size can be read from
+        them; otherwise the whole image is downloaded and opened with the PIL Pillow fork
         :param image_url: the url of the image to get the dimensions for
-        :return: height, width
+        :return: width, height, content_length, etag
         """
         try:
-            url_connection = urllib.urlopen(image_url)
-            image_file = cStringIO.StringIO(url_connection.read())
-            im = Image.open(image_file)
-            return im.size
+            response = self.fetcher.get_head(image_url, self.image_probe_bytes)
+            if response.status_code not in (200, 206):
+                raise ImageException(image_url)
+            image_size = self.get_image_size_from_header(response.content)
+
+            if image_size is None:
+                response = self.fetcher.get(image_url)
+                if response.status_code != 200:
+                    raise ImageException(image_url)
+                image_file = cStringIO.StringIO(response.content)
+                im = Image.open(image_file)
+                image_size = im.size
+
+            width, height = image_size
+            return width, height, self.get_content_length(response), response.headers.get('etag')
         except IOError as e:
             raise ImageException(image_url)
 
+    def get_image_dimens(self, image_url):
+        """
+        Gets the width and height of an image from a url
+        :param image_url: the url of the image to get the dimensions for
+        :return: width, height
+        """
+        width, height, content_length, etag = self.get_image_info(image_url)
+        return width, height
 
-class CommandLineDisplay(object):
+
+class CommandLineDisplay(ProgressSink):
     """
-    This class is used to display and update a progress bar on the command line
+    This class is used to display and update a progress bar on the command line.  The screen is
+    redrawn at most every interval seconds, so that fast cached runs don't spend their time in curses
     """
 
-    def __init__(self):
+    def __init__(self, fetcher=None, interval=0.1):
+        """
+        :param fetcher: the PageFetcher whose counts to show, or None
+        :param interval: the least time in seconds between redraws
+        :return:
+        """
+        ProgressSink.__init__(self, fetcher=fetcher, interval=interval)
         self.stdscr = None
+        self.redrawn = False
 
     def start_session(self):
         """
         Starts a Curses session
         :return:
         """
+        ProgressSink.start_session(self)
         self.stdscr = curses.initscr()
         curses.noecho()
         curses.cbreak()
@@ -94,6 +190,7 @@ class CommandLineDisplay(object):
         Ends any active curses session
         :return:
         """
+        ProgressSink.end_session(self)
         curses.echo()
         curses.nocbreak()
         curses.endwin()
@@ -115,11 +212,15 @@ class CommandLineDisplay(object):
         Updates progress bar and messages
         :param header:
         :param: description:
-        :param stdscr: the terminal screen object to write to
         :param url: the url currently being processed
         :param progress_percent: the percentage of articles that has been processed
         :return:
         """
+        self.redrawn = self.is_due(header, progress_percent)
+        ProgressSink.report_progress(self, header, description, url, progress_percent)
+        if not self.redrawn:
+            return
+
         self.stdscr.move(0, 0)
         self.stdscr.clrtoeol()
         self.stdscr.addstr(0, 0, "{0}".format(header))
@@ -130,17 +231,86 @@ class CommandLineDisplay(object):
         self.stdscr.addstr(2, 0, "{0}: {1}".format(description, url))
         self.stdscr.move(3, 0)
         self.stdscr.clrtoeol()
+        if self.fetcher is not None:
+            metrics = self.get_metrics()
+            self.stdscr.addstr(3, 0, "Articles: {0}, {1:.1f}/s, {2} failed, {3:.1f} MB fetched, {4} cache hits".
+                               format(metrics['articles'], metrics['articles_per_second'],
+                                      sum(self.failures.itervalues()), metrics['bytes_fetched'] / 1048576.0,
+                                      metrics['cache_hits']))
         self.stdscr.refresh()
 
+    def report_rate(self, concurrency_limit, in_flight, requests_per_second, average_latency):
+        """
+        Updates the request rate line below the progress messages, when the progress was just redrawn
+        :param concurrency_limit: the number of requests currently allowed in flight
+        :param in_flight: the number of requests in flight
+        :param requests_per_second: the recent throughput
+        :param average_latency: the average request latency in seconds, or None if there is none yet
+        :return:
+        """
+        ProgressSink.report_rate(self, concurrency_limit, in_flight, requests_per_second, average_latency)
+        if not self.redrawn:
+            return
+
+        if average_latency is None:
+            latency = "-"
+        else:
+            latency = "{0:.2f}s".format(average_latency)
+        self.stdscr.move(4, 0)
+        self.stdscr.clrtoeol()
+        self.stdscr.addstr(4, 0, "Requests: {0}/{1} in flight, {2:.1f}/s, latency {3}".format(
+            in_flight, concurrency_limit, requests_per_second, latency))
+        self.stdscr.refresh()
+
+    def report_feed_error(self, feed_url, error, partial):
+        """
+        Shows the number of feeds that couldn't be read, and the last one, below the request rate
+        :param feed_url: the url of the feed
+        :param error: the description of the error that stopped the feed from being read
+        :param partial: whether the entries before the error were read
+        :return:
+        """
+        ProgressSink.report_feed_error(self, feed_url, error, partial)
+        metrics = self.get_metrics()
+        self.stdscr.move(5, 0)
+        self.stdscr.clrtoeol()
+        self.stdscr.addstr(5, 0, "Feeds skipped: {0}, partly read: {1} (last: {2})".format(
+            metrics['feeds_skipped'], metrics['feeds_partial'], feed_url))
+        self.stdscr.refresh()
+
+class UnidecodeTable(dict):
+    """
+    A unicode.translate table that maps each code point to its unidecode ASCII equivalent.  unidecode
+    converts every character on its own, so translating a string with this table gives the same text as
+    unidecode does for the whole string.  Each code point is only looked up in unidecode's tables the
+    first time it is seen
+    """
+
+    def __missing__(self, codepoint):
+        replacement = unicode(unidecode(unichr(codepoint)))
+        self[codepoint] = replacement
+        return replacement
+
+
 class GremlinZapper(object):
     """
     Class to convert windows cp1252 characters to unicode characters or
     to convert cp1252 and unicode characters to their ascii equivalents
     """
 
+    # Characters that turn up in almost every article, looked up when the zapper is made: the cp1252
+    # gremlin range and the common unicode punctuation it stands for
+    COMMON_CODEPOINTS = range(0x80, 0xa0) + [0xa0, 0xad, 0x2013, 0x2014, 0x2018, 0x2019, 0x201c,
+                                               0x201d, 0x2022, 0x2026]
+
     def __init__(self):
 
         self.gremlin_regex_1252 = re.compile(r"[\x00-\xff]")
+        self.gremlin_search_regex = re.compile(u"[\x80-\x9f]")
+
+        self.ascii_table = UnidecodeTable()
+        for codepoint in self.COMMON_CODEPOINTS:
+            self.ascii_table[codepoint]
 
         self.cp1252 = {
             "0x00": "0x0000",   # NULL
@@ -403,24 +573,34 @@ class GremlinZapper(object):
         :return:
         """
 
-        if re.search(u"[\x80-\x9f]", text):
-            def fixup(m):
-                s = m.group(0)
-                return self.cp1252.get(s, s)
-
+        if self.gremlin_search_regex.search(text):
             if isinstance(text, type("")):
                 # make sure we have a unicode string
                 text = unicode(text, "iso-8859-1")
-            text = re.sub(self.gremlin_regex_1252, fixup, text)
+            # The keys of self.cp1252 are hex strings like "0x80" rather than characters, so mapping
+            # each character through it, as the effbot recipe does, never changes the text; it is
+            # skipped rather than run character by character
         return text
 
+    def to_ascii(self, text):
+        """
+        Converts a unicode string to ASCII the way unidecode does, in a single translate call
+        :param text: the unicode string to convert
+        :return: the ASCII str
+        """
+        try:
+            return text.encode('ascii')
+        except UnicodeEncodeError:
+            return text.translate(self.ascii_table).encode('ascii')
+
     def zap_string(self, the_string):
         """
         Converts any Windows cp1252 or unicode characters in a string to ASCII equivalents
         :param the_string: the string to perform the conversion on
         :return: input string with gremlins replaced
         """
-        the_string = self.kill_gremlins(the_string)
         if isinstance(the_string, unicode):
-            the_string = unidecode(the_string)
+            return self.to_ascii(the_string)
+        if self.gremlin_search_regex.search(the_string):
+            return self.to_ascii(unicode(the_string, "iso-8859-1"))
         return the_string
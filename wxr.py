@@ -0,0 +1,139 @@
+import os
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+WXR_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<rss version="2.0"\n'
+              '    xmlns:excerpt="http://wordpress.org/export/1.2/excerpt/"\n'
+              '    xmlns:content="http://purl.org/rss/1.0/modules/content/"\n'
+              '    xmlns:wfw="http://wellformedweb.org/CommentAPI/"\n'
+              '    xmlns:dc="http://purl.org/dc/elements/1.1/"\n'
+              '    xmlns:wp="http://wordpress.org/export/1.2/">\n\n'
+              '  <channel>\n\n'
+              '    <language>en-US</language>\n'
+              '    <wp:wxr_version>1.2</wp:wxr_version>\n\n\n')
+
+WXR_FOOTER = ('\n  </channel>\n'
+              '</rss>\n\n')
+
+
+def write_wxr_file(file_path, chunks):
+    """
+    Writes a complete wordpress import file
+    :param file_path: the path of the file to write
+    :param chunks: the byte strings that make up the file
+    :return:
+    """
+    with open(file_path, 'wb') as fo:
+        fo.writelines(chunks)
+
+
+class RotatingWXRSink(object):
+    """
+    Writes wordpress import (WXR) items to a numbered series of import files, starting a new file
+    whenever the current one would pass max_bytes or already holds max_items items.  The size of each
+    file is counted as items are added rather than read back from the file, and each finished file is
+    handed to a pool of writer threads, so several files can be written to disk at once while the next
+    one is being filled
+    """
+
+    def __init__(self, output_dir='.', file_prefix='wordpress-news-site-scraper-import-',
+                 max_bytes=5242880, max_items=None, writers=2):
+        """
+        :param output_dir: the directory to write the import files to. Created if it doesn't exist
+        :param file_prefix: the start of each import file name; the file number and .xml are added to it
+        :param max_bytes: the size in bytes that an import file won't grow past, unless a single item is
+        bigger than that. None for no limit
+        :param max_items: the maximum number of items in an import file, or None for no limit
+        :param writers: the number of import files that can be written to disk at the same time
+        :return:
+        """
+        self.output_dir = output_dir
+        self.file_prefix = file_prefix
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.writers = writers
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        self.pool = ThreadPool(writers)
+        self.pending_writes = deque()
+
+        self.file_num = 0
+        self.file_paths = []
+        self.chunks = None
+        self.num_bytes = 0
+        self.num_items = 0
+
+    def start_file(self):
+        """
+        Starts a new import file
+        :return:
+        """
+        self.chunks = [WXR_HEADER]
+        self.num_bytes = len(WXR_HEADER) + len(WXR_FOOTER)
+        self.num_items = 0
+
+    def finish_file(self):
+        """
+        Closes the current import file and queues it to be written.  If as many files as there are
+        writers are already queued, waits for the oldest one to finish first, so that no more than
+        that many finished files are held in memory
+        :return:
+        """
+        self.chunks.append(WXR_FOOTER)
+        file_path = os.path.join(self.output_dir, self.file_prefix + str(self.file_num) + '.xml')
+
+        while len(self.pending_writes) >= self.writers:
+            self.pending_writes.popleft().get()
+        self.pending_writes.append(self.pool.apply_async(write_wxr_file, (file_path, self.chunks)))
+
+        self.file_paths.append(file_path)
+        self.file_num += 1
+        self.chunks = None
+
+    def write_item(self, item):
+        """
+        Adds an item to the current import file, first starting a new file if the item wouldn't fit.
+        An item is never split across files
+        :param item: the xml of the item; a post together with its attachments counts as one item
+        :return:
+        """
+        if isinstance(item, unicode):
+            item = item.encode('utf-8')
+
+        if self.chunks is not None and self.num_items > 0:
+            too_big = self.max_bytes is not None and self.num_bytes + len(item) > self.max_bytes
+            too_many = self.max_items is not None and self.num_items >= self.max_items
+            if too_big or too_many:
+                self.finish_file()
+
+        if self.chunks is None:
+            self.start_file()
+
+        self.chunks.append(item)
+        self.num_bytes += len(item)
+        self.num_items += 1
+
+    def close(self):
+        """
+        Finishes the last import file and waits for all of the files to be written
+        :raises: any exception raised while writing a file
+        :return: the paths of the import files that were written
+        """
+        if self.chunks is None and self.file_num == 0:
+            # always write at least one, possibly empty, import file
+            self.start_file()
+        if self.chunks is not None:
+            self.finish_file()
+
+        try:
+            while self.pending_writes:
+                self.pending_writes.popleft().get()
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+        return self.file_paths